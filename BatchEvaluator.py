@@ -0,0 +1,205 @@
+import numpy as np
+from CardCodec import *
+from TreeFunctions import *
+
+VALUE_TABLE = np.array(CARD_VALUE, dtype=np.int8)
+SUIT_TABLE = np.array(CARD_SUIT, dtype=np.int8)
+COLOR_TABLE = np.array(CARD_COLOR, dtype=np.int8)
+PARITY_TABLE = np.array(CARD_PARITY, dtype=np.int8)
+ROYAL_TABLE = np.array(CARD_ROYAL, dtype=bool)
+
+#Card order used by less/greater: suits first, then values
+CARD_ORDER_TABLE = SUIT_TABLE.astype(np.int16) * 14 + VALUE_TABLE
+
+class BoardColumns:
+    '''
+     The legal board as NumPy columns, one entry per position: the card code and its
+     value, suit, color, parity and royal flag. Windows are the positions 2..n-1.
+    '''
+    def __init__(self, legal_cards):
+        self.codes = np.asarray(legal_cards, dtype=np.intp)
+        self.value = VALUE_TABLE[self.codes]
+        self.suit = SUIT_TABLE[self.codes]
+        self.color = COLOR_TABLE[self.codes]
+        self.parity = PARITY_TABLE[self.codes]
+        self.royal = ROYAL_TABLE[self.codes]
+        self.windows = max(len(self.codes) - 2, 0)
+
+    def position(self, column, position):
+        '''
+         Returns the slice of a column seen at a position of every window
+        '''
+        n = len(column)
+        if position == 'previous2':
+            return column[0:max(n - 2, 0)]
+        elif position == 'previous':
+            return column[1:max(n - 1, 1)]
+        return column[2:]
+
+class Unsupported(Exception):
+    '''
+     Raised for expressions the batch evaluator cannot vectorize, such as plus1/minus1
+     of a card or a suit; those rules fall back to their compiled function.
+    '''
+    pass
+
+#Each vectorized expression is a (kind, array) pair, kind is one of
+#'card', 'value', 'suit', 'color', 'bool' (a real boolean) or 'truth' (the
+#truthiness of a logical node, whose actual value may not be boolean).
+#Literals stay plain Python values.
+
+def literal_code(kind, literal):
+    '''
+     Converts a literal to the encoding of a column kind, None if it never compares equal
+    '''
+    name = str(literal)
+    if kind == 'value':
+        return int(name) if name.isdigit() else None
+    elif kind == 'suit':
+        return SUIT_NAMES.index(name) if name in SUIT_NAMES else None
+    elif kind == 'color':
+        return COLOR_NAMES.index(name) if name in COLOR_NAMES else None
+    elif kind == 'card':
+        return CARD_NAMES.index(name) if name in CARD_NAMES else None
+    elif kind == 'bool':
+        return {'True': True, 'False': False}.get(name)
+    raise Unsupported(kind)
+
+def literal_order(kind, literal):
+    '''
+     Converts a literal to the ordering used by less/greater for a column kind
+    '''
+    name = str(literal)
+    if kind == 'value' and is_value(name):
+        return value_to_number(name)
+    elif kind in ('suit', 'color'):
+        return literal_code(kind, literal)
+    elif kind == 'card' and name in CARD_CODES:
+        return CARD_ORDER_TABLE[CARD_CODES[name]]
+    raise Unsupported(literal)
+
+def order_array(kind, array):
+    if kind == 'card':
+        return CARD_ORDER_TABLE[array]
+    elif kind in ('value', 'suit', 'color'):
+        return array
+    raise Unsupported(kind)
+
+def truth(expr, windows):
+    '''
+     Returns the truthiness of an expression as a boolean array
+    '''
+    if not isinstance(expr, tuple):
+        return np.ones(windows, dtype=bool) if expr else np.zeros(windows, dtype=bool)
+    (kind, array) = expr
+    if kind in ('bool', 'truth'):
+        return array
+    #values are 1..13 and names are non-empty strings
+    return np.ones(windows, dtype=bool)
+
+def compare(f, left, right, windows):
+    if not isinstance(left, tuple) and not isinstance(right, tuple):
+        return f(left, right)
+    if (isinstance(left, tuple) and left[0] == 'truth') or (isinstance(right, tuple) and right[0] == 'truth'):
+        raise Unsupported(f)
+
+    if f == equal:
+        if isinstance(left, tuple) and isinstance(right, tuple):
+            if left[0] != right[0]:
+                return ('bool', np.zeros(windows, dtype=bool))
+            return ('bool', left[1] == right[1])
+        (column, literal) = (left, right) if isinstance(left, tuple) else (right, left)
+        code = literal_code(column[0], literal)
+        if code is None:
+            return ('bool', np.zeros(windows, dtype=bool))
+        return ('bool', column[1] == code)
+
+    if isinstance(left, tuple) and isinstance(right, tuple):
+        if left[0] != right[0]:
+            raise Unsupported(f)
+        (a, b) = (order_array(left[0], left[1]), order_array(right[0], right[1]))
+    elif isinstance(left, tuple):
+        (a, b) = (order_array(left[0], left[1]), literal_order(left[0], right))
+    else:
+        (a, b) = (literal_order(right[0], left), order_array(right[0], right[1]))
+    if f == less:
+        return ('bool', a < b)
+    return ('bool', a > b)
+
+def evaluate_expression(expr, columns, memo):
+    if not isinstance(expr, Tree):
+        if expr in positions:
+            return ('card', columns.position(columns.codes, expr))
+        return expr
+    key = id(expr)
+    if key in memo:
+        return memo[key]
+
+    windows = columns.windows
+    f = expr.root
+    if f in card_functions:
+        if expr.left not in positions:
+            raise Unsupported(expr)
+        position = expr.left
+        if f == value:
+            result = ('value', columns.position(columns.value, position))
+        elif f == suit:
+            result = ('suit', columns.position(columns.suit, position))
+        elif f == color:
+            result = ('color', columns.position(columns.color, position))
+        elif f == is_royal:
+            result = ('bool', columns.position(columns.royal, position))
+        elif f == even:
+            result = ('bool', columns.position(columns.parity, position) == 0)
+        else:
+            result = ('bool', columns.position(columns.parity, position) == 1)
+    elif f in [plus1, minus1]:
+        operand = evaluate_expression(expr.left, columns, memo)
+        if not isinstance(operand, tuple) or operand[0] != 'value':
+            raise Unsupported(expr)
+        result = ('value', operand[1] + (1 if f == plus1 else -1))
+    elif f in [equal, less, greater]:
+        result = compare(f, evaluate_expression(expr.left, columns, memo),
+                         evaluate_expression(expr.right, columns, memo), windows)
+    elif f == andf:
+        result = ('truth', truth(evaluate_expression(expr.left, columns, memo), windows) &
+                           truth(evaluate_expression(expr.right, columns, memo), windows))
+    elif f == orf:
+        result = ('truth', truth(evaluate_expression(expr.left, columns, memo), windows) |
+                           truth(evaluate_expression(expr.right, columns, memo), windows))
+    elif f == notf:
+        result = ('bool', ~truth(evaluate_expression(expr.left, columns, memo), windows))
+    elif f == iff:
+        test = truth(evaluate_expression(expr.test, columns, memo), windows)
+        result = ('truth', np.where(test, truth(evaluate_expression(expr.left, columns, memo), windows),
+                                          truth(evaluate_expression(expr.right, columns, memo), windows)))
+    else:
+        raise Unsupported(expr)
+    memo[key] = result
+    return result
+
+def evaluate_batch(rule, columns, memo=None):
+    '''
+     Evaluates a rule over every window of the board in one pass,
+     returns a boolean vector with one entry per window
+    '''
+    if memo is None:
+        memo = {}
+    try:
+        return truth(evaluate_expression(rule, columns, memo), columns.windows)
+    except Unsupported:
+        function = rule.compile()
+        codes = columns.codes.tolist()
+        return np.fromiter((bool(function(codes[i-2], codes[i-1], codes[i])) for i in xrange(2, len(codes))),
+                           dtype=bool, count=columns.windows)
+
+def evaluate_rules(rules, columns):
+    '''
+     Evaluates a list of rules over every window of the board,
+     returns a rules x windows boolean matrix. Shared subtrees are evaluated once.
+    '''
+    memo = {}
+    matrix = np.zeros((len(rules), columns.windows), dtype=bool)
+    for i, rule in enumerate(rules):
+        matrix[i] = evaluate_batch(rule, columns, memo)
+    return matrix
@@ -0,0 +1,301 @@
+'''
+ Benchmarks of the hot paths of the solver on seeded board fixtures.
+
+ The boards follow a secret rule, with a share of illegal plays breaking it. Every
+ benchmark runs in a fresh worker process, so that its peak memory is its own and a
+ benchmark running past the timeout can be stopped, and reports operations per second,
+ the container objects an operation leaves allocated (from the generation 0 counter of
+ gc, with collection disabled) and the peak resident memory of the worker. Results can
+ be saved as a JSON baseline and later runs compared against it:
+
+     python Benchmark.py --save baseline.json
+     python Benchmark.py --compare baseline.json
+'''
+import gc
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import resource
+import argparse
+import platform
+from multiprocessing import Pool, TimeoutError
+from GameSession import *
+from New_Eleusis import *
+from ScanRank import hypothesis_string
+from HypothesisTensor import HypothesisScanner
+from NumericMiner import rank_numeric_relations
+
+BOARD_SIZES = [20, 50, 100, 200, 1000]
+#The rule the legal cards of the boards follow
+BOARD_RULE = "or(equal(color(previous), R), equal(suit(current), C))"
+#Share of the plays that break the rule
+ILLEGAL_DENSITY = 0.3
+#Attempts at drawing a card of the wanted legality
+DRAW_ATTEMPTS = 100
+#Every benchmark repeats its operation for at least this many seconds
+MIN_TIME = 0.2
+#A result slower than the baseline by more than this share is reported as a regression
+TOLERANCE = 0.2
+#Seconds after which a benchmark is stopped and reported as timed out
+TIMEOUT = 120
+#parse_corpus parses this many rules per legal card of the board, at most RULE_DEPTH operators deep
+RULES_PER_CARD = 10
+RULE_DEPTH = 3
+
+def fixture_seed(*arguments):
+    '''
+     Returns the seed of the fixture made from arguments, the same on every platform and
+     build, which hash() of a str or float is not
+    '''
+    return int(hashlib.md5(repr(arguments)).hexdigest(), 16)
+
+def draw_card(generator, table, board, legal):
+    '''
+     Draws a card the rule accepts after the board, or rejects when legal is False;
+     None if none was found
+    '''
+    for attempt in xrange(DRAW_ATTEMPTS):
+        card = generator.choice(CARD_NAMES)
+        if len(board) < 2 or table.evaluate(*encode_cards([board[-2][0], board[-1][0], card])) == legal:
+            return card
+    return None
+
+def make_board(size, illegal_density=ILLEGAL_DENSITY, seed=0, board_rule=BOARD_RULE):
+    '''
+     Returns a board of size legal cards that follow the rule, each play after the first
+     two being illegal with probability illegal_density. The same arguments always give
+     the same board.
+    '''
+    generator = random.Random(fixture_seed(seed, size, illegal_density, board_rule))
+    table = rule_table(parse(board_rule))
+    board = []
+    while len(board) < size:
+        if len(board) >= 2 and generator.random() < illegal_density:
+            card = draw_card(generator, table, board, False)
+            if card is not None:
+                board[-1][1].append(card)
+        else:
+            card = draw_card(generator, table, board, True)
+            board.append((card if card is not None else generator.choice(CARD_NAMES), []))
+    return board
+
+def make_rule(generator, depth):
+    '''
+     Returns the string of a random rule at most depth logical operators deep
+    '''
+    if depth == 0 or generator.random() < 0.3:
+        position = generator.choice(['previous2', 'previous', 'current'])
+        return generator.choice(['equal(color(%s), %s)' % (position, generator.choice('RB')),
+                                 'equal(suit(%s), %s)' % (position, generator.choice('SCHD')),
+                                 '%s(value(%s), %d)' % (generator.choice(['less', 'greater', 'equal']), position, generator.randint(1, 13)),
+                                 'is_royal(%s)' % position, '%s(%s)' % (generator.choice(['even', 'odd']), position)])
+    connective = generator.choice(['and', 'or', 'not', 'iff'])
+    if connective == 'not':
+        return 'not(%s)' % make_rule(generator, depth - 1)
+    elif connective == 'iff':
+        return 'iff(%s, %s, %s)' % tuple(make_rule(generator, depth - 1) for i in xrange(3))
+    return '%s(%s, %s)' % (connective, make_rule(generator, depth - 1), make_rule(generator, depth - 1))
+
+def make_rule_corpus(count, seed=0):
+    '''
+     Returns count random rule strings, the same for the same arguments
+    '''
+    generator = random.Random(fixture_seed(seed, count))
+    return [make_rule(generator, RULE_DEPTH) for i in xrange(count)]
+
+def board_session(board):
+    session = GameSession()
+    session.board = Board(board)
+    return session
+
+def scan_board(board):
+    '''
+     Returns a HypothesisScanner that observed every play of the board, as play_card does
+    '''
+    scanner = HypothesisScanner()
+    for (card, illegal_cards) in board:
+        scanner.observe_legal(card)
+        for illegal_card in illegal_cards:
+            scanner.observe_illegal(illegal_card)
+    return scanner
+
+def prepare(name, board):
+    '''
+     Returns the operation a benchmark repeats, with everything it needs computed beforehand
+    '''
+    session = board_session(board)
+    if name == 'scan_and_rank_hypothesis':
+        #The scan is incremental, every run starts from a new session
+        return lambda: scan_and_rank_hypothesis(True, board_session(board))
+    elif name == 'HypothesisScanner':
+        return lambda: scan_board(board).ranked(5)
+    elif name == 'rank_numeric_relations':
+        return lambda: rank_numeric_relations(session.board)
+    elif name == 'parse_corpus':
+        corpus = make_rule_corpus(RULES_PER_CARD * len(board))
+        def parse_corpus():
+            #Every run starts with an empty cache, as a corpus of new rules would
+            parse_cache.clear()
+            return [parse(rule) for rule in corpus]
+        return parse_corpus
+
+    #The hypotheses are ranked the way scientist ranks them
+    ranked_hypothesis = scan_board(board).ranked(5)
+    if name == 'scan_and_rank_rules':
+        return lambda: scan_and_rank_rules(ranked_hypothesis, hypothesis_scores=ranked_hypothesis, session=session)
+
+    pr_ranked_hypothesis = scan_and_rank_rules(ranked_hypothesis, hypothesis_scores=ranked_hypothesis, session=session)
+    #The rules of the top hypotheses and the rule of the board, scan_and_rank_rules may keep none
+    top_rules = [tree_transform(hypothesis_string(hypothesis)) for hypothesis in ranked_hypothesis] + [parse(BOARD_RULE)]
+    if name == 'validate_and_refine_formulated_rule':
+        return lambda: validate_and_refine_formulated_rule(top_rules, session)
+    elif name == 'pick_next_negative_card':
+        hand = [card for card, illegal_cards in board[:14]]
+        return lambda: pick_next_negative_card(pr_ranked_hypothesis, 0, hand, session)
+    elif name == 'pick_informative_card':
+        hand = [card for card, illegal_cards in board[:14]]
+        return lambda: pick_informative_card(pr_ranked_hypothesis, 0, hand, session)
+    elif name == 'Tree.evaluate':
+        legal_cards = [card for card, illegal_cards in board]
+        windows = [tuple(legal_cards[i-2:i+1]) for i in xrange(2, len(legal_cards))]
+        return lambda: [rule.evaluate(window) for rule in top_rules for window in windows]
+    elif name == 'parse':
+        rule_strings = [str(rule) for rule in top_rules]
+        return lambda: [parse(rule_string) for rule_string in rule_strings]
+    raise ValueError('Unknown benchmark ' + name)
+
+BENCHMARKS = ['scan_and_rank_hypothesis', 'HypothesisScanner', 'scan_and_rank_rules', 'validate_and_refine_formulated_rule',
+              'pick_next_negative_card', 'pick_informative_card', 'Tree.evaluate', 'parse', 'parse_corpus',
+              'rank_numeric_relations']
+
+def measure(operation, min_time=MIN_TIME):
+    '''
+     Returns (operations per second, objects left allocated per operation). The
+     allocations are counted on the first run, with the collector disabled.
+    '''
+    gc.collect()
+    start_time = time.time()
+    gc.disable()
+    try:
+        allocated = gc.get_count()[0]
+        operation()
+        allocations = gc.get_count()[0] - allocated
+    finally:
+        gc.enable()
+
+    runs = 1
+    elapsed = time.time() - start_time
+    while elapsed < min_time:
+        operation()
+        runs += 1
+        elapsed = time.time() - start_time
+    return runs / elapsed, allocations
+
+def run_benchmark((name, size, illegal_density, seed, min_time)):
+    '''
+     Runs one benchmark with stdout silenced, returns its result or the error it raised
+    '''
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        random.seed(seed)
+        start_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        try:
+            (ops_per_sec, allocations) = measure(prepare(name, make_board(size, illegal_density, seed)), min_time)
+        except Exception as error:
+            return {'error': error.__class__.__name__ + ': ' + str(error)}
+        peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {'ops_per_sec': ops_per_sec, 'allocations': allocations,
+                'peak_memory_kb': peak_memory, 'memory_growth_kb': peak_memory - start_memory}
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+def run_isolated(case, timeout=TIMEOUT):
+    '''
+     Runs one benchmark in a new worker process, stopped after timeout seconds
+    '''
+    pool = Pool(1)
+    try:
+        return pool.apply_async(run_benchmark, (case,)).get(timeout)
+    except TimeoutError:
+        return {'error': 'timed out after %d s' % timeout}
+    finally:
+        pool.terminate()
+        pool.join()
+
+def run_benchmarks(names=BENCHMARKS, sizes=BOARD_SIZES, illegal_density=ILLEGAL_DENSITY, seed=0,
+                   min_time=MIN_TIME, timeout=TIMEOUT):
+    '''
+     Runs every benchmark on every board size, returns {'name/size': result}
+    '''
+    results = {}
+    for name in names:
+        for size in sizes:
+            results[name + '/' + str(size)] = run_isolated((name, size, illegal_density, seed, min_time), timeout)
+    return results
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    '''
+     Returns {'name/size': ops/sec relative to the baseline} and the cases that regressed
+    '''
+    ratios = {}
+    regressions = []
+    for key, result in results.iteritems():
+        previous = baseline.get(key)
+        if not previous or 'ops_per_sec' not in previous or 'ops_per_sec' not in result:
+            continue
+        ratios[key] = result['ops_per_sec'] / previous['ops_per_sec']
+        if ratios[key] < 1 - tolerance:
+            regressions.append(key)
+    return ratios, sorted(regressions)
+
+def print_results(results, ratios={}):
+    for key in sorted(results, key=lambda key: (key.split('/')[0], int(key.split('/')[1]))):
+        result = results[key]
+        if 'error' in result:
+            print '%-45s %s' % (key, result['error'])
+            continue
+        line = '%-45s %12.1f ops/s %10d allocations %8d kB peak' % (
+            key, result['ops_per_sec'], result['allocations'], result['peak_memory_kb'])
+        if key in ratios:
+            line += '   x%.2f' % ratios[key]
+        print line
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the solver on seeded board fixtures')
+    parser.add_argument('--only', nargs='*', default=BENCHMARKS, choices=BENCHMARKS, help='benchmarks to run')
+    parser.add_argument('--sizes', nargs='*', type=int, default=BOARD_SIZES, help='legal cards on the boards')
+    parser.add_argument('--illegal-density', type=float, default=ILLEGAL_DENSITY,
+                        help='chance that a legal card is followed by illegal plays')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the board fixtures')
+    parser.add_argument('--min-time', type=float, default=MIN_TIME, help='seconds each benchmark repeats for')
+    parser.add_argument('--timeout', type=int, default=TIMEOUT, help='seconds before a benchmark is stopped')
+    parser.add_argument('--save', help='writes the results to this JSON file')
+    parser.add_argument('--compare', help='compares the results with this JSON baseline')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help='slowdown reported as a regression')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.only, args.sizes, args.illegal_density, args.seed, args.min_time, args.timeout)
+    ratios = {}
+    regressions = []
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        ratios, regressions = compare(results, baseline['results'], args.tolerance)
+    print_results(results, ratios)
+    if regressions:
+        print 'Regressions: ' + ', '.join(regressions)
+
+    if args.save:
+        with open(args.save, 'w') as baseline_file:
+            json.dump({'python': platform.python_version(), 'board_rule': BOARD_RULE,
+                       'illegal_density': args.illegal_density, 'seed': args.seed,
+                       'min_time': args.min_time, 'results': results},
+                      baseline_file, indent=2, sort_keys=True)
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":main()
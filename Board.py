@@ -0,0 +1,105 @@
+import numpy as np
+from CardCodec import *
+from CharacteristicIndex import *
+
+#Positions of a window, as indices of its columns
+WINDOW_INDEX = {'previous2': 0, 'previous': 1, 'current': 2}
+
+def window_array(windows, arity):
+    '''
+     Returns the windows, tuples of card codes, as a windows x arity array
+    '''
+    return np.array(windows, dtype=np.intp).reshape(len(windows), arity)
+
+class Board(object):
+    '''
+     The board of a game: a sequence of (legal card, [illegal cards played after it]),
+     as the board_state lists were. Every play is appended in O(1) and keeps current
+     the legal cards, their codes and the illegal tuples of parse_illegal_indices, so
+     reading them costs nothing. The lists returned by legal_cards, legal_codes,
+     illegal_tuples and illegal_codes are the board's own, callers must not modify them.
+     characteristics indexes the plays by characteristic, see CharacteristicIndex, and
+     version counts the plays.
+    '''
+    def __init__(self, plays=()):
+        self.entries = []
+        self.legal_cards = []
+        self.legal_codes = []
+        #For every illegal card, (previous, legal card, illegal card) then (legal card, illegal card)
+        self.illegal_tuples = []
+        self.illegal_codes = []
+        self.characteristics = CharacteristicIndex()
+        self.version = 0
+        #name: (version, value), see cached
+        self.cache = {}
+        for (card, illegal_cards) in plays:
+            self.play(card, True)
+            for illegal_card in illegal_cards:
+                self.play(illegal_card, False)
+
+    def play(self, card, legal):
+        '''
+         Adds a card accepted on the board, or rejected after the last legal card
+        '''
+        if legal:
+            self.entries.append((card, []))
+            self.legal_cards.append(card)
+            self.legal_codes.append(encode_card(card))
+            self.characteristics.add_legal(self.legal_codes[-1])
+        else:
+            self.entries[-1][1].append(card)
+            code = encode_card(card)
+            if len(self.legal_cards) > 1:
+                self.illegal_tuples.append((self.legal_cards[-2], self.legal_cards[-1], card))
+                self.illegal_codes.append((self.legal_codes[-2], self.legal_codes[-1], code))
+            self.illegal_tuples.append((self.legal_cards[-1], card))
+            self.illegal_codes.append((self.legal_codes[-1], code))
+            self.characteristics.add_illegal(self.legal_codes[-2:] + [code])
+        self.version += 1
+
+    def cached(self, name, build):
+        '''
+         Returns build(board), computed again only when cards were played since the last call
+        '''
+        if name in self.cache and self.cache[name][0] == self.version:
+            return self.cache[name][1]
+        value = build(self)
+        self.cache[name] = (self.version, value)
+        return value
+
+    def illegal_plays(self):
+        '''
+         Returns the number of illegal cards played
+        '''
+        return self.characteristics.illegal_length
+
+    def last_card(self):
+        '''
+         Returns the card played last, legal or not, None on an empty board
+        '''
+        if not self.entries:
+            return None
+        (card, illegal_cards) = self.entries[-1]
+        if illegal_cards:
+            return illegal_cards[-1]
+        return card
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, index):
+        return self.entries[index]
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __eq__(self, other):
+        if isinstance(other, Board):
+            other = other.entries
+        return self.entries == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'Board(' + repr(self.entries) + ')'
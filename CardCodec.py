@@ -0,0 +1,140 @@
+'''
+ Integer encoding of the 52 cards.
+
+ Every card is mapped once to a code 0..51, code = (value - 1) * 4 + suit index,
+ and all card characteristics are read from tables indexed by that code instead
+ of re-parsing the card string on every call.
+'''
+
+VALUE_NAMES = ('A', '2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K')
+SUIT_NAMES = ('C', 'D', 'H', 'S')
+COLOR_NAMES = ('B', 'R')
+SUIT_COLORS = {'C':'B', 'D':'R', 'H':'R', 'S':'B'}
+
+NUMBER_OF_CARDS = 52
+NUMBER_OF_CHARACTERISTICS = 23
+
+#Characteristic ids used throughout the solver
+#C1..C13 value, C14/C15 red/black, C16..C19 diamond/heart/spade/club, C20/C21 even/odd, C22/C23 royal/not_royal
+CHARACTERISTIC_NAMES = tuple('C' + str(i) for i in xrange(1, NUMBER_OF_CHARACTERISTICS + 1))
+SUIT_CHARACTERISTIC = {'D':16, 'H':17, 'S':18, 'C':19}
+COLOR_CHARACTERISTIC = {'R':14, 'B':15}
+#The characteristic every card without a characteristic has, for those that come in pairs
+OPPOSITE_CHARACTERISTIC = {14:15, 15:14, 20:21, 21:20, 22:23, 23:22}
+
+#Relational characteristic ids, following the card characteristics, tell how a card compares
+#with an earlier card of its window: C24/C25 same/different suit, C26/C27 same/different color,
+#C28/C29 same/different parity, C30/C31/C32 higher/lower/equal value, C33/C34 same/different royalty
+NUMBER_OF_RELATIONS = 11
+RELATION_NAMES = tuple('C' + str(i) for i in xrange(NUMBER_OF_CHARACTERISTICS + 1,
+                                                    NUMBER_OF_CHARACTERISTICS + NUMBER_OF_RELATIONS + 1))
+#Every pair of cards has one relation of each kind
+RELATIONS_PER_PAIR = 5
+#The (later, earlier) cards the relational characteristics of a position compare; previous2
+#has no card before it in a window and stands for current to previous2
+RELATED_POSITIONS = {'current': ('current', 'previous'), 'previous': ('previous', 'previous2'),
+                     'previous2': ('current', 'previous2')}
+#The card and relational characteristic names, indexed by id - 1
+ALL_CHARACTERISTIC_NAMES = CHARACTERISTIC_NAMES + RELATION_NAMES
+
+CARD_NAMES = []
+CARD_CODES = {}
+CARD_VALUE = []
+CARD_SUIT = []
+CARD_COLOR = []
+CARD_PARITY = []
+CARD_ROYAL = []
+CARD_CHARACTERISTIC_MASK = []
+CARD_CHARACTERISTIC_IDS = []
+CARD_CHARACTERISTICS = []
+
+def _build_tables():
+    '''
+     Fills the card tables, this runs once at import time
+    '''
+    for code in xrange(NUMBER_OF_CARDS):
+        value = code // 4 + 1
+        suit = SUIT_NAMES[code % 4]
+        color = SUIT_COLORS[suit]
+        name = VALUE_NAMES[value - 1] + suit
+
+        CARD_NAMES.append(name)
+        CARD_CODES[name] = code
+        if value == 1:
+            #Aces are also dealt as '1S' by the adversaries
+            CARD_CODES['1' + suit] = code
+        CARD_VALUE.append(value)
+        CARD_SUIT.append(code % 4)
+        CARD_COLOR.append(COLOR_NAMES.index(color))
+        CARD_PARITY.append(value % 2)
+        CARD_ROYAL.append(value > 10)
+
+        #The royal characteristic counts aces as well, as get_card_characteristics always has
+        characteristic_ids = [value, COLOR_CHARACTERISTIC[color], SUIT_CHARACTERISTIC[suit],
+                              20 if value % 2 == 0 else 21,
+                              22 if value in (1, 11, 12, 13) else 23]
+        characteristic_ids.sort()
+        mask = 0
+        for characteristic_id in characteristic_ids:
+            mask |= 1 << (characteristic_id - 1)
+        CARD_CHARACTERISTIC_MASK.append(mask)
+        CARD_CHARACTERISTIC_IDS.append(tuple(characteristic_ids))
+        CARD_CHARACTERISTICS.append(tuple(CHARACTERISTIC_NAMES[i - 1] for i in characteristic_ids))
+
+_build_tables()
+
+def relation_ids(later, earlier):
+    '''
+     Returns the relational characteristic ids of a card code to an earlier one
+    '''
+    def pick(same, first_id):
+        return first_id if same else first_id + 1
+    if CARD_VALUE[later] > CARD_VALUE[earlier]:
+        value_id = 30
+    elif CARD_VALUE[later] < CARD_VALUE[earlier]:
+        value_id = 31
+    else:
+        value_id = 32
+    return (pick(CARD_SUIT[later] == CARD_SUIT[earlier], 24), pick(CARD_COLOR[later] == CARD_COLOR[earlier], 26),
+            pick(CARD_PARITY[later] == CARD_PARITY[earlier], 28), value_id,
+            pick(CARD_ROYAL[later] == CARD_ROYAL[earlier], 33))
+
+#CARD_RELATION_IDS[later][earlier] holds the relational characteristic ids of two card codes
+CARD_RELATION_IDS = [[relation_ids(later, earlier) for earlier in xrange(NUMBER_OF_CARDS)]
+                     for later in xrange(NUMBER_OF_CARDS)]
+
+def encode_card(card):
+    '''
+     Returns the code of a card given as a string such as '10S'; codes and None are returned unchanged
+    '''
+    if card is None or isinstance(card, (int, long)):
+        return card
+    return CARD_CODES[card]
+
+def decode_card(code):
+    '''
+     Returns the string name of a card code; strings and None are returned unchanged
+    '''
+    if code is None or not isinstance(code, (int, long)):
+        return code
+    return CARD_NAMES[code]
+
+def encode_cards(cards):
+    '''
+     Encodes a sequence of cards, returns a list of codes
+    '''
+    return [encode_card(card) for card in cards]
+
+def characteristic_id(characteristic):
+    '''
+     Returns the integer id of a characteristic name such as 'C14'
+    '''
+    return int(characteristic[1:])
+
+def has_characteristic(code, characteristic):
+    '''
+     Tests the characteristic mask of a card code against a characteristic name or id
+    '''
+    if not isinstance(characteristic, (int, long)):
+        characteristic = characteristic_id(characteristic)
+    return bool(CARD_CHARACTERISTIC_MASK[code] >> (characteristic - 1) & 1)
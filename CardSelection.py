@@ -0,0 +1,70 @@
+'''
+ Picks the card of the hand whose outcome best separates the candidate rules.
+
+ Every card of the hand is evaluated, after the last two legal cards of the board, against
+ the top candidate rules. The rules predicting the card legal and those predicting it
+ illegal split the weight of the candidates; whichever way the card is then judged, the
+ rules on the other side are refuted. The card whose split has the highest entropy
+ refutes the most weight in expectation, so the candidates narrow in the fewest plays.
+'''
+import math
+import time
+from collections import OrderedDict
+from NewEleusisHelper import *
+from TreeFunctions import *
+
+#Number of candidate rules the hand is evaluated against
+TOP_RULES = 10
+#Seconds a selection may spend evaluating rules, the rules left are ignored
+TIME_BUDGET = 0.05
+
+def split_entropy(legal_weight, total_weight):
+    '''
+     Returns the entropy in bits of a card judged legal with probability legal_weight / total_weight
+    '''
+    if total_weight <= 0 or legal_weight <= 0 or legal_weight >= total_weight:
+        return 0.0
+    p = float(legal_weight) / total_weight
+    return -(p * math.log(p, 2) + (1 - p) * math.log(1 - p, 2))
+
+def card_information(rule_weights, cards, previous2, previous, deadline=None):
+    '''
+     Returns {card: entropy of the split of the weighted rules [(rule, weight)] on it} and
+     {card: whether the first rule accepts it}. The rules are evaluated in order with their
+     compiled functions, until the deadline.
+    '''
+    codes = dict((card, encode_card(card)) for card in cards)
+    legal_weights = dict.fromkeys(cards, 0.0)
+    top_rule_legal = {}
+    total_weight = 0.0
+    for rule, weight in rule_weights:
+        if deadline is not None and top_rule_legal and time.time() > deadline:
+            break
+        function = rule.compile()
+        weight = max(float(weight), 0.0)
+        for card in cards:
+            legal = bool(function(previous2, previous, codes[card]))
+            if legal:
+                legal_weights[card] += weight
+            top_rule_legal.setdefault(card, legal)
+        total_weight += weight
+    information = dict((card, split_entropy(legal_weights[card], total_weight)) for card in cards)
+    return information, top_rule_legal
+
+def pick_informative_card(ranked_rules, last_rule_counter, card_list=[], session=None,
+                          top_rules=TOP_RULES, time_budget=TIME_BUDGET):
+    '''
+     Returns the card of card_list that best separates the top rules of ranked_rules (a
+     HypothesisRanking of rules), the one the best rule rejects on ties as negative
+     testing would. Falls back to pick_next_negative_card when no card separates them.
+    '''
+    deadline = time.time() + time_budget
+    legal_codes = get_master_board_state(session).legal_codes
+    cards = list(OrderedDict.fromkeys(card_list))
+    rule_weights = ranked_rules.top(top_rules)
+    if len(legal_codes) >= 2 and len(rule_weights) > 1 and cards:
+        (information, top_rule_legal) = card_information(rule_weights, cards, legal_codes[-2], legal_codes[-1], deadline)
+        best_card = max(cards, key=lambda card: (information[card], not top_rule_legal[card]))
+        if information[best_card] > 0:
+            return best_card
+    return pick_next_negative_card(ranked_rules, last_rule_counter, card_list, session)
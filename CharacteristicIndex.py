@@ -0,0 +1,123 @@
+import numpy as np
+from CardCodec import *
+
+PREVIOUS2, PREVIOUS, CURRENT = 0, 1, 2
+#The characteristic ids 1..23
+CHARACTERISTIC_IDS = range(1, NUMBER_OF_CHARACTERISTICS + 1)
+BIT_CHARACTERS = np.array(['0', '1'], dtype='S1')
+
+def popcount(bits):
+    return bin(bits).count('1')
+
+def flags_to_bits(flags, offset=0):
+    '''
+     Returns the bitset of the true entries of a boolean vector, entry i as bit i + offset
+    '''
+    flags = np.asarray(flags, dtype=bool)
+    if not flags.any():
+        return 0
+    return int(BIT_CHARACTERS[flags[::-1].astype(np.intp)].tostring(), 2) << offset
+
+class CharacteristicIndex:
+    '''
+     For every characteristic id, the bitset of the legal board positions whose card has
+     it, and for every position of an illegal play (previous2, previous, current) the
+     bitset of the illegal plays with it there. Illegal plays are numbered in the order
+     they were played; those after a single legal card have no previous2.
+
+     The support of a conjunction of characteristics at positions is then a popcount:
+     windows end at their current card, so C14 at previous and C22 at current holds in
+     popcount((legal[14] << 1) & legal[22] & windows) windows.
+    '''
+    def __init__(self):
+        self.legal = [0] * (NUMBER_OF_CHARACTERISTICS + 1)
+        self.illegal = ([0] * (NUMBER_OF_CHARACTERISTICS + 1), [0] * (NUMBER_OF_CHARACTERISTICS + 1),
+                        [0] * (NUMBER_OF_CHARACTERISTICS + 1))
+        self.legal_length = 0
+        self.illegal_length = 0
+        #The illegal plays with a previous2
+        self.illegal_three = 0
+
+    def add_legal(self, code):
+        bit = 1 << self.legal_length
+        for characteristic in CARD_CHARACTERISTIC_IDS[code]:
+            self.legal[characteristic] |= bit
+        self.legal_length += 1
+
+    def add_illegal(self, codes):
+        '''
+         Adds an illegal play, the codes of (previous2, previous, current) or (previous, current)
+        '''
+        bit = 1 << self.illegal_length
+        positions = (PREVIOUS2, PREVIOUS, CURRENT)[-len(codes):]
+        for position, code in zip(positions, codes):
+            bitsets = self.illegal[position]
+            for characteristic in CARD_CHARACTERISTIC_IDS[code]:
+                bitsets[characteristic] |= bit
+        if len(codes) == 3:
+            self.illegal_three |= bit
+        self.illegal_length += 1
+
+    def windows(self):
+        '''
+         Returns the bitset of the windows, the legal positions with two legal cards before them
+        '''
+        if self.legal_length < 3:
+            return 0
+        return ((1 << self.legal_length) - 1) & ~3
+
+    def plays(self):
+        return (1 << self.illegal_length) - 1
+
+    def legal_matches(self, characteristics, mask=None):
+        '''
+         Returns the bitset of the windows in which every position has its characteristic,
+         characteristics is (previous2, previous, current) with None for any characteristic
+        '''
+        (previous2, previous, current) = characteristics
+        bits = self.windows() if mask is None else mask
+        if previous2:
+            bits &= self.legal[previous2] << 2
+        if previous:
+            bits &= self.legal[previous] << 1
+        if current:
+            bits &= self.legal[current]
+        return bits
+
+    def illegal_matches(self, characteristics, mask=None):
+        '''
+         Returns the bitset of the illegal plays in which every position has its characteristic
+        '''
+        bits = self.plays() if mask is None else mask
+        for position, characteristic in enumerate(characteristics):
+            if characteristic:
+                bits &= self.illegal[position][characteristic]
+        return bits
+
+    def legal_support(self, characteristics, mask=None):
+        return popcount(self.legal_matches(characteristics, mask))
+
+    def illegal_support(self, characteristics, mask=None):
+        return popcount(self.illegal_matches(characteristics, mask))
+
+    def legal_supports(self, mask=None):
+        '''
+         Returns {(previous2, previous, current): number of windows} for the characteristic
+         triples of the windows of mask, found by narrowing the bitset one position at a time
+         so that only the triples that occur are visited
+        '''
+        supports = {}
+        windows = self.windows() if mask is None else mask & self.windows()
+        for previous2 in CHARACTERISTIC_IDS:
+            first = windows & (self.legal[previous2] << 2)
+            if not first:
+                continue
+            for previous in CHARACTERISTIC_IDS:
+                second = first & (self.legal[previous] << 1)
+                if not second:
+                    continue
+                for current in CHARACTERISTIC_IDS:
+                    third = second & self.legal[current]
+                    if third:
+                        supports[(previous2, previous, current)] = popcount(third)
+        return supports
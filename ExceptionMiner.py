@@ -0,0 +1,185 @@
+'''
+ Count-based mining of the EXCEPT/UNLESS clause of a rule.
+
+ A rule gets two kinds of windows wrong: the legal windows it rejects, which an UNLESS
+ clause would admit, and the illegal plays it accepts, which an EXCEPT clause would
+ reject. Its exception is the characteristic triple those windows share most, where a
+ position may also be left free. Every window has 6 x 6 x 6 such triples, so encoding each
+ triple as one id and counting the ids of all the wrong windows with one bincount gives
+ the occurrences of every triple at once. A triple occurring n times scores its weight
+ times 1 + 2 + ... + n, and the top triple is the exception when it scores above
+ EXCEPTION_CUTOFF.
+
+ The counts of a rule only grow as plays are made, so RuleExceptions keeps them between
+ turns and counts the new windows only, and the refined rule of refined_rule is a plain
+ Tree, evaluated by the rule tables and the batch evaluator as any other rule. How many
+ windows a refinement fixes needs no evaluation of it: the counts give the wrong windows
+ of the exception, and the popcounts of the board's CharacteristicIndex all its windows.
+'''
+import numpy as np
+from CardCodec import *
+from NewEleusisHelper import set_characteristic_weights
+from TreeFunctions import *
+from RuleTable import rule_table
+from Board import WINDOW_INDEX, window_array
+from Exception_Hypothesis import *
+
+#The characteristic ids 1..23 along every position of a triple, 0 standing for a free
+#position, as the previous2 of a play made after the first legal card always is
+ID_BASE = NUMBER_OF_CHARACTERISTICS + 1
+TRIPLE_SHAPE = (ID_BASE, ID_BASE, ID_BASE)
+#CARD_IDS[code] holds 0 and the characteristic ids of a card
+CARD_IDS = np.array([(0,) + ids for ids in CARD_CHARACTERISTIC_IDS], dtype=np.intp)
+CHARACTERISTIC_WEIGHTS = np.array([0.0] + [set_characteristic_weights()[name] for name in CHARACTERISTIC_NAMES])
+
+#The score an exception must exceed
+EXCEPTION_CUTOFF = 1
+#The number of top rules the scientist refines every turn
+REFINED_RULES = 5
+#The number of rules whose counts a session keeps, the least recently refined are dropped
+EXCEPTION_CACHE_SIZE = 4 * REFINED_RULES
+
+def new_windows(board, observed):
+    '''
+     Returns (legal windows, illegal plays) of a Board played since observed, the lengths
+     of its legal_codes and illegal_codes at the last call, as arrays of card codes: the
+     three card windows of the legal cards, and {arity: plays} the window every illegal card
+     ended, of two cards for those played after the first legal card
+    '''
+    (legal_length, illegal_length) = observed
+    codes = board.legal_codes[max(legal_length - 2, 0):]
+    plays = {2: [], 3: []}
+    illegal_codes = board.illegal_codes
+    for index in xrange(illegal_length, len(illegal_codes)):
+        elem = illegal_codes[index]
+        #A card played after two legal cards or more has its three card tuple first
+        if len(elem) == 3 or index == 0 or len(illegal_codes[index - 1]) != 3:
+            plays[len(elem)].append(elem)
+    return (window_array(zip(codes, codes[1:], codes[2:]), 3),
+            dict((arity, window_array(windows, arity)) for (arity, windows) in plays.iteritems()))
+
+def triple_counts(windows):
+    '''
+     Returns the number of windows every characteristic triple occurs in, indexed by the
+     id (previous2 * ID_BASE + previous) * ID_BASE + current, from an array of windows
+    '''
+    ids = [CARD_IDS[windows[:, column]] for column in xrange(windows.shape[1])]
+    if windows.shape[1] == 2:
+        ids.insert(0, np.zeros((len(windows), 1), dtype=np.intp))
+    triples = (ids[0][:, :, None, None] * ID_BASE + ids[1][:, None, :, None]) * ID_BASE + ids[2][:, None, None, :]
+    return np.bincount(triples.ravel(), minlength=ID_BASE ** 3)
+
+def triple_weights(excluded=()):
+    '''
+     Returns the weight of every characteristic triple, the mean weight of its three
+     positions, free positions and the (position, id) pairs of excluded weighing 0
+    '''
+    weights = np.tile(CHARACTERISTIC_WEIGHTS, (3, 1))
+    for (position, characteristic) in excluded:
+        weights[WINDOW_INDEX[position], characteristic] = 0
+    total = weights[0][:, None, None] + weights[1][None, :, None] + weights[2][None, None, :]
+    return (total / 3).ravel()
+
+UNLESS_WEIGHTS = triple_weights()
+
+def exception_ids(exception):
+    '''
+     Returns the (previous2, previous, current) characteristic ids of an
+     Exception_Hypothesis, None at its free positions
+    '''
+    ids = dict((position, characteristic_id(name)) for (position, name) in exception.characteristics())
+    return tuple(ids.get(position) for position in ('previous2', 'previous', 'current'))
+
+def top_exception(counts, weights, excluded=()):
+    '''
+     Returns the Exception_Hypothesis of the top scoring triple, None when it does not
+     score above EXCEPTION_CUTOFF. Characteristics of excluded are left out of it.
+    '''
+    scores = weights * counts * (counts + 1) / 2
+    #Ties go to the larger triple
+    top = len(scores) - 1 - int(np.argmax(scores[::-1]))
+    if scores[top] <= EXCEPTION_CUTOFF:
+        return None
+    names = [CHARACTERISTIC_NAMES[characteristic - 1] if characteristic and (position, characteristic) not in excluded
+             else None
+             for (position, characteristic) in zip(('previous2', 'previous', 'current'), np.unravel_index(top, TRIPLE_SHAPE))]
+    return Exception_Hypothesis(*names)
+
+class RuleExceptions:
+    '''
+     The characteristic triple counts of the windows a rule gets wrong: unless_counts for
+     the legal windows it rejects, except_counts for the illegal plays it accepts, and wrong
+     the number of those windows. update counts only the windows of the cards played since
+     the last update, sliced out of the board's lists.
+    '''
+    def __init__(self, rule):
+        self.rule = rule
+        self.table = rule_table(rule)
+        #The characteristics the rule already tests, left out of its EXCEPT clause
+        self.excluded = set((position, characteristic) for (position, characteristic, polarity) in tree_constraints(rule)
+                            if characteristic < ID_BASE)
+        self.except_weights = triple_weights(self.excluded)
+        self.unless_counts = np.zeros(ID_BASE ** 3, dtype=np.int64)
+        self.except_counts = np.zeros(ID_BASE ** 3, dtype=np.int64)
+        #The lengths of the legal_codes and illegal_codes of the board counted so far
+        self.observed = (0, 0)
+        self.wrong = 0
+        self.accepted_pairs = 0
+
+    def update(self, board):
+        '''
+         Counts the windows of the cards played on a Board since the last update
+        '''
+        (legal, illegal) = new_windows(board, self.observed)
+        self.observed = (len(board.legal_codes), len(board.illegal_codes))
+        rejected = legal[~self.table.evaluate_windows(legal)]
+        self.unless_counts += triple_counts(rejected)
+        self.wrong += len(rejected)
+        #A rule that looks at previous2 cannot judge the plays without one
+        for (arity, plays) in illegal.iteritems():
+            if arity >= self.table.arity:
+                accepted = plays[self.table.evaluate_windows(plays)]
+                self.except_counts += triple_counts(accepted)
+                self.wrong += len(accepted)
+                if arity == 2:
+                    self.accepted_pairs += len(accepted)
+
+    def exceptions(self):
+        '''
+         Returns (unless, except), the exceptions of the rule, None where it has none: the
+         one shared by the legal windows it rejects, and the one shared by the illegal plays
+         it accepts, left out the characteristics the rule already tests at the same position
+        '''
+        return (top_exception(self.unless_counts, UNLESS_WEIGHTS),
+                top_exception(self.except_counts, self.except_weights, self.excluded))
+
+    def refinement_fixes(self, exception, legal_exception, index):
+        '''
+         Returns the number of windows the rule refined by an exception (see refined_rule)
+         gets right that the rule got wrong, less those it then gets wrong, from the counts
+         and the CharacteristicIndex of the board the rule was last updated with. Aces count
+         as royal there, as in the characteristics the exceptions are mined from.
+        '''
+        characteristics = exception_ids(exception)
+        triple = np.ravel_multi_index([characteristic or 0 for characteristic in characteristics], TRIPLE_SHAPE)
+        if legal_exception:
+            #It admits the legal windows and the illegal plays of the exception that the rule rejects
+            mask = index.illegal_three if self.table.arity == 3 else None
+            fixes = self.unless_counts[triple] - (index.illegal_support(characteristics, mask) - self.except_counts[triple])
+        else:
+            #It rejects the illegal plays and the legal windows of the exception that the rule accepts
+            fixes = self.except_counts[triple] - (index.legal_support(characteristics) - self.unless_counts[triple])
+        #An exception that looks at previous2 leaves the plays without one unjudged
+        if characteristics[0] and self.table.arity < 3:
+            fixes += self.accepted_pairs
+        return int(fixes)
+
+def refined_rule(rule, exception, legal_exception):
+    '''
+     Returns a rule with its exception clause: or(rule, exception) when the exception
+     admits legal windows the rule rejects (UNLESS), and(rule, not(exception)) when it
+     rejects illegal plays the rule accepts (EXCEPT)
+    '''
+    if legal_exception:
+        return Tree(orf, rule, exception.tree())
+    return Tree(andf, rule, Tree(notf, exception.tree()))
@@ -1,3 +1,4 @@
+from TreeFunctions import *
 
 class Exception_Hypothesis:
 	def __init__(self, previous2 = None, previous = None, current = None):
@@ -15,3 +16,21 @@ class Exception_Hypothesis:
 		if current:
 			self.currentFlag = True
 			self.current = current
+
+	def characteristics(self):
+		#(position, characteristic name) of the positions the exception is enabled for
+		return [(position, getattr(self, position)) for (position, flag) in
+			[('previous2', self.previous2Flag), ('previous', self.previousFlag), ('current', self.currentFlag)] if flag]
+
+	def tree(self):
+		'''
+		 Returns the exception as a Tree, the and of its characteristics
+		'''
+		trees = [tree_transform(position + "='" + name + "'") for (position, name) in self.characteristics()]
+		return reduce(lambda right, left: Tree(andf, left, right), reversed(trees))
+
+	def __str__(self):
+		return str(self.tree())
+
+	def __repr__(self):
+		return 'Exception_Hypothesis(' + str(self) + ')'
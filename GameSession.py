@@ -0,0 +1,59 @@
+'''
+ The state of one game of New Eleusis.
+
+ Every public entry point (play_card, scientist, score, scan_and_rank_hypothesis,
+ scan_and_rank_rules, ...) takes an optional session and falls back to default_session,
+ so the scripts that play a single game keep working while any number of games can be
+ played side by side in one process.
+'''
+from Board import *
+
+class GameSession:
+    '''
+     Everything a game keeps between two plays: the board, the secret rule, the hypotheses
+     scored so far, the numeric thresholds of map_numeric and the confidence counters of
+     the scientist. The hypothesis scanner, the rule exceptions, the ScanRank hypotheses
+     and the numeric thresholds are created by the modules that own them on first use, see
+     New_Eleusis.session_scanner, New_Eleusis.session_rule_exceptions,
+     ScanRank.session_hypotheses and ScanRank.session_numeric_constraints.
+    '''
+    def __init__(self, rule=None, three_length_hypothesis_flag=True):
+        #[(legal card, [illegal cards played after it])], see Board
+        self.board = Board()
+        #The secret rule cards are validated against, see New_Eleusis.setRule
+        self.rule = rule
+        self.three_length_hypothesis_flag = three_length_hypothesis_flag
+
+        self.play_counter = 0
+        self.top_rule_confidence = {}
+        self.game_ended = False
+        #New_Eleusis: the exception counts of the rules refined lately, see session_rule_exceptions
+        self.rule_exceptions = None
+
+        #New_Eleusis: the count tensors updated by play_card
+        self.hypothesis_scanner = None
+        #ScanRank: the hypotheses scanned so far and the characteristics of the legal cards
+        self.hypothesis_dict = None
+        self.hypothesis_index = None
+        self.char_dict = {}
+        self.begin_index = 0
+
+        #ScanRank.map_numeric: the numeric thresholds still consistent with the board
+        self.numeric_constraints = None
+
+default_session = GameSession()
+
+def get_session(session=None):
+    '''
+     Returns session, or the default session when it is None
+    '''
+    if session is None:
+        return default_session
+    return session
+
+def reset_default_session(rule=None, three_length_hypothesis_flag=True):
+    '''
+     Starts a new game in the default session and returns it
+    '''
+    default_session.__init__(rule, three_length_hypothesis_flag)
+    return default_session
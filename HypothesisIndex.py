@@ -0,0 +1,62 @@
+import heapq
+
+#Number of hypotheses ScanRank keeps indexed, past it the lowest scoring ones are evicted
+HYPOTHESIS_INDEX_CAPACITY = 20000
+#Share of the capacity freed by one eviction, so that evictions stay rare
+EVICTION_SHARE = 0.1
+
+class HypothesisIndex:
+    '''
+     The hypotheses of ScanRank indexed by the characteristic at each of their positions
+     (previous2, previous, current), every hypothesis once. When more than capacity
+     hypotheses are indexed the lowest scoring ones are dropped, from the index and from
+     the scores dict they are ranked by.
+    '''
+    def __init__(self, scores, capacity=HYPOTHESIS_INDEX_CAPACITY):
+        self.scores = scores
+        self.capacity = capacity
+        self.positions = ({}, {}, {})
+        self.members = set()
+
+    def __len__(self):
+        return len(self.members)
+
+    def __contains__(self, hypothesis):
+        return hypothesis in self.members
+
+    def hypotheses(self, position, characteristic):
+        '''
+         Returns the set of hypotheses with the characteristic at a position
+        '''
+        return self.positions[position].get(characteristic, ())
+
+    def add(self, hypothesis):
+        '''
+         Indexes a hypothesis (shape, previous2, previous, current), previous2 is None for two card hypotheses
+        '''
+        if hypothesis in self.members:
+            return
+        self.members.add(hypothesis)
+        for position, characteristic in enumerate(hypothesis[1:]):
+            if characteristic is not None:
+                self.positions[position].setdefault(characteristic, set()).add(hypothesis)
+        if len(self.members) > self.capacity:
+            self.evict(len(self.members) - self.capacity + int(self.capacity * EVICTION_SHARE))
+
+    def remove(self, hypothesis):
+        self.members.discard(hypothesis)
+        for position, characteristic in enumerate(hypothesis[1:]):
+            if characteristic is not None:
+                hypotheses = self.positions[position].get(characteristic)
+                if hypotheses is not None:
+                    hypotheses.discard(hypothesis)
+                    if not hypotheses:
+                        del self.positions[position][characteristic]
+        self.scores.pop(hypothesis, None)
+
+    def evict(self, count):
+        '''
+         Drops the count lowest scoring hypotheses
+        '''
+        for hypothesis in heapq.nsmallest(count, self.members, key=self.scores.get):
+            self.remove(hypothesis)
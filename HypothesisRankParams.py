@@ -10,8 +10,8 @@ class HypothesisRankParams:
 	def get_weight(self):
 		return self.weight
 
-	def increment_occurrence(self):
-		self.occurrence += 1
+	def increment_occurrence(self, count=1):
+		self.occurrence += count
 
 	def decrement_occurrence(self):
 		self.occurrence -= 1
@@ -0,0 +1,168 @@
+import heapq
+import itertools
+
+class Descending:
+    '''
+     Reverses the order of a tie-break key inside a heap entry. The key is only
+     computed when two entries with the same score are compared.
+    '''
+    def __init__(self, key, tiebreak):
+        self.key = key
+        self.tiebreak = tiebreak
+        self.value = None
+
+    def get_value(self):
+        if self.value is None:
+            self.value = self.tiebreak(self.key)
+        return self.value
+
+    def __eq__(self, other):
+        return self.get_value() == other.get_value()
+
+    def __ne__(self, other):
+        return self.get_value() != other.get_value()
+
+    def __lt__(self, other):
+        return other.get_value() < self.get_value()
+
+class HypothesisRanking:
+    '''
+     A dict of scores that also keeps its keys ranked, best score first and ties broken on the
+     larger tiebreak(key), as sorted(..., key=lambda (key, value): (value, key), reverse=True) did.
+     Changed keys are pushed on a heap, once per change between two reads, and outdated
+     entries are skipped when the heap is read, so top(k) costs O(k log n) plus the changes
+     since the last read, and no sorted copy is ever built.
+    '''
+    def __init__(self, items=(), tiebreak=None):
+        self.tiebreak = tiebreak if tiebreak is not None else (lambda key: key)
+        self.scores = {}
+        self.versions = {}
+        self.counter = itertools.count()
+        self.order_keys = {}
+        self.heap = []
+        self.changed = set()
+        for key, score in items:
+            self.scores[key] = score
+        self.rebuild()
+
+    def entry(self, key, score):
+        if key not in self.order_keys:
+            self.order_keys[key] = Descending(key, self.tiebreak)
+        #A key deleted and set again never reuses the version of an outdated entry
+        self.versions[key] = next(self.counter)
+        return (-score, self.order_keys[key], self.versions[key], key)
+
+    def rebuild(self):
+        '''
+         Rebuilds the heap from the current scores, dropping the outdated entries
+        '''
+        self.heap = [self.entry(key, score) for key, score in self.scores.iteritems()]
+        heapq.heapify(self.heap)
+        self.changed.clear()
+
+    def flush(self):
+        '''
+         Pushes the keys changed since the last read
+        '''
+        if len(self.changed) > len(self.scores) // 2:
+            self.rebuild()
+            return
+        for key in self.changed:
+            if key in self.scores:
+                heapq.heappush(self.heap, self.entry(key, self.scores[key]))
+        self.changed.clear()
+        self.compact()
+
+    def compact(self):
+        #Outdated entries may make up at most half of the heap
+        if len(self.heap) > 2 * len(self.scores) + 64:
+            self.rebuild()
+
+    def is_current(self, entry):
+        return self.versions.get(entry[3]) == entry[2] and entry[3] in self.scores
+
+    def __len__(self):
+        return len(self.scores)
+
+    def __contains__(self, key):
+        return key in self.scores
+
+    def __getitem__(self, key):
+        return self.scores[key]
+
+    def get(self, key, default=None):
+        return self.scores.get(key, default)
+
+    def __setitem__(self, key, score):
+        self.scores[key] = score
+        self.changed.add(key)
+
+    def increment(self, keys, amount):
+        '''
+         Adds amount to the score of every key, cheaper than one += per key
+        '''
+        scores = self.scores
+        for key in keys:
+            scores[key] += amount
+        self.changed.update(keys)
+
+    def __delitem__(self, key):
+        del self.scores[key]
+        self.versions.pop(key, None)
+        self.order_keys.pop(key, None)
+        self.changed.discard(key)
+        self.compact()
+
+    def pop(self, key, *default):
+        if key not in self.scores:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        score = self.scores[key]
+        del self[key]
+        return score
+
+    def update(self, items):
+        for key, score in items:
+            self[key] = score
+
+    def keys(self):
+        return self.scores.keys()
+
+    def iteritems(self):
+        '''
+         The (key, score) pairs in no particular order, see ranked for the rank order
+        '''
+        return self.scores.iteritems()
+
+    def itervalues(self):
+        return self.scores.itervalues()
+
+    def top(self, k):
+        '''
+         Returns the k best (key, score) pairs, best first
+        '''
+        self.flush()
+        best = []
+        while self.heap and len(best) < k:
+            entry = heapq.heappop(self.heap)
+            if self.is_current(entry):
+                best.append(entry)
+        for entry in best:
+            heapq.heappush(self.heap, entry)
+        return [(entry[3], -entry[0]) for entry in best]
+
+    def ranked(self):
+        '''
+         Yields the (key, score) pairs in rank order, lazily
+        '''
+        self.flush()
+        heap = list(self.heap)
+        while heap:
+            entry = heapq.heappop(heap)
+            if self.is_current(entry):
+                yield (entry[3], -entry[0])
+
+    def __iter__(self):
+        for key, score in self.ranked():
+            yield key
@@ -0,0 +1,287 @@
+'''
+ Count-tensor scoring of the ScanRank hypotheses.
+
+ Every hypothesis is a boolean function of the characteristics at its positions, so the
+ number of windows it holds in can be read off one tensor counting the characteristic
+ triples of the windows, and its marginals: and shapes are entries of the tensor, or
+ shapes follow by inclusion-exclusion. Counting is linear in the board length and scoring
+ costs the same whatever the number of hypotheses seen so far.
+
+ Besides the 23 characteristics of its card, a position has the relational characteristics
+ of its card to an earlier card of the window (see CardCodec.RELATION_NAMES), so rules such
+ as "same suit as previous" are single hypotheses scored the same way.
+'''
+import numpy as np
+from collections import OrderedDict
+from itertools import combinations
+from NewEleusisHelper import *
+from ScanRank import HYPOTHESIS_SHAPES, TWO_CARD_SHAPES, THREE_CARD_SHAPES
+from ScanRank import PREVIOUS2, PREVIOUS, CURRENT, characteristic_weights, hypothesis_rank_key, hypothesis_string
+from HypothesisRanking import *
+
+#Every card has a value, color, suit, parity and royal characteristic
+CHARACTERISTICS_PER_CARD = 5
+#The card and relational characteristics along each axis of a count tensor
+AXIS_SIZE = NUMBER_OF_CHARACTERISTICS + NUMBER_OF_RELATIONS
+
+#For each arity, the (later, earlier) indices in a window of the cards the relational
+#characteristics of every position compare, see CardCodec.RELATED_POSITIONS. None where the
+#window has no earlier card.
+RELATED_CARDS = {3: [(2, 0), (1, 0), (2, 1)], 2: [None, None, (1, 0)]}
+
+#CHARACTERISTIC_MATRIX[code, id - 1] is 1 when the card has the characteristic
+CHARACTERISTIC_MATRIX = np.zeros((NUMBER_OF_CARDS, AXIS_SIZE), dtype=np.int64)
+#CHARACTERISTIC_INDICES[code] holds the axis indices (id - 1) of the characteristics of a card
+CHARACTERISTIC_INDICES = []
+for code in xrange(NUMBER_OF_CARDS):
+    CHARACTERISTIC_INDICES.append(np.array(CARD_CHARACTERISTIC_IDS[code]) - 1)
+    CHARACTERISTIC_MATRIX[code, CHARACTERISTIC_INDICES[code]] = 1
+#The same for the relational characteristics of a card code to an earlier one
+RELATION_INDICES = np.array(CARD_RELATION_IDS, dtype=np.intp) - 1
+RELATION_MATRIX = np.zeros((NUMBER_OF_CARDS, NUMBER_OF_CARDS, AXIS_SIZE), dtype=np.int64)
+for later in xrange(NUMBER_OF_CARDS):
+    for earlier in xrange(NUMBER_OF_CARDS):
+        RELATION_MATRIX[later, earlier, RELATION_INDICES[later, earlier]] = 1
+
+def axis_vector(vector, position):
+    '''
+     Lays a vector over the characteristic ids along the axis of a position
+    '''
+    shape = [1, 1, 1]
+    shape[position] = len(vector)
+    return np.reshape(vector, shape)
+
+class CountTensor:
+    '''
+     counts[i, j, k] is the number of windows whose previous2, previous and current positions
+     have the characteristics i + 1, j + 1 and k + 1. Two card windows keep a previous2
+     axis of size 1.
+    '''
+    def __init__(self, arity, windows=()):
+        self.arity = arity
+        size = AXIS_SIZE
+        self.counts = np.zeros((size if arity == 3 else 1, size, size), dtype=np.int64)
+        self.windows = 0
+        #The number of characteristics every window has along each axis
+        self.axis_characteristics = [CHARACTERISTICS_PER_CARD + (RELATIONS_PER_PAIR if related else 0)
+                                     for related in RELATED_CARDS[arity]]
+        if arity == 2:
+            self.axis_characteristics[PREVIOUS2] = 1
+        self.add_windows(windows)
+
+    def add_windows(self, windows):
+        '''
+         Counts a list of windows, each a tuple of arity card codes, with one einsum
+        '''
+        codes = np.array(windows, dtype=np.intp).reshape(-1, self.arity)
+        axes = []
+        for (position, related) in enumerate(RELATED_CARDS[self.arity]):
+            if position == PREVIOUS2 and self.arity == 2:
+                axes.append(np.ones((len(codes), 1), dtype=np.int64))
+                continue
+            characteristics = CHARACTERISTIC_MATRIX[codes[:, position - 3]]
+            if related is not None:
+                characteristics = characteristics + RELATION_MATRIX[codes[:, related[0]], codes[:, related[1]]]
+            axes.append(characteristics)
+        self.counts += np.einsum('wi,wj,wk->ijk', *axes)
+        self.windows += len(codes)
+
+    def add_window(self, window):
+        '''
+         Counts a single window, touching only the cells of its characteristics
+        '''
+        indices = []
+        for (position, related) in enumerate(RELATED_CARDS[self.arity]):
+            if position == PREVIOUS2 and self.arity == 2:
+                indices.append(np.zeros(1, dtype=np.intp))
+            elif related is None:
+                indices.append(CHARACTERISTIC_INDICES[window[position - 3]])
+            else:
+                indices.append(np.concatenate((CHARACTERISTIC_INDICES[window[position - 3]],
+                                               RELATION_INDICES[window[related[0]], window[related[1]]])))
+        self.counts[np.ix_(*indices)] += 1
+        self.windows += 1
+
+    def matching(self, positions):
+        '''
+         Returns the number of windows in which every given position has its characteristic,
+         as an array that broadcasts against counts
+        '''
+        summed = tuple(axis for axis in (PREVIOUS2, PREVIOUS, CURRENT) if axis not in positions)
+        if not summed:
+            return self.counts
+        #Summing out an axis counts each window once per characteristic along that axis
+        windows_counted = reduce(lambda product, axis: product * self.axis_characteristics[axis], summed, 1)
+        return self.counts.sum(axis=summed, keepdims=True) // windows_counted
+
+def shape_support(tensor, shape):
+    '''
+     Returns the number of windows every hypothesis of a shape holds in
+    '''
+    (operator, nested, order) = HYPOTHESIS_SHAPES[shape]
+    matching = tensor.matching
+    if nested:
+        (first, second, third) = order
+        if operator == 'and':
+            support = matching((first, second)) + matching((first, third)) - matching(order)
+        else:
+            support = matching((first,)) + matching((second, third)) - matching(order)
+    elif operator == 'and':
+        support = matching(order)
+    else:
+        #Inclusion-exclusion over the subsets of positions
+        support = 0
+        for size in xrange(1, len(order) + 1):
+            for subset in combinations(order, size):
+                support = support + (-1) ** (size + 1) * matching(subset)
+    return np.broadcast_to(support, tensor.counts.shape)
+
+def shape_weight(shape):
+    '''
+     Returns the weight every hypothesis of a shape starts with, see ScanRank.calculate_weight
+    '''
+    (operator, nested, order) = HYPOTHESIS_SHAPES[shape]
+    weights = [axis_vector(np.array(characteristic_weights[1:]), position) for position in order]
+    if operator == 'or':
+        return reduce(np.maximum, weights)
+    if nested:
+        return (weights[0] + weights[1]) / 2
+    return sum(weights) / len(weights)
+
+SHAPE_WEIGHTS = [shape_weight(shape) for shape in xrange(len(HYPOTHESIS_SHAPES))]
+
+def hypothesis_scores(legal, illegal, shapes):
+    '''
+     Returns {hypothesis: score} for the hypotheses of the shapes that were seen in a legal
+     window. The score is the weight of the hypothesis times the number of legal windows it
+     holds in, less the illegal plays it would have allowed.
+    '''
+    seen = np.nonzero(legal.counts)
+    characteristics = [axis.tolist() for axis in seen]
+    if legal.arity == 3:
+        previous2_ids = [i + 1 for i in characteristics[0]]
+    else:
+        previous2_ids = [None] * len(characteristics[0])
+    previous_ids = [j + 1 for j in characteristics[1]]
+    current_ids = [k + 1 for k in characteristics[2]]
+
+    scores = {}
+    for shape in shapes:
+        support = shape_support(legal, shape) - shape_support(illegal, shape)
+        values = (SHAPE_WEIGHTS[shape] * support)[seen].tolist()
+        hypotheses = zip([shape] * len(values), previous2_ids, previous_ids, current_ids)
+        scores.update(zip(hypotheses, values))
+    return scores
+
+def rank_hypothesis_scores(scores):
+    '''
+     Keeps the hypotheses scoring above the mean, ranked as scan_and_rank_hypothesis ranks them
+    '''
+    mean_cutoff = sum(scores.itervalues()) / max(len(scores), 1)
+    return HypothesisRanking(((key, value) for key, value in scores.iteritems() if value > mean_cutoff),
+                             tiebreak=hypothesis_string)
+
+def count_and_rank_hypothesis(three_length_hypothesis_flag):
+    '''
+     Scores the hypotheses of the whole board from its count tensors, returns them ranked
+     like scan_and_rank_hypothesis does
+    '''
+    board = get_master_board_state()
+    legal_cards = board.legal_codes
+    windows = [legal_cards[i-2:i+1] for i in xrange(2, len(legal_cards))]
+    illegal_tuple_list = board.illegal_codes
+
+    scores = {}
+    if three_length_hypothesis_flag:
+        illegal_windows = [elem for elem in illegal_tuple_list if len(elem) == 3]
+        scores.update(hypothesis_scores(CountTensor(3, windows), CountTensor(3, illegal_windows), THREE_CARD_SHAPES))
+    illegal_windows = [elem for elem in illegal_tuple_list if len(elem) == 2]
+    scores.update(hypothesis_scores(CountTensor(2, [window[1:] for window in windows]),
+                                    CountTensor(2, illegal_windows), TWO_CARD_SHAPES))
+    return rank_hypothesis_scores(scores)
+
+class HypothesisScanner:
+    '''
+     Keeps the count tensors of a game up to date one play at a time. observe_legal and
+     observe_illegal only touch the cells of the new window, the scores are recomputed
+     from the tensors, at a cost independent of the board length, when ranked is called.
+    '''
+    def __init__(self, three_length_hypothesis_flag=True):
+        self.three_length_hypothesis_flag = three_length_hypothesis_flag
+        self.legal_cards = []
+        self.legal = {3: CountTensor(3), 2: CountTensor(2)}
+        self.illegal = {3: CountTensor(3), 2: CountTensor(2)}
+        self.shape_scores = None
+
+    def observe_legal(self, card):
+        '''
+         Adds a card accepted on the board
+        '''
+        legal_cards = self.legal_cards
+        legal_cards.append(encode_card(card))
+        if len(legal_cards) > 2:
+            self.legal[3].add_window(legal_cards[-3:])
+            self.legal[2].add_window(legal_cards[-2:])
+        self.shape_scores = None
+
+    def observe_illegal(self, card):
+        '''
+         Adds a card rejected after the last legal card
+        '''
+        legal_cards = self.legal_cards
+        code = encode_card(card)
+        if len(legal_cards) > 1:
+            self.illegal[3].add_window((legal_cards[-2], legal_cards[-1], code))
+        if legal_cards:
+            self.illegal[2].add_window((legal_cards[-1], code))
+        self.shape_scores = None
+
+    def shapes(self):
+        if self.three_length_hypothesis_flag:
+            return list(THREE_CARD_SHAPES) + list(TWO_CARD_SHAPES)
+        return list(TWO_CARD_SHAPES)
+
+    def scores(self):
+        '''
+         Returns [(shape, arity, scores, seen)], the score of every cell of the tensor
+         of each shape and the mask of the hypotheses seen in a legal window
+        '''
+        if self.shape_scores is None:
+            self.shape_scores = []
+            for shape in self.shapes():
+                arity = 2 if shape in TWO_CARD_SHAPES else 3
+                (legal, illegal) = (self.legal[arity], self.illegal[arity])
+                support = shape_support(legal, shape) - shape_support(illegal, shape)
+                self.shape_scores.append((shape, arity, SHAPE_WEIGHTS[shape] * support, legal.counts > 0))
+        return self.shape_scores
+
+    def ranked(self, k=None):
+        '''
+         Returns the k best hypotheses scoring above the mean, ranked like
+         count_and_rank_hypothesis ranks them; all of them when k is None
+        '''
+        shape_scores = self.scores()
+        total = sum(scores[seen].sum() for (shape, arity, scores, seen) in shape_scores)
+        count = sum(seen.sum() for (shape, arity, scores, seen) in shape_scores)
+        mean_cutoff = total / max(count, 1)
+
+        candidates = [(shape, arity, np.nonzero(seen & (scores > mean_cutoff)))
+                      for (shape, arity, scores, seen) in shape_scores]
+        values = np.concatenate([scores[cells] for ((shape, arity, scores, seen), (_, _, cells))
+                                 in zip(shape_scores, candidates)])
+        threshold = None
+        if k is not None and len(values) > k:
+            #Only the hypotheses tied with or above the kth best score need sorting
+            threshold = np.partition(values, len(values) - k)[len(values) - k]
+
+        ranked_hypothesis = []
+        for ((shape, arity, scores, seen), (_, _, cells)) in zip(shape_scores, candidates):
+            if threshold is not None:
+                cells = tuple(axis[scores[cells] >= threshold] for axis in cells)
+            (previous2, previous, current) = [(axis + 1).tolist() for axis in cells]
+            if arity == 2:
+                previous2 = [None] * len(previous2)
+            hypotheses = zip([shape] * len(current), previous2, previous, current)
+            ranked_hypothesis.extend(zip(hypotheses, scores[cells].tolist()))
+        ranked_hypothesis.sort(key = hypothesis_rank_key, reverse=True)
+        return OrderedDict(ranked_hypothesis[:k])
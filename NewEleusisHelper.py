@@ -7,11 +7,12 @@ import time
 from collections import OrderedDict
 from itertools import combinations
 import time
+from CardCodec import *
+from GameSession import *
+from Board import *
 
 
 
-master_board_state = [] # [('10S', []), ('3H', []), ('10H', []), ('10H', []), ('10H', []), ('10H', []) ]
-
 def pick_random_card():
     '''
       This function picks a random card based in the suit and numeric characterstic
@@ -22,6 +23,11 @@ def pick_random_card():
     return card
 
 def update_board_state(board_state,flag,current_card):
+    #A Board keeps its legal cards and illegal tuples current itself
+    if isinstance(board_state, Board):
+        board_state.play(current_card, flag == True)
+        return board_state
+
     #If the card is valid, append it at the end of the board state with an empty list.
     
     if flag == True:
@@ -48,51 +54,26 @@ def initialize_negative_characteristic_list(card_characterstic_list):
     characterstic_list.append(negative_characterstic_list[card_characterstic_list[2]])
     return pick_random_card(characterstic_list)
 
-def get_master_board_state():
-    '''This function returns the master_board_state
+def get_master_board_state(session=None):
+    '''This function returns the board of the session, the default session if it is None
     '''
-    return master_board_state
-
-def parse_board_state():
-
-    board_state = get_master_board_state()
-    prev = ''
-    prev2 = ''
-    if len(board_state) == 2:
-        #2 elements present, initialize prev & prev2
-        prev2 = board_state[0]
-        prev = board_state[1]
-        #Check if 1 or 2 cards are played based on the rule generated.
-        #Return the legal board state.
-        #Based on the rule curr, prev and prev2 will be initialized. 
-    else:
-        curr_tuple = board_state[-1]
-        if curr_tuple[1]:
-            curr = curr_tuple[1][-1]
-        else:
-            curr = curr_tuple[0]
-        prev2, prev = prev, curr
-    legal_cards = [x for (x,y) in board_state]
-    return_dict = {'prev2':prev2, 'prev':prev, 'curr':curr, 'legal_cards':legal_cards}
+    return get_session(session).board
+
+def parse_board_state(session=None):
+    '''This function returns the card played last as curr and prev (prev2 is empty) and the legal
+    cards of the board, the board's own list
+    '''
+    board_state = get_master_board_state(session)
+    curr = board_state.last_card()
+    return_dict = {'prev2':'', 'prev':curr, 'curr':curr, 'legal_cards':board_state.legal_cards}
     return return_dict
 
-def parse_illegal_indices():
+def parse_illegal_indices(session=None):
     '''This function returns list of tuples of length 3 representing curr as the illegal card, 
     and prev, prev2 are immediately preceding legal ones. 
-    Illegal tuples of length 3 and 2 are currently handled. 
+    Illegal tuples of length 3 and 2 are currently handled. The list is the board's own.
     '''
-    illegal_tuple_list = list()
-    board_state = get_master_board_state()
-    for index, value in enumerate(board_state):
-        if value[1]:
-            illegal_index_list = value[1]
-            for elem in illegal_index_list:
-                illegal_tuple_length_three = (board_state[index - 1][0], value[0], elem)
-                illegal_tuple_list.append(illegal_tuple_length_three)
-                illegal_tuple_length_two = (value[0], elem)
-                illegal_tuple_list.append(illegal_tuple_length_two)
-
-    return illegal_tuple_list
+    return get_master_board_state(session).illegal_tuples
 
 def map_card_characteristic_to_property(prop):
     '''
@@ -128,60 +109,16 @@ def get_card_characteristics(current):
      This function return a list of all the characterstic associated with the current card
     '''
     #color, suite, number, even/odd, royal
-    royal = ['A', 'J', 'Q', 'K']
+    code = encode_card(current)
     card_char = {}
-    #color = ""
-    if len(current) == 2:
-        card_num = current[0]
-        card_suite = current[1]
-    elif len(current) == 3:
-        card_num = current[0]+current[1]
-        card_suite = current[2]
-    else:
-        print current
-    #See if the card is royal is not
-
-    if card_num in royal:
-        card_char['royal'] = 'royal'
-    else:
-        card_char['not_royal'] = 'not_royal'
-
-    #Adding the color in the char dictionary
-    if card_suite == 'H' or card_suite == 'D':
-        card_char['color'] = 'R'
-    else:
-        card_char['color'] = 'B'
-
-    #Adding the suite in the char dictionary
-    if card_suite == 'H':
-        card_char['suite'] = 'H'
-    elif card_suite == 'D':
-        card_char['suite'] = 'D'
-    elif card_suite == 'C':
-        card_char['suite'] = 'C'
-    else:
-        card_char['suite'] = 'S'        
-
-    #Adding the number in the card dictionary
-    if card_num == 'A':
-        card_num = '1'
-    elif card_num == 'J':
-        card_num = '11'
-    elif card_num == 'Q':
-        card_num = '12'
-    elif card_num == 'K':
-        card_num = '13'
-
-    card_char[card_num] = card_num
-
-    #Adding the even/odd property of the card in the char dictionary 
-    card_num = int(card_num)
-    if card_num % 2 == 0:
-        card_char['even'] = 'even'
-    else:
-        card_char['odd'] = 'odd'
-
-    
+    for characteristic in CARD_CHARACTERISTICS[code]:
+        card_characteristic = map_card_characteristic_to_value(characteristic)
+        if characteristic in ('C14', 'C15'):
+            card_char['color'] = card_characteristic
+        elif characteristic in ('C16', 'C17', 'C18', 'C19'):
+            card_char['suite'] = card_characteristic
+        else:
+            card_char[card_characteristic] = card_characteristic
     return card_char
 
 def initalize_characteristic_list():
@@ -195,6 +132,8 @@ def set_characteristic_weights():
       This function assigns a weighted probability for each card characterstic
     '''
     weighted_property_dict = {'C1' : 0.08, 'C2':0.08, 'C3': 0.08, 'C4':0.08, 'C5':0.08, 'C6':0.08, 'C7':0.08, 'C8':0.08, 'C9': 0.08, 'C10': 0.08, 'C11': 0.08, 'C12': 0.08, 'C13': 0.08, 'C14' : 0.5, 'C15': 0.5, 'C16': 0.5, 'C17':0.5, 'C18':0.5, 'C19':0.5, 'C20':0.05, 'C21':0.05, 'C22': 0.77, 'C23':0.01}
+    #A relational characteristic weighs as the characteristic it compares, royalty as not_royal
+    weighted_property_dict.update({'C24': 0.5, 'C25': 0.5, 'C26': 0.5, 'C27': 0.5, 'C28': 0.05, 'C29': 0.05, 'C30': 0.08, 'C31': 0.08, 'C32': 0.08, 'C33': 0.01, 'C34': 0.01})
     return weighted_property_dict
 
 def initialize_variable_offset():
@@ -229,15 +168,10 @@ def initialize_variable_offset():
 
 def get_card_value(card):
     """Returns the numeric value of a card or card value as an integer 1..13"""
-    prefix = card[:len(card) - 1]
-    names = {'A':1, 'J':11, 'Q':12, 'K':13}
-    if prefix in names:
-        return names.get(prefix)
-    else:
-        return int(prefix)
+    return CARD_VALUE[encode_card(card)]
 
 
-def pick_negative_random(card_characterstic_list, last_rule_counter, card_list = []):
+def pick_negative_random(card_characterstic_list, last_rule_counter, card_list = [], session=None):
     '''
      Picks a random negative card based on the characterstic presented
     '''
@@ -246,13 +180,9 @@ def pick_negative_random(card_characterstic_list, last_rule_counter, card_list =
     royal_card = {'J', 'Q', 'K'}
     numeric_characterstic = {'A':False,'2':False,'3':False,'4':False,'5':False,'6':False,'7':False,'8':False,'9':False,'10':False,'J':False,'Q':False,'K':False}
     suit_characterstic = {'C':False,'S':False,'D':False,'H':False}
-    legal_cards = parse_board_state()['legal_cards']
+    legal_cards = parse_board_state(session)['legal_cards']
     # print('-------------------legal_cards-----------------------', legal_cards)
-    illegal_cards = parse_illegal_indices()
-    illegal_counter = 0
-    for elem in illegal_cards:
-        if len(elem) == 2:
-            illegal_counter += 1
+    illegal_counter = get_master_board_state(session).illegal_plays()
 
     # ratio_legal = float(len(legal_cards))/float(len(legal_cards)+ illegal_counter)
     # print('-------------------legal_cards-----------------------', len(legal_cards))
@@ -391,7 +321,6 @@ def get_card_from_characterstic(suite_characterstic, number_characterstic, card_
     negative_card_list = []
     color_mapping = get_negative_color_mapping()
     suite_mapping = get_negative_suite_mapping()
-    negative_suite_list = []
     numeric_characterstic_dict = {'A':False,'2':False,'3':False,'4':False,'5':False,'6':False,'7':False,'8':False,'9':False,'10':False,'J':False,'Q':False,'K':False}
 
     if (card_list):
@@ -409,14 +338,12 @@ def get_card_from_characterstic(suite_characterstic, number_characterstic, card_
             if 'suite' in characterstic_list:
                 suit_card_list = []
                 suite_characterstic = characterstic_list['suite'].split(',')
-                for suite in suite_characterstic:
-                    if not negative_suite_list:
-                        negative_suite_list.append(suite_mapping[suite])
-                    else:
-                        negative_suite_list = list(set(negative_suite_list) & set(suite_mapping[suite]))
+                #The suits outside every suit of the hypothesis
+                negative_suite_list = [elem for elem in ['H', 'S', 'D', 'C']
+                                       if all(elem in suite_mapping[suite] for suite in suite_characterstic)]
                 if not negative_card_list:
                     negative_card_list = card_list
-                for suite in negative_suite_list[0]:
+                for suite in negative_suite_list:
                     for card in negative_card_list:
                         if suite in card:
                             suit_card_list.append(card)
@@ -501,7 +428,7 @@ def get_card_from_characterstic(suite_characterstic, number_characterstic, card_
 
     return random.choice(negative_card_list)
 
-def pick_next_negative_card(rule_list, last_rule_counter,card_list = []):
+def pick_next_negative_card(rule_list, last_rule_counter,card_list = [], session=None):
     '''
      This returns a negative card associated with the top rule by using an intersection of the
      card characterstics of the top rule. If there is no intersection found we just return a
@@ -537,39 +464,19 @@ def pick_next_negative_card(rule_list, last_rule_counter,card_list = []):
 
 
     for rules in top_rule_list:
-        # print('-------------------rules-----------------------', str(rules))    
-        # return
         number_list =['C1','C2','C3','C4','C5','C6','C7','C8','C9','C10','C11','C12','C13']
-        curr_val_pattern = re.compile("([a-z_]+)\([\s]*(current)\)\,[\s]*([1-9BRSCHD][0-9]?)")
-        even_pattern = re.compile("(even)\([\s]*(current)\)")
-        odd_pattern = re.compile("(odd)\([\s]*(current)\)")
-        royal_pattern = re.compile("((.{4})\([\s]*(is\_royal)\((current)\))")
-
 
+        #The characteristics the rule asks of the current card, a characteristic it rules
+        #out counts as its opposite, as not(is_royal(current)) counts as not_royal
         char_index_list = []
-        curr_val_iter = re.finditer(curr_val_pattern, str(rules))
-        for curr_val in curr_val_iter:
-            attribute_val = curr_val.group(3)
-            char_index_list.append(map_card_characteristic_to_property(attribute_val))
-
-        curr_val_iter = re.finditer(even_pattern, str(rules))
-        for curr_val in curr_val_iter:
-            attribute_val = curr_val.group(1)
-            char_index_list.append(map_card_characteristic_to_property(attribute_val))
-        
-        curr_val_iter = re.finditer(odd_pattern, str(rules))
-        for curr_val in curr_val_iter:
-            attribute_val = curr_val.group(1)
-            char_index_list.append(map_card_characteristic_to_property(attribute_val))
-
-        curr_val_iter = re.finditer(royal_pattern, str(rules))
-        for curr_val in curr_val_iter:
-            attribute_val = curr_val.group(2)
-            if attribute_val == 'notf':
-                char_index_list.append(map_card_characteristic_to_property('not_royal'))
-            else:
-                char_index_list.append(map_card_characteristic_to_property('royal'))
-
+        for (position, characteristic, positive) in rules.constraints():
+            if position != 'current':
+                continue
+            if not positive:
+                characteristic = OPPOSITE_CHARACTERISTIC.get(characteristic)
+                if characteristic is None:
+                    continue
+            char_index_list.append(CHARACTERISTIC_NAMES[characteristic - 1])
 
         for char_index in char_index_list:
             # put out negative of the current card card characterstic
@@ -672,7 +579,7 @@ def pick_next_negative_card(rule_list, last_rule_counter,card_list = []):
         else:
             card_characterstic_list['royal'] = True
             card_characterstic_list['not_royal'] = True
-    return pick_negative_random(card_characterstic_list, last_rule_counter,card_list)
+    return pick_negative_random(card_characterstic_list, last_rule_counter,card_list, session)
 
 def max_dict(dict):
     hash_table = {}
@@ -689,36 +596,19 @@ def max_dict(dict):
     
     return max_value_list
 def update_characteristic_list(current_card, current_card_index, char_dict):
-    '''Read the current card
-     Get the card characteristics by invoking get_card_characteristics()
-     Invoke the map_card_characteristics() to get the corresponding numeric index into the card characteristic list.
-    Append the characteristics list with the index of the current card.
+    '''Read the current card code
+     Look up its characteristics in the precomputed CARD_CHARACTERISTICS table
+    Store the characteristics list against the index of the current card.
     '''
-    board_state = parse_board_state()
-    
-    card_characteristics = get_card_characteristics(current_card)
-    for characteristic in card_characteristics:
-        card_characteristic_index = map_card_characteristic_to_property(card_characteristics[characteristic])
-
-        #char_dict[card_characteristic_index].append(board_state['legal_cards'].index(current_card))
-        if current_card_index not in char_dict.keys():
-            char_dict[current_card_index] = []
-        char_dict[current_card_index].append(card_characteristic_index)
+    char_dict[current_card_index] = list(CARD_CHARACTERISTICS[encode_card(current_card)])
     return char_dict
 
 
 def get_card_mapping_characterstic(current_card):
-    '''Read the current card
-     Get the card characteristics by invoking get_card_characteristics()
-     Invoke the map_card_characteristics() to get the corresponding numeric index into the card characteristic list.
-     Append the characteristics list with the index of the current card.
+    '''Read the current card, as a string or a card code
+     Returns the tuple of characteristic indices (C1..C23) of the card from the precomputed table.
      '''
-    card_characteristics = get_card_characteristics(current_card)
-    card_characteristic_list = []
-    for characteristic in card_characteristics:
-        card_characteristic_index = map_card_characteristic_to_property(card_characteristics[characteristic])
-        card_characteristic_list.append(card_characteristic_index)
-    return card_characteristic_list
+    return CARD_CHARACTERISTICS[encode_card(current_card)]
 
 def get_card_from_characteristics(card_characteristics):
     '''
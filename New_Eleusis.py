@@ -1,340 +1,25 @@
 
 import random
 import operator
-import itertools
 from collections import OrderedDict
 from itertools import combinations
 import time
 import re
 from NewEleusisHelper import *
+from TreeFunctions import *
+from RuleTable import *
+from BatchEvaluator import *
+from HypothesisRanking import *
 from ScanRank import scan_and_rank_hypothesis
-from ScanRank import scan_and_rank_rules
+from ScanRank import scan_and_rank_rules, scan_and_rank_numeric_hypothesis
+from HypothesisTensor import HypothesisScanner
+from CardSelection import pick_informative_card
+from ExceptionMiner import refined_rule, RuleExceptions
+from ExceptionMiner import REFINED_RULES, EXCEPTION_CACHE_SIZE
 
-from Exception_Hypothesis import *
 
-global top_rule_confidence
-top_rule_confidence = {}   
 global master_rule
 
-global game_ended
-game_ended = False
-
-# Trivial functions to be used in the important test functions
-# All require a nonempty string as the argument
-
-def is_suit(s):
-    """Test if parameter is one of Club, Diamond, Heart, Spade"""
-    return s in "CDHS"
-
-def is_color(s):
-    """Test if parameter is one of Black or Red"""
-    return s in "BR"
-
-def is_value(s):
-    """Test if parameter is a number or can be interpreted as a number"""
-    return s.isdigit() or (len(s) == 1 and s[0] in "AJQK")
-
-def is_card(s):
-    """Test if parameter is a value followed by a suit"""
-    return is_suit(s[-1]) and is_value(s[:len(s) - 1])
-
-def value_to_number(name):
-    """Given the "value" part of a card, returns its numeric value"""
-    values = [None, 'A', '2', '3', '4', '5', '6',
-              '7', '8', '9', '10', 'J', 'Q', 'K']
-    return values.index(name)
-
-def number_to_value(number):
-    """Given the numeric value of a card, returns its "value" name"""
-    values = [None, 'A', '2', '3', '4', '5', '6',
-              '7', '8', '9', '10', 'J', 'Q', 'K']
-    return values[number]
-
-# -------------------- Important functions
-
-def suit(card):
-    """Returns the suit of a card"""
-    return card[-1]
-
-def color(card):
-    """Returns the color of a card"""
-    return {'C':'B', 'D':'R', 'H':'R', 'S':'B'}.get(suit(card))
-
-def value(card):
-    """Returns the numeric value of a card or card value as an integer 1..13"""
-    prefix = card[:len(card) - 1]
-    names = {'A':1, 'J':11, 'Q':12, 'K':13}
-    if prefix in names:
-        return names.get(prefix)
-    else:
-        return int(prefix)
-
-def is_royal(card):
-    """Tests if a card is royalty (Jack, Queen, or King)"""
-    return value(card) > 10
-
-def equal(a, b):
-    """Tests if two suits, two colors, two cards, or two values are equal."""
-    return str(a) == str(b) # This is to allow comparisons with integers
-
-def less(a, b):
-    """Tests if a is less than b, where a and b are suits, cards,
-       colors, or values. For suits: C < D < H < S. For colors,
-       B < R. For cards, suits are considered first, then values.
-       Values are compared numerically."""
-
-    if isinstance(a, int):
-        a = number_to_value(a)
-    if isinstance(b, int):
-        b = number_to_value(b)
-
-    if is_card(a):
-        if suit(a) != suit(b):
-            return suit(a) < suit(b)
-        else:
-            return value(a) < value(b)
-    elif is_value(a):
-        return value_to_number(a) < value_to_number(b)
-    else:
-        return a < b
-
-def greater(a, b):
-    """The opposite of less"""
-    return less(b, a)
-
-def plus1(x):
-    """Returns the next higher value, suit, or card in a suit;
-       must be one. If a color, returns the other color"""
-    if is_value(x):
-        assert value_to_number(x) < 13
-        return number_to_value(value_to_number(x) + 1)
-    elif is_suit(x):
-        assert x != 'S'
-        return "CDHS"["CDHS".index(x) + 1]
-    elif is_card(x):
-        return number_to_value(value(x) + 1) + suit(x)
-    elif is_color(x):
-        return "BR"["BR".index(x) - 1]
-    
-def minus1(x):
-    """Returns the next lower value, suit, or card in a suit;
-       must be one. If a color, returns the other color"""
-    if is_value(x):
-        assert value_to_number(x) > 1
-        return number_to_value(value_to_number(x) - 1)
-    elif is_suit(x):
-        assert x != 'C'
-        return "CDHS"["CDHS".index(x) - 1]
-    elif is_card(x):
-        return number_to_value(value(x) - 1) + suit(x)
-    elif is_color(x):
-        return "BR"["BR".index(x) - 1]
-
-def even(card):
-    """Tells if the card's numeric value is even"""
-    return value(card) % 2 == 0
-
-def odd(card):
-    """Tells if the card's numeric value is odd"""
-    return value(card) % 2 != 0
-
-# -------------------- Lists of allowable functions
-
-# These functions are declared so that logic can be supported;
-# the actual implementation is in the 'evaluate' function
-def andf(): pass
-def orf():  pass
-def notf(): pass
-def iff():  pass
-
-functions = [suit, color, value, is_royal, equal, less,
-             greater, plus1, minus1, even, odd, andf,
-             orf, notf, iff]
-
-function_names = ['suit', 'color', 'value', 'is_royal',
-                  'equal', 'equals', 'less', 'greater', 'plus1',
-                  'minus1', 'even', 'odd', 'andf', 'orf',
-                  'notf', 'iff', 'and', 'or', 'not', 'if']
-
-# ----- Functions for creating, printableing, and evaluating Trees
-
-# Build a dictionary from function names to actual functions
-to_function = {'and':andf, 'or':orf, 'not':notf, 'if':iff, 'equals':equal, 'even':even, 'odd':odd, 'greater':greater, 'less':less}
-for f in functions:
-    to_function[f.__name__] = f
-    
-def quote_if_needed(s):
-    """If s is not a function, quote it"""
-    function_names = map(lambda x: x.__name__, functions)
-    return s if s in function_names else "'" + s + "'"
-
-def scan(s):
-    """This is an iterator for "tokens," where a token is a
-       parenthesis or sequence of nonblank characters; commas
-       and whitespace act as delimiters, and are discarded"""
-    token = ''
-    for ch in s:
-        if ch.isspace():
-            continue
-        if ch in '(),':
-            if token != '':
-                yield token
-                token = ''
-            if ch != ',':
-                yield ch
-        else:
-            token += ch
-    if token != '':
-        yield token
-            
-def tree(s):
-    """Given a function in the usual "f(a, b)" notation, returns
-       a Tree representation of that function, for example,
-       equal(color(current),'R') becomes
-       Tree(equal(Tree(color(current)),'R')) """
-    tokens = list(scan(s))
-    if len(tokens) == 1:
-        return tokens[0]
-    expr = ""
-    functions = [] # a stack of functions
-    args = []      # a stack of argument lists
-    depth = 0
-    for i in range(0, len(tokens) - 1):
-        if tokens[i + 1] == '(':
-            f = to_function[tokens[i]]
-            depth += 1
-        expr += tokens[i]
-        if tokens[i] == ')':
-            expr += ')'
-            depth -= 1
-    assert depth == 1, "*** Unmatched parentheses ***"
-    return expr + '))'
-
-def combine(f, args):
-    """Makes a Tree from a function and a list of arguments"""
-    if len(args) == 1:
-        return Tree(f, args[0])
-    elif len(args) == 2:
-        return Tree(f, args[0], args[1])
-    elif len(args) == 3:
-        return Tree(f, args[0], args[1], args[2])
-    else:
-        raise Exception("Incorrect arguments: {} {}".format(f, str(args)))
-    
-def parse(s):
-    """Converts a string representation of a rule into a Tree"""
-    def parse2(s, i):
-        if s[i] in function_names:
-            f = to_function.get(s[i])
-            assert s[i + 1] == "(", "No open parenthesis after " + s[i]
-            (arg, i) = parse2(s, i + 2)
-            args = [arg]
-            while s[i] != ")":
-                (arg, i) = parse2(s, i)
-                args.append(arg)
-            subtree = combine(f, args)
-            return (subtree, i + 1)
-        else:
-            return (s[i], i + 1)
-    return parse2(list(scan(s)), 0)[0]
-
-
-class Tree:
-
-    def __init__(self, root, first=None, second=None, third=None):
-        """Create a new Tree; default is no children"""
-        self.root = root
-        assert root in functions
-        if third == None:
-            self.test = None
-            self.left = first
-            self.right = second
-        else: # rearrange parameters so test can be put first
-            self.test = first
-            self.left = second
-            self.right = third
-
-    def __str__(self):
-        """Provide a printable representation of this Tree"""
-        if self.test != None: # it's an iff Tree
-            return 'iff({}, {}, {})'.format(self.left, self.right, self.test)
-        if self.left == None and self.right == None:
-            return str(self.root)
-        elif self.right == None:
-            return '{}({})'.format(self.root.__name__, self.left)
-        else:
-            return '{}({}, {})'.format(self.root.__name__, self.left, self.right)
-
-    def __repr__(self):
-        s = "Tree("
-        if self.root in functions:
-            s += self.root.__name__
-        else:
-            str(self.root) + '!'
-        if self.left != None:  s += ", " + repr(self.left)
-        if self.right != None: s += ", " + repr(self.right)
-        if self.test != None:  s += ", " + repr(self.test)
-        return s + ")"
-    
-##    debugging = True
-##    def evaluate(self, cards):
-##        """For debugging, uncomment these lines and change
-##           the name of evaluate (below) to evaluate"""
-##        before = str(self)
-##        after = self.evaluate2(cards)
-##        if self.debugging: print "Tree: ", before, "-->", after
-##        return after
-    
-    def evaluate(self, cards):
-        """Evaluate this tree with the given card values"""
-        def subeval(expr):
-            if expr.__class__.__name__ == "Tree":
-                return expr.evaluate(cards)
-            else:
-                if expr == "current":
-                    return current
-                elif expr == "previous":
-                    return previous
-                elif expr == "previous2":
-                    return previous2
-                else:
-                    return expr
-        try:
-            (previous2, previous, current) = cards
-            f = self.root
-            if f not in functions:
-                return f
-            
-            if f in [suit, color, value, is_royal, minus1, plus1, even, odd]:
-                return f(subeval(self.left))
-            
-            elif f in [equal, less, greater]:
-                return f(subeval(self.left), subeval(self.right))
-            
-            elif f == andf:
-                if subeval(self.left):
-                    return subeval(self.right)
-                return False
-            
-            elif f == orf:
-                if subeval(self.left):
-                    return True
-                return subeval(self.right)
-            
-            elif f == notf:
-                return not subeval(self.left)
-            
-            elif f == iff:
-                if subeval(self.test):
-                    return subeval(self.left)
-                else:
-                    return subeval(self.right)
-        except Exception as e:
-            print e
-            print "Expression = ", self
-            print " with cards =", cards
-            raise
-
 #master_board_state = [('KS', []), ('9H', []), ('6C', ['KS', '9C']), ('JH', []), ('QD',[]), ('5S', ['AS'])]
 #master_board_state = [('KH', []), ('9C', []), ('6D', ['KS', '9C']), ('JS', []), ('QD',[]), ('5C', ['AS'])]
 #master_board_state = [('10S', []), ('3H', []), ('6C', ['KS', '9C']), ('6H', []), ('7D',[]), ('9S', ['AS']), ('10S', []), ('3H', []), ('6C', []), ('10S', []), ('3H', []), ('6C', ['KS', '9C']), ('6H', []), ('10S', []), ('3H', []), ('6C', ['KS', '9C']), ('6H', []), ('7D',[]), ('9S', ['AS']), ('10S', []), ('3H', []), ('6C', []), ('10S', []), ('3H', []), ('6C', ['KS', '9C']), ('6H', []), ('10S', []), ('3H', []), ('6C', ['KS', '9C']), ('6H', []), ('7D',[]), ('9S', ['AS']), ('10S', []), ('3H', []), ('6C', []), ('10S', []), ('3H', []), ('6C', ['KS', '9C']), ('6H', []), ('10S', []), ('3H', []), ('6C', ['KS', '9C']), ('6H', []), ('7D',[]), ('9S', ['AS']), ('10S', []), ('3H', []), ('6C', []), ('9S', []), ('7H', []), ('6C', ['KS', '9C']), ('6H', []), ('10S', []), ('3H', []), ('6C', ['KS', '9C']), ('6H', []), ('7D',[]), ('9S', ['AS']), ('10S', []), ('3H', []), ('6C', []), ('JD', []), ('QC', []), ('KH', ['KS', '9C']), ('6S', [])]
@@ -344,257 +29,137 @@ class Tree:
 #master_board_state = [('10S', []), ('10S', []), ('10S', []), ('10S', []), ('10S', [])]
 #master_board_state = [('10S', []), ('3H', []), ('6C', ['KS', '9C']), ('6H', []), ('7D', []), ('9S', ['AS', 'KS', 'QC']), ('KD', []), ('6C', []), ('3D', []), ('AD', []), ('JD', []), ('AS', []), ('2H', []), ('10S', []), ('3H', []), ('6C', ['KS', '9C']), ('6H', []), ('7D', []), ('9S', ['AS', 'KS', 'QC']), ('KD', []), ('6C', []), ('3D', []), ('AD', []), ('JD', []), ('AS', []), ('2H', []), ('10S', []), ('3H', []), ('6C', ['KS', '9C']), ('6H', []), ('7D', []), ('9S', ['AS', 'KS', 'QC']), ('KD', []), ('6C', []), ('3D', []), ('AD', []), ('JD', []), ('AS', []), ('2H', []), ('10S', []), ('3H', []), ('6C', ['KS', '9C']), ('6H', []), ('7D', []), ('9S', ['AS', 'KS', 'QC']), ('KD', []), ('6C', []), ('3D', []), ('AD', []), ('JD', []), ('AS', []), ('2H', [])]
 #master_board_state = []
-predicted_rule = None
 #master_rule = Tree(orf, Tree(equal, Tree(color, 'previous'), 'R'), Tree(equal, Tree(color, 'current'), 'R'))
-three_length_hypothesis_flag = True
 card_characteristic_list =[]
 #board_state = ['9S','3H']
 rule_list={}
-play_counter = 0
 
 
 numeric_characterstic = ['A','2','3','4','5','6','7','8','9','10','J','Q','K']
 suit_characterstic = ['C','S','D','H']
 
 
-def set_play_counter(counter):
-    global play_counter
-    play_counter = counter
+def set_play_counter(counter, session=None):
+    get_session(session).play_counter = counter
+
+def get_play_counter(session=None):
+    return get_session(session).play_counter
 
-def get_play_counter():
-    return play_counter
+def session_scanner(session):
+    '''
+     Returns the hypothesis scanner of a session, the count tensors play_card keeps up to date
+    '''
+    if session.hypothesis_scanner is None:
+        session.hypothesis_scanner = HypothesisScanner(session.three_length_hypothesis_flag)
+    return session.hypothesis_scanner
 
-def play_player_card(instance, cards, player_hand_cards):
-    return scientist(instance, cards, player_hand_cards)
+def play_player_card(instance, cards, player_hand_cards, session=None):
+    return scientist(instance, cards, player_hand_cards, session)
 
-def play_card(card):
+def play_card(card, session=None):
     '''
      This function plays a card and validates the card and then updates the board state with the new card 
      based on whether the card is legal or not
     '''
+    session = get_session(session)
     print 'playing card: ' + str(card)
-    set_play_counter(get_play_counter()+1)
+    set_play_counter(get_play_counter(session)+1, session)
     
     #Invoke validate_card() which returns True/False if the current play is legal/illegal.
     #Update the board_state by calling update_board_state()
     #Return a boolean value based on the legality of the card. 
     card_legality = True
-    if len(get_master_board_state()) < 4:
-        update_board_state(get_master_board_state(),card_legality,card)
+    if len(get_master_board_state(session)) < 4:
+        update_board_state(get_master_board_state(session),card_legality,card)
         # print "Master board state", master_board_state
     else:
-        card_legality = validate_card(card)
-        update_board_state(get_master_board_state(),card_legality,card)
+        card_legality = validate_card(card, session)
+        update_board_state(get_master_board_state(session),card_legality,card)
         # print "Master board state", master_board_state
+    if card_legality:
+        session_scanner(session).observe_legal(card)
+    else:
+        session_scanner(session).observe_illegal(card)
     return card_legality
 
 
-def validate_and_refine_formulated_rule(rule_list): 
-    
-    board_state = parse_board_state()
-    legal_cards = board_state['legal_cards']
-    
-    illegal_cards = parse_illegal_indices()
-
-    exception_legal = {}
-    exception_illegal = {}
-    exception_dict = {} 
-    
-    for i in xrange(2, len(legal_cards)):
-        for rule in rule_list:
-            #Check if rule is made of strictly 2 chars
-            legal_tuple = (legal_cards[i-2],legal_cards[i-1],legal_cards[i])
-            if not rule.evaluate(legal_tuple):
-                if rule in exception_legal:
-                    exception_legal[rule].append(legal_tuple)
-                else:
-                    exception_legal[rule] = [legal_tuple]
+def session_rule_exceptions(session):
+    '''
+     Returns the RuleExceptions of the rules a session refined lately, kept in an LRUCache
+     so that each rule only counts the windows played since it was last refined
+    '''
+    if session.rule_exceptions is None:
+        session.rule_exceptions = LRUCache(RuleExceptions, EXCEPTION_CACHE_SIZE)
+    return session.rule_exceptions
 
-    for rule in rule_list:
-        for tup in illegal_cards:
-            illegal_tup = tup
-            if len(tup) == 2:
-                illegal_tup = (None, tup[0], tup[1])
-            if rule.evaluate(illegal_tup):
-                if rule in exception_illegal:
-                    exception_illegal[rule].append(tup)
-                else:
-                    exception_illegal[rule] = [tup]
+def validate_and_refine_formulated_rule(rule_list, session=None):
+    '''
+     Looks for the EXCEPT/UNLESS clause of every rule in the windows it gets wrong, see
+     ExceptionMiner. Returns {(rule, exception, True): True} when the legal windows a rule
+     rejects share an exception, {(rule, exception, False): True} when the illegal plays it
+     accepts do, and {rule: False} for a rule with neither
+    '''
+    session = get_session(session)
+    board = get_master_board_state(session)
+    rule_exceptions = session_rule_exceptions(session)
 
     exception_decision_dict = {}
-    #property_dict = {'1' : 'C1' , '2' : 'C2', '3': 'C3', '4': 'C4', '5': 'C5', '6': 'C6', '7': 'C7', '8': 'C8', '9': 'C9', '10': 'C10', '11': 'C11', '12': 'C12', '13': 'C13', 'red':'C14' , 'black': 'C15', 'diamond': 'C16' , 'heart':'C17', 'spade': 'C18', 'club': 'C19', 'even': 'C20', 'odd': 'C21', 'royal': 'C22' , 'not_royal': 'C23'}
-    weighted_property_dict = set_characteristic_weights()
-
-    for key in exception_legal.keys():
-        value_list = exception_legal[key] 
-        hypothesis_dict = {}
-        hypothesis_occurrence_count = {}
-        mean = 0.0
-        for tup in value_list:
-            if len(tup) == 3:
-                combined_char_indices_list = [get_card_mapping_characterstic(tup[0]), get_card_mapping_characterstic(tup[1]), get_card_mapping_characterstic(tup[2])]
-                for characteristic_tuple in itertools.product(*combined_char_indices_list):
-                    if characteristic_tuple in hypothesis_dict.keys():
-                        hypothesis_occurrence_count[characteristic_tuple] += 1
-                        hypothesis_dict[characteristic_tuple] += ((weighted_property_dict[characteristic_tuple[0]]+weighted_property_dict[characteristic_tuple[1]]+weighted_property_dict[characteristic_tuple[2]])/3)*hypothesis_occurrence_count[characteristic_tuple]
-                    else:
-                        hypothesis_dict[characteristic_tuple] = (weighted_property_dict[characteristic_tuple[0]]+weighted_property_dict[characteristic_tuple[1]]+weighted_property_dict[characteristic_tuple[2]])/3
-                        hypothesis_occurrence_count[characteristic_tuple] = 1
-                    mean += (weighted_property_dict[characteristic_tuple[0]]+weighted_property_dict[characteristic_tuple[1]]+weighted_property_dict[characteristic_tuple[2]]) / 3
-        
-            elif len(tup) == 2:
-                combined_char_indices_list = [get_card_mapping_characterstic(val[0]), get_card_mapping_characterstic(val[1])]
-                for characteristic_tuple in itertools.product(*combined_char_indices_list):
-                    if characteristic_tuple in hypothesis_dict.keys():
-                        hypothesis_occurrence_count[characteristic_tuple] += 1
-                        hypothesis_dict[characteristic_tuple] += ((weighted_property_dict[characteristic_tuple[0]]+weighted_property_dict[characteristic_tuple[1]])/2)*hypothesis_occurrence_count[characteristic_tuple]
-                    else:
-                        hypothesis_occurrence_count[characteristic_tuple] = 1
-                        hypothesis_dict[characteristic_tuple] = (weighted_property_dict[characteristic_tuple[0]]+weighted_property_dict[characteristic_tuple[1]])/2
-                    mean += (weighted_property_dict[characteristic_tuple[0]]+weighted_property_dict[characteristic_tuple[1]])/2
-        
-        # print str(hypothesis_dict)            
-        hypothesis_offset = len(hypothesis_dict)
-        if hypothesis_offset == 0:
-            hypothesis_offset = 1
-        mean_cutoff = mean/hypothesis_offset
-        for key in hypothesis_dict.keys():
-            if hypothesis_dict[key] < mean_cutoff :
-                del hypothesis_dict[key]
-        #print str(hypothesis_dict)
-        ranked_hypothesis = OrderedDict(sorted(hypothesis_dict.items(), key = lambda (key, value) : (value, key), reverse=True))
-        if hypothesis_dict:
-            if (ranked_hypothesis.items()[0][1] > 1):
-                new_key = (key, ranked_hypothesis.items()[0][0], True)
-                exception_decision_dict[new_key] = True
-            else:
-                exception_decision_dict[key] = False
-
-    #Find pattern in illegal cards.. To be formulated as an exception rule
-    for key_rule in exception_illegal.keys():
-        value_list = exception_illegal[key_rule]
-        prev2_list = decompose_index_chars(key_rule, 'prev2') 
-        prev_list = decompose_index_chars(key_rule, 'prev') 
-        curr_list = decompose_index_chars(key_rule, 'curr') 
-        hypothesis_dict = {}
-        hypothesis_occurrence_count = {}
-        mean = 0.0
-        for tup in value_list:
-            if len(tup) == 3:
-                combined_char_indices_list = [get_card_mapping_characterstic(tup[0]), get_card_mapping_characterstic(tup[1]), get_card_mapping_characterstic(tup[2])]
-                for characteristic_tuple in itertools.product(*combined_char_indices_list):
-                    prev2_wt = 0 if (characteristic_tuple[0] in prev2_list) else weighted_property_dict[characteristic_tuple[0]]
-                    prev_wt = 0 if (characteristic_tuple[1] in prev_list) else weighted_property_dict[characteristic_tuple[1]]
-                    curr_wt = 0 if (characteristic_tuple[2] in curr_list) else weighted_property_dict[characteristic_tuple[2]]
-                    normalized_wt_sum = (prev2_wt + prev_wt + curr_wt)/3
-                    if characteristic_tuple in hypothesis_dict.keys():
-                        hypothesis_occurrence_count[characteristic_tuple] += 1
-                        hypothesis_dict[characteristic_tuple] += normalized_wt_sum*hypothesis_occurrence_count[characteristic_tuple]
-                    else:
-                        hypothesis_occurrence_count[characteristic_tuple] = 1
-                        hypothesis_dict[characteristic_tuple] = normalized_wt_sum
-                    mean += normalized_wt_sum
-        
-            elif len(tup) == 2:
-                combined_char_indices_list = [get_card_mapping_characterstic(val[0]), get_card_mapping_characterstic(val[1])]
-                for characteristic_tuple in itertools.product(*combined_char_indices_list):
-                    prev_wt = 0 if (characteristic_tuple[0] in prev_list) else weighted_property_dict[characteristic_tuple[0]]
-                    curr_wt = 0 if (characteristic_tuple[1] in curr_list) else weighted_property_dict[characteristic_tuple[1]]
-                    normalized_wt_sum = (prev_wt + curr_wt)/2
-
-                    if characteristic_tuple in hypothesis_dict.keys():
-                        hypothesis_occurrence_count[characteristic_tuple] += 1
-                        hypothesis_dict[characteristic_tuple] += normalized_wt_sum*hypothesis_occurrence_count[characteristic_tuple]
-                    else:
-                        hypothesis_occurrence_count[characteristic_tuple] = 1
-                        hypothesis_dict[characteristic_tuple] = normalized_wt_sum
-                    mean += normalized_wt_sum/2
-        
-        # print str(hypothesis_dict)            
-        hypothesis_offset = len(hypothesis_dict)
-        if hypothesis_offset == 0:
-            hypothesis_offset = 1
-        mean_cutoff = mean/hypothesis_offset
-        for key in hypothesis_dict.keys():
-            if hypothesis_dict[key] < mean_cutoff or key in rule:
-                del hypothesis_dict[key]
-        #print str(hypothesis_dict)
-        ranked_hypothesis = OrderedDict(sorted(hypothesis_dict.items(), key = lambda (key, value) : (value, key), reverse=True))
-
-        if hypothesis_dict and (ranked_hypothesis.items()[0][1] > 1):
-            #Store the negative of ranked_hypothesis.items()[0][0]
-            hypo = ranked_hypothesis.items()[0][0]
-            prev2_elem = None
-            prev_elem = None
-            current_elem = None
-            if len(hypo) == 3:  
-                if hypo[0] not in prev2_list:
-                    prev2_elem = hypo[0]
-                if hypo[1] not in prev_list:
-                    prev_elem = hypo[1]
-                if hypo[2] not in current_list:
-                    current_elem = hypo[2]
-            elif len(hypo) == 2:
-                if hypo[0] in prev_list:
-                    prev_elem = hypo[0]
-                if hypo[1] in curr_list:
-                    current_elem = hypo[1]
-            exception_hypothesis = Exception_Hypothesis(prev2_elem, prev_elem, current_elem)    
-            new_key_rule = key_rule
-            #Add a not function to this exception_hypothesis
-            #negative_hypo = negate_hypothesis(hypo)
-            #Append the not_exception to the key_rule with and clause
-            #new_key_rule = (andf, key_rule, negative_hypo)
-            exception_decision_dict[new_key_rule] = True
-        else:
-            exception_decision_dict[key_rule] = False
-
+    for rule in rule_list:
+        exceptions = rule_exceptions.get(rule)
+        exceptions.update(board)
+        (unless, excepted) = exceptions.exceptions()
+        if unless is not None:
+            exception_decision_dict[(rule, unless, True)] = True
+        if excepted is not None:
+            exception_decision_dict[(rule, excepted, False)] = True
+        if unless is None and excepted is None:
+            exception_decision_dict[rule] = False
     return exception_decision_dict
 
-def decompose_index_chars(rule, index_pos):
-    index_val = -1
-    if index_pos == 'prev2':
-        index_val = 0
-    elif index_pos == 'prev':
-        index_val = 1
-    elif index_pos == 'curr':
-        index_val = 2
-    char_list = []
-    for hypothesis in rule:
-        tmp_index = index_val
-        if len(hypothesis) == 2 and index_val > 0:
-            tmp_index = index_val - 1
-        char_list.append(hypothesis[tmp_index])
-    return char_list
-
-def setRule(ruleExp):
+def refine_ranked_rules(ranked_rules, session=None):
+    '''
+     Adds to a HypothesisRanking of rules the top ones refined by their exceptions, see
+     ExceptionMiner.refined_rule. A refined rule ranks as its rule plus the number of
+     windows the refinement gets right that the rule got wrong, less those it now gets
+     wrong, so a better refinement ranks higher whatever the sign of the score.
+    '''
+    session = get_session(session)
+    board = get_master_board_state(session)
+    rule_exceptions = session_rule_exceptions(session)
+    exception_decision_dict = validate_and_refine_formulated_rule([rule for (rule, score) in ranked_rules.top(REFINED_RULES)], session)
+    for key, found in exception_decision_dict.iteritems():
+        if found:
+            (rule, exception, legal_exception) = key
+            #The counts of the rule and the characteristic index of the board give the windows
+            #the refinement fixes, so the refined rule is not evaluated on the board
+            fixed = rule_exceptions.get(rule).refinement_fixes(exception, legal_exception, board.characteristics)
+            ranked_rules[refined_rule(rule, exception, legal_exception)] = ranked_rules[rule] + fixed
+    return ranked_rules
+
+def setRule(ruleExp, session=None):
     '''
-     This function set the predicted rule variable as the rule exp passed as parameter
+     This function set the rule of the session as the rule exp passed as parameter
     '''
-    global predicted_rule
+    session = get_session(session)
     if ruleExp.__class__.__name__ == 'Tree':
-        predicted_rule = ruleExp
+        session.rule = ruleExp
     else:
-        predicted_rule = parse(ruleExp)
+        session.rule = parse(ruleExp)
 
-def rule():
+def rule(session=None):
     '''
      This function returns the current rule
     '''
     #return the current rule
-    return predicted_rule;
+    return get_session(session).rule;
 
-def score(scientist_rule,player_scores,current_player, game_end_player):
-    current_rule = rule()
+def score(scientist_rule,player_scores,current_player, game_end_player, session=None):
+    current_rule = rule(session)
     current_score = 0
-    illegal_cards = parse_illegal_indices()
-    illegal_counter = 0
-    for elem in illegal_cards:
-        if len(elem) == 2:
-            illegal_counter += 1
+    illegal_counter = get_master_board_state(session).illegal_plays()
 
     free_counter = 0
-    for elem in master_board_state:
+    for elem in get_master_board_state(session):
         free_counter += 1
         if free_counter > 20:
             current_score += 1
@@ -612,11 +177,10 @@ def score(scientist_rule,player_scores,current_player, game_end_player):
 
     return player_scores[current_player]
 
-def validate_card(card):
+def validate_card(card, session=None):
     #Output: Return True/False, if the current card conforms to the actual rule.
-    board_state = parse_board_state()
-    legal_cards = board_state['legal_cards']
-    return rule().evaluate((legal_cards[-2], legal_cards[-1] , card))  
+    legal_cards = get_master_board_state(session).legal_codes
+    return rule_table(rule(session)).evaluate(legal_cards[-2], legal_cards[-1], encode_card(card))
 
 def map_characteristic_value_to_characteristic_property(characteristic_value):
     '''
@@ -689,123 +253,26 @@ def create_tree(rule):
     return transformed_rule
 
 
-def find_numeric_characteristic_relation(prev_card, current_card, prev2_card = None):
-    '''
-     This function defines a numeric relation between a sliding window of current, prev, prev2 cards
-    '''
-
-    if (equal(current_card, prev_card)):
-        numeric_relation_tree = create_numeric_tree('equal', curr=True, prev = True)
-        suit_relation_tree = create_numeric_tree('equal', curr=True, prev = True, suite=True)
-    else: 
-        if (equal(value(current_card), value(prev_card))):
-            numeric_relation_tree = create_numeric_tree('equal', curr=True, prev = True)
-        elif (greater(value(current_card), value(prev_card))):
-            numeric_relation_tree = create_numeric_tree('greater', curr=True, prev = True)
-        elif (less(value(current_card), value(prev_card))):
-            numeric_relation_tree = create_numeric_tree('less', curr=True, prev = True)
-        
-        if (greater(current_card, prev_card)):
-            suit_relation_tree = create_numeric_tree('greater', curr=True, prev = True, suite=True)
-        elif (less(current_card, prev_card)):
-            suit_relation_tree = create_numeric_tree('less', curr=True, prev = True, suite=True)
-    
-    if prev2_card:
-        if (equal(current_card, prev2_card)):
-            numeric_relation_tree = create_numeric_tree('equal', curr=True, prev2 = True)
-            suit_relation_tree = create_numeric_tree('equal', curr=True, prev2 = True, suite=True)
-        else:    
-            if (equal(value(current_card), value(prev2_card))):
-                numeric_relation_tree = create_numeric_tree('equal', curr=True, prev2 = True)
-            elif (greater(value(current_card), value(prev2_card))):
-                numeric_relation_tree = create_numeric_tree('greater', curr=True, prev2 = True)
-            elif (less(value(current_card), value(prev2_card))):
-                numeric_relation_tree = create_numeric_tree('less', curr=True, prev2 = True)
-
-            if (greater(current_card, prev2_card)):
-                suit_relation_tree = create_numeric_tree('greater', curr=True, prev2 = True, suite=True)
-            elif (less(current_card, prev2_card)):
-                suit_relation_tree = create_numeric_tree('less', curr=True, prev2 = True, suite=True)
-
-                
-        if (equal(prev_card, prev2_card)):
-            numeric_relation_tree = create_numeric_tree('equal', prev=True, prev2 = True)
-            suit_relation_tree = create_numeric_tree('equal', prev=True, prev2 = True, suite=True)
-        else:
-            if (equal(value(prev_card), value(prev2_card))):
-                numeric_relation_tree = create_numeric_tree('equal', prev=True, prev2 = True)
-            elif (greater(value(prev_card), value(prev2_card))):
-                numeric_relation_tree = create_numeric_tree('greater', prev=True, prev2 = True)
-            elif (less(value(prev_card), value(prev2_card))):
-                numeric_relation_tree = create_numeric_tree('less', prev=True, prev2 = True)
-            
-            if (greater(prev_card, prev2_card)):
-                suit_relation_tree = create_numeric_tree('greater', prev=True, prev2 = True, suite=True)
-            elif (less(prev_card, prev2_card)):
-                suit_relation_tree = create_numeric_tree('less', prev=True, prev2 = True, suite=True)
-            
-
-    # adds relation
-    numeric_relation_dic ={}
-    numeric_relation_dic['current_adds_prev'] = value(current_card) + value(prev_card)
-    # numeric_relation_dic['current_adds_prev2'] = value(current_card) + value(prev2_card)
-    # numeric_relation_dic['prev_adds_prev2'] = value(prev_card) + value(prev2_card)
-
-    print numeric_relation_dic
-
-    # get_numerical_range_relation()
-
-    # # minus relation
-    # numeric_relation_dic['current_minus_prev'] = value(current_card) - value(prev_card)
-    # numeric_relation_dic['current_minus_prev2'] = value(current_card) - value(prev2_card)
-    # numeric_relation_dic['prev_minus_prev2'] = value(prev_card) - value(prev2_card)
-
-    numeric_relation_list = [numeric_relation_tree, suit_relation_tree]
-
-    return numeric_relation_list;
-
-def create_numeric_tree(relation, curr=None, prev=None, prev2=None, suite=None):
-    
-    if suite:
-        funct = suit
-    else:
-        funct = value
-    if curr:
-        current = Tree(funct, 'current')
-    if prev:
-        previous = Tree(funct, 'previous')
-    if prev2:
-        previous2 = Tree(funct, 'previous2')
-
-    if curr and prev and (not prev2):
-        lhs = current
-        rhs = previous
-    elif curr and prev2 and (not prev):
-        lhs = current
-        rhs = previous2
-    elif prev and prev2 and (not curr):
-        lhs = previous
-        rhs = previous2
-
-    return Tree(to_function['if'], Tree(to_function[relation], lhs, rhs), True)
-
-
 #print create_tree((('C14', 'C19', 'C14'), ('C14', 'C15', 'C17')))
-def set_three_length_hypothesis_flag(value):
-    global three_length_hypothesis_flag
-    three_length_hypothesis_flag = value
+def set_three_length_hypothesis_flag(value, session=None):
+    session = get_session(session)
+    session.three_length_hypothesis_flag = value
+    if session.hypothesis_scanner is not None:
+        session.hypothesis_scanner.three_length_hypothesis_flag = value
+        session.hypothesis_scanner.shape_scores = None
 
-def get_three_length_hypothesis_flag():
-    return three_length_hypothesis_flag
+def get_three_length_hypothesis_flag(session=None):
+    return get_session(session).three_length_hypothesis_flag
 
-def scientist(instance, cards, player_hand_cards):
-    global game_ended
+def scientist(instance, cards, player_hand_cards, session=None):
+    session = get_session(session)
+    top_rule_confidence = session.top_rule_confidence
 
     if cards:
         for card in cards:
-            play_card(card)
-
+            play_card(card, session)
 
+    play_counter = session.play_counter
     if play_counter <15:
         card = instance.player_card_play()
         return card
@@ -817,18 +284,21 @@ def scientist(instance, cards, player_hand_cards):
         
         loop_start_time = time.time()
 
-        ranked_hypothesis = scan_and_rank_hypothesis(True)
-        pr_ranked_hypothesis = scan_and_rank_rules(ranked_hypothesis)
+        #scan_and_rank_rules combines the 5 best hypotheses
+        ranked_hypothesis = session_scanner(session).ranked(5)
+        numeric_hypothesis = scan_and_rank_numeric_hypothesis(get_three_length_hypothesis_flag(session), session)
+        pr_ranked_hypothesis = scan_and_rank_rules(ranked_hypothesis, numeric_hypothesis, ranked_hypothesis, session)
 
         if pr_ranked_hypothesis:
-            top_rule = pr_ranked_hypothesis.items()[0][0]
+            #The top rules compete with their EXCEPT/UNLESS refinements
+            refine_ranked_rules(pr_ranked_hypothesis, session)
+            top_rule = pr_ranked_hypothesis.top(1)[0][0]
             print "Top Rule: " + str(top_rule)
             if top_rule in top_rule_confidence:
                 top_rule_confidence[top_rule] += 1
                 if top_rule_confidence[top_rule] > 25:
-                    global game_ended
-                    game_ended = True
-                    print 'Game has ended: ' + game_ended
+                    session.game_ended = True
+                    print 'Game has ended: ' + str(session.game_ended)
                     print 'Player Guessed Rule: ' + str(top_rule)
                     return top_rule
             else:
@@ -842,14 +312,14 @@ def scientist(instance, cards, player_hand_cards):
                 last_rule_counter = 0
                 last_rule = top_rule
 
-            current_card = pick_next_negative_card(pr_ranked_hypothesis, last_rule_counter, player_hand_cards)
+            current_card = pick_informative_card(pr_ranked_hypothesis, last_rule_counter, player_hand_cards, session)
             
             print "Next card by Player", current_card
 
-            if game_ended:
+            if session.game_ended:
                 return top_rule
 
-            play_card(current_card)
+            play_card(current_card, session)
             instance.update_hand(current_card)
             return current_card
         else:
@@ -882,11 +352,11 @@ def game_play(players):
     #     exit()
     # print 'Score: ' + str(result_score)
 
-def play_initial_cards(prev2,prev,curr):
+def play_initial_cards(prev2,prev,curr, session=None):
 
-    play_card(prev2)
-    play_card(prev)
-    play_card(curr)
+    play_card(prev2, session)
+    play_card(prev, session)
+    play_card(curr, session)
 
 
 # def main():
@@ -0,0 +1,181 @@
+'''
+ Threshold rules on numeric relations between two card positions, kept as intervals.
+
+ A relation is the sum, difference or ratio of the values of two positions of a window,
+ as summation(value(previous), value(current)). greater(relation, t) holds on every legal
+ window and fails on every illegal one exactly when the highest relation of an illegal
+ window <= t < the lowest relation of a legal window, and less(relation, t) when the
+ highest legal relation < t <= the lowest illegal relation. So the thresholds still
+ possible form an interval read from four extremes per relation, and a play updates
+ them in constant time, whatever the length of the board.
+'''
+from CardCodec import *
+
+#The pairs of positions a relation is taken over, earlier position first
+POSITION_PAIRS = [('previous', 'current'), ('previous2', 'current'), ('previous2', 'previous')]
+POSITION_INDEX = {'previous2': 0, 'previous': 1, 'current': 2}
+
+RELATIONS = {
+    'summation': lambda first, second: first + second,
+    'difference': lambda first, second: second - first,
+    'ratio': lambda first, second: float(second) / first,
+}
+
+class ThresholdInterval:
+    '''
+     The lowest and highest value of a relation over the legal and over the illegal windows
+    '''
+    def __init__(self):
+        self.legal = None
+        self.illegal = None
+
+    def observe(self, relation_value, legal):
+        if legal:
+            self.legal = extend(self.legal, relation_value)
+        else:
+            self.illegal = extend(self.illegal, relation_value)
+
+    def greater_thresholds(self):
+        '''
+         Returns (low, high): greater(relation, t) survives for low <= t < high, None if
+         no threshold does; low is None while no illegal window bounds it
+        '''
+        if self.legal is None:
+            return None
+        low = self.illegal[1] if self.illegal is not None else None
+        if low is not None and low >= self.legal[0]:
+            return None
+        return (low, self.legal[0])
+
+    def less_thresholds(self):
+        '''
+         Returns (low, high): less(relation, t) survives for low < t <= high, None if
+         no threshold does; high is None while no illegal window bounds it
+        '''
+        if self.legal is None:
+            return None
+        high = self.illegal[0] if self.illegal is not None else None
+        if high is not None and high <= self.legal[1]:
+            return None
+        return (self.legal[1], high)
+
+def extend(extremes, relation_value):
+    if extremes is None:
+        return (relation_value, relation_value)
+    return (min(extremes[0], relation_value), max(extremes[1], relation_value))
+
+class NumericRule:
+    '''
+     A surviving threshold rule: relation(name(value(first), value(second)), threshold),
+     see rule_threshold, with the interval of the thresholds that survive as well
+    '''
+    def __init__(self, relation, name, positions, threshold, interval):
+        self.relation = relation
+        self.name = name
+        self.positions = positions
+        self.threshold = threshold
+        self.interval = interval
+
+    def holds(self, codes):
+        '''
+         Evaluates the rule on a window of card codes (previous2, previous, current)
+        '''
+        (first, second) = (CARD_VALUE[codes[POSITION_INDEX[position]]] for position in self.positions)
+        relation_value = RELATIONS[self.name](first, second)
+        if self.relation == 'greater':
+            return relation_value > self.threshold
+        return relation_value < self.threshold
+
+    def __str__(self):
+        return '{}({}(value({}), value({})), {})'.format(self.relation, self.name, self.positions[0],
+                                                       self.positions[1], self.threshold)
+
+    def __repr__(self):
+        return 'NumericRule(' + str(self) + ')'
+
+class NumericConstraints:
+    '''
+     The threshold intervals of every relation over every position pair of a game, updated
+     one play at a time by observe_legal and observe_illegal, or from a Board by update.
+    '''
+    def __init__(self):
+        self.intervals = dict(((name, positions), ThresholdInterval())
+                              for name in RELATIONS for positions in POSITION_PAIRS)
+        self.legal_values = []
+        #Board entries observed, and illegal cards observed after the last of them
+        self.observed = (0, 0)
+
+    def observe_window(self, window_values, legal):
+        '''
+         Observes the values (previous2, previous, current) of a window, previous2 None
+         when the window has only two cards
+        '''
+        for (name, positions), interval in self.intervals.iteritems():
+            (first, second) = (window_values[POSITION_INDEX[position]] for position in positions)
+            if first is not None:
+                interval.observe(RELATIONS[name](first, second), legal)
+
+    def observe_legal(self, card):
+        '''
+         Adds a card accepted on the board
+        '''
+        self.legal_values.append(CARD_VALUE[encode_card(card)])
+        if len(self.legal_values) > 1:
+            self.observe_window(self.window(self.legal_values[-1], 1), True)
+
+    def observe_illegal(self, card):
+        '''
+         Adds a card rejected after the last legal card
+        '''
+        if self.legal_values:
+            self.observe_window(self.window(CARD_VALUE[encode_card(card)], 0), False)
+
+    def window(self, current_value, offset):
+        #offset is 1 when the current card is already the last legal value
+        legal_values = self.legal_values
+        previous = legal_values[-1 - offset]
+        previous2 = legal_values[-2 - offset] if len(legal_values) >= 2 + offset else None
+        return (previous2, previous, current_value)
+
+    def update(self, board):
+        '''
+         Observes the plays made on a Board since the last update
+        '''
+        (entry_count, illegal_count) = self.observed
+        entries = board.entries
+        for index in xrange(max(entry_count - 1, 0), len(entries)):
+            (card, illegal_cards) = entries[index]
+            if index >= entry_count:
+                self.observe_legal(card)
+            for illegal_card in illegal_cards[illegal_count if index == entry_count - 1 else 0:]:
+                self.observe_illegal(illegal_card)
+        if entries:
+            self.observed = (len(entries), len(entries[-1][1]))
+
+    def surviving_rules(self):
+        '''
+         Returns ([less rules], [greater rules]) that hold on every legal window and
+         fail on every illegal one, see NumericRule
+        '''
+        less_rules = []
+        greater_rules = []
+        for (name, positions), interval in sorted(self.intervals.iteritems()):
+            for (relation, thresholds, rules) in [('less', interval.less_thresholds(), less_rules),
+                                                  ('greater', interval.greater_thresholds(), greater_rules)]:
+                threshold = rule_threshold(name, relation, thresholds)
+                if threshold is not None:
+                    rules.append(NumericRule(relation, name, positions, threshold, thresholds))
+        return less_rules, greater_rules
+
+def rule_threshold(name, relation, thresholds):
+    '''
+     Returns the threshold of a surviving rule: for the integer relations the one closest
+     to the legal values, for ratio the bound set by the illegal values, None when there
+     is no such bound or no threshold survives
+    '''
+    if thresholds is None:
+        return None
+    (low, high) = thresholds
+    if name != 'ratio':
+        return low + 1 if relation == 'less' else high - 1
+    return high if relation == 'less' else low
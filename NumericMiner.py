@@ -0,0 +1,114 @@
+'''
+ Batch mining of the numeric relations between two positions of a window.
+
+ For every pair of positions, a later card against an earlier one, the difference of
+ their values tells at once whether the values are equal, greater, less, one more or one
+ less, the difference of their suits orders the suits, and whether the sum of the values
+ is even is whether their parities agree. The relations are computed for all the windows
+ of the board as NumPy columns in one pass and scored as the ScanRank hypotheses are: the
+ weight of a relation times the legal windows it holds in, less the illegal plays it
+ would have allowed.
+'''
+import numpy as np
+from TreeFunctions import *
+from BatchEvaluator import VALUE_TABLE, SUIT_TABLE, PARITY_TABLE
+from HypothesisRanking import *
+from Board import WINDOW_INDEX, window_array
+
+#(later, earlier) pairs of positions, the first one is all a two card window has
+RELATION_PAIRS = [('current', 'previous'), ('current', 'previous2'), ('previous', 'previous2')]
+
+#The weight every relation starts with, that of a suit or color characteristic
+NUMERIC_WEIGHT = 0.5
+
+def relation_tree(relation, later, earlier):
+    '''
+     Returns the rule of a relation of NUMERIC_RELATIONS between two positions
+    '''
+    (later_value, earlier_value) = (Tree(value, later), Tree(value, earlier))
+    if relation == 'value_equal':
+        return Tree(equal, later_value, earlier_value)
+    elif relation == 'value_greater':
+        return Tree(greater, later_value, earlier_value)
+    elif relation == 'value_less':
+        return Tree(less, later_value, earlier_value)
+    elif relation == 'value_plus1':
+        return Tree(equal, later_value, Tree(plus1, earlier_value))
+    elif relation == 'value_minus1':
+        return Tree(equal, later_value, Tree(minus1, earlier_value))
+    elif relation == 'suit_equal':
+        return Tree(equal, Tree(suit, later), Tree(suit, earlier))
+    elif relation == 'suit_greater':
+        return Tree(greater, Tree(suit, later), Tree(suit, earlier))
+    elif relation == 'suit_less':
+        return Tree(less, Tree(suit, later), Tree(suit, earlier))
+    elif relation == 'sum_even':
+        return Tree(equal, Tree(even, later), Tree(even, earlier))
+    return Tree(notf, Tree(equal, Tree(even, later), Tree(even, earlier)))
+
+#Every relation, with the mask of the windows it holds in from the value difference,
+#the suit difference and the parity sum of the two positions
+NUMERIC_RELATIONS = [
+    ('value_equal', lambda values, suits, parities: values == 0),
+    ('value_greater', lambda values, suits, parities: values > 0),
+    ('value_less', lambda values, suits, parities: values < 0),
+    ('value_plus1', lambda values, suits, parities: values == 1),
+    ('value_minus1', lambda values, suits, parities: values == -1),
+    ('suit_equal', lambda values, suits, parities: suits == 0),
+    ('suit_greater', lambda values, suits, parities: suits > 0),
+    ('suit_less', lambda values, suits, parities: suits < 0),
+    ('sum_even', lambda values, suits, parities: parities == 0),
+    ('sum_odd', lambda values, suits, parities: parities == 1),
+]
+
+def relation_masks(windows, later, earlier):
+    '''
+     Returns [(relation, mask)], the windows (an array of card codes, whose last columns
+     are previous and current) every relation holds in between two positions
+    '''
+    offset = 3 - windows.shape[1]
+    later_codes = windows[:, WINDOW_INDEX[later] - offset]
+    earlier_codes = windows[:, WINDOW_INDEX[earlier] - offset]
+    values = VALUE_TABLE[later_codes].astype(np.int16) - VALUE_TABLE[earlier_codes]
+    suits = SUIT_TABLE[later_codes].astype(np.int16) - SUIT_TABLE[earlier_codes]
+    parities = PARITY_TABLE[later_codes] ^ PARITY_TABLE[earlier_codes]
+    return [(relation, mask(values, suits, parities)) for (relation, mask) in NUMERIC_RELATIONS]
+
+def numeric_relation_scores(legal_codes, illegal_codes, three_length_hypothesis_flag=True):
+    '''
+     Returns {rule: score} for every relation between two positions seen in a legal
+     window, from the legal cards and the illegal tuples of a board (see Board)
+    '''
+    legal = {2: window_array(zip(legal_codes[:-1], legal_codes[1:]), 2),
+             3: window_array(zip(legal_codes[:-2], legal_codes[1:-1], legal_codes[2:]), 3)}
+    illegal = dict((arity, window_array([elem for elem in illegal_codes if len(elem) == arity], arity))
+                   for arity in (2, 3))
+    pairs = RELATION_PAIRS if three_length_hypothesis_flag else RELATION_PAIRS[:1]
+
+    scores = {}
+    for (later, earlier) in pairs:
+        arity = 2 if earlier == 'previous' else 3
+        illegal_masks = dict(relation_masks(illegal[arity], later, earlier))
+        for (relation, mask) in relation_masks(legal[arity], later, earlier):
+            support = int(mask.sum())
+            if support:
+                scores[relation_tree(relation, later, earlier)] = NUMERIC_WEIGHT * (support - int(illegal_masks[relation].sum()))
+    return scores
+
+def rank_numeric_relations(board, three_length_hypothesis_flag=True):
+    '''
+     Returns the relations of a Board scoring above the mean, ranked
+    '''
+    scores = numeric_relation_scores(board.legal_codes, board.illegal_codes, three_length_hypothesis_flag)
+    mean_cutoff = sum(scores.itervalues()) / max(len(scores), 1)
+    return HypothesisRanking(((rule, score) for rule, score in scores.iteritems() if score > mean_cutoff),
+                             tiebreak=str)
+
+def window_relations(cards):
+    '''
+     Returns the rules of the relations holding in a window of two or three cards
+    '''
+    windows = window_array([encode_cards(cards)], len(cards))
+    pairs = RELATION_PAIRS if len(cards) == 3 else RELATION_PAIRS[:1]
+    return [relation_tree(relation, later, earlier) for (later, earlier) in pairs
+            for (relation, mask) in relation_masks(windows, later, earlier) if mask[0]]
@@ -8,7 +8,8 @@ game_ended = False
 
 players_hand_card={}
 class Player: 
-	def __init__(self):
+	def __init__(self, session=None):
+		self.session = session
 		self.hand = self.get_card_list(14)
 	
 	def update_hand(self, card):
@@ -35,9 +36,27 @@ class Player:
 		return card
 
 	def play(self, cards=None):
-		return play_player_card(self, cards, self.hand)
+		return play_player_card(self, cards, self.hand, self.session)
 
 	def get_player_card_list(self, player):
 		for player in players_hand_card:
 			print "Player hand card",players_hand_card[str(player)]
 		return players_hand_card[str(player)]
+
+def generate_random_card():
+	values = ["1", "2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K"]
+	suits = ["S", "H", "D", "C"]
+	return values[random.randint(0, len(values)-1)] + suits[random.randint(0, len(suits)-1)]
+
+class Adversary(object):
+	def __init__(self, session=None):
+		self.session = session
+		self.hand = [generate_random_card() for i in range(14)]
+
+	def play(self):
+		"""
+		Plays a random card out of the hand, on the board of the session
+		"""
+		next_card = self.hand[random.randint(0, len(self.hand)-1)]
+		play_card(next_card, self.session)
+		return next_card
@@ -0,0 +1,197 @@
+import numpy as np
+from CardCodec import *
+from TreeFunctions import *
+
+#Bit index of a card triple: ((previous2 * 52) + previous) * 52 + current,
+#rules that never look at previous2 only keep the (previous, current) part
+TABLE_SIZE = {2: NUMBER_OF_CARDS ** 2, 3: NUMBER_OF_CARDS ** 3}
+FULL_TABLE = {2: (1 << TABLE_SIZE[2]) - 1, 3: (1 << TABLE_SIZE[3]) - 1}
+
+CARD_BLOCK = (1 << NUMBER_OF_CARDS) - 1
+#Multiplying a block by these repeats it once per card of the position above it
+REPEAT_ROWS = sum(1 << (NUMBER_OF_CARDS * i) for i in xrange(NUMBER_OF_CARDS))
+REPEAT_SLICES = sum(1 << (TABLE_SIZE[2] * i) for i in xrange(NUMBER_OF_CARDS))
+
+def table_index(previous2, previous, current, arity):
+    '''
+     Returns the bit index of a card triple in a table of the given arity
+    '''
+    if arity == 2:
+        return previous * NUMBER_OF_CARDS + current
+    return (previous2 * NUMBER_OF_CARDS + previous) * NUMBER_OF_CARDS + current
+
+def popcount(bits):
+    return bin(bits).count('1')
+
+class RuleTable:
+    '''
+     Truth table of a rule over all (previous2, previous, current) card triples.
+     Evaluating it is one index lookup and tables combine with &, | and ~.
+    '''
+    def __init__(self, bits, arity):
+        self.bits = bits
+        self.arity = arity
+        self.truth = None
+        self.flags = None
+        self.broadcast_table = None
+
+    def broadcast(self, arity):
+        '''
+         Returns this table over a larger arity, repeated for every previous2 card
+        '''
+        if arity == self.arity:
+            return self
+        if self.broadcast_table is None:
+            #Doubling the copies with shifts is much cheaper than multiplying by REPEAT_SLICES
+            (bits, copies) = (self.bits, 1)
+            while copies < NUMBER_OF_CARDS:
+                bits |= bits << (TABLE_SIZE[2] * copies)
+                copies *= 2
+            self.broadcast_table = RuleTable(bits & FULL_TABLE[3], arity)
+        return self.broadcast_table
+
+    def __and__(self, other):
+        arity = max(self.arity, other.arity)
+        return RuleTable(self.broadcast(arity).bits & other.broadcast(arity).bits, arity)
+
+    def __or__(self, other):
+        arity = max(self.arity, other.arity)
+        return RuleTable(self.broadcast(arity).bits | other.broadcast(arity).bits, arity)
+
+    def __invert__(self):
+        return RuleTable(FULL_TABLE[self.arity] ^ self.bits, self.arity)
+
+    def evaluate(self, previous2, previous, current):
+        '''
+         Returns whether the rule holds for the card codes, a single lookup
+        '''
+        return self.truth_string()[table_index(previous2, previous, current, self.arity)] == '1'
+
+    def truth_string(self):
+        if self.truth is None:
+            #One character per triple, most significant bit last
+            self.truth = format(self.bits, '0' + str(TABLE_SIZE[self.arity]) + 'b')[::-1]
+        return self.truth
+
+    def evaluate_windows(self, windows):
+        '''
+         Returns whether the rule holds for every row of an array of card codes, whose last
+         columns are previous and current, as a boolean vector of lookups
+        '''
+        if self.flags is None:
+            self.flags = np.frombuffer(self.truth_string(), dtype=np.uint8) == ord('1')
+        (previous, current) = (windows[:, -2], windows[:, -1])
+        indices = previous * NUMBER_OF_CARDS + current
+        if self.arity == 3:
+            indices = indices + windows[:, -3] * TABLE_SIZE[2]
+        return self.flags[indices]
+
+    def count(self, windows):
+        '''
+         Returns the number of board windows in which the rule holds
+        '''
+        return sum(popcount(self.bits & level) for level in windows.levels(self.arity))
+
+class WindowTable:
+    '''
+     The card triples of the legal board windows, as bitsets in the RuleTable layout.
+     levels(arity)[k] holds the triples that occur more than k times.
+    '''
+    def __init__(self, legal_cards):
+        self.legal_cards = legal_cards
+        self.window_levels = {}
+
+    def levels(self, arity):
+        if arity not in self.window_levels:
+            occurrence = {}
+            cards = self.legal_cards
+            for i in xrange(2, len(cards)):
+                index = table_index(cards[i-2], cards[i-1], cards[i], arity)
+                occurrence[index] = occurrence.get(index, 0) + 1
+            levels = []
+            while occurrence:
+                bits = 0
+                for index in occurrence.keys():
+                    bits |= 1 << index
+                    occurrence[index] -= 1
+                    if occurrence[index] == 0:
+                        del occurrence[index]
+                levels.append(bits)
+            self.window_levels[arity] = levels
+        return self.window_levels[arity]
+
+def tabulate_function(function, used):
+    '''
+     Enumerates a compiled function over the card positions it uses. A triple the
+     function raises on, such as plus1 of a King, is one the rule rejects
+    '''
+    def holds(previous2, previous, current):
+        try:
+            return function(previous2, previous, current)
+        except Exception:
+            return False
+
+    def slice_bits(previous2):
+        #The (previous, current) table for one previous2 card
+        if 'previous' in used and 'current' in used:
+            bits = 0
+            for previous in xrange(NUMBER_OF_CARDS):
+                for current in xrange(NUMBER_OF_CARDS):
+                    if holds(previous2, previous, current):
+                        bits |= 1 << (previous * NUMBER_OF_CARDS + current)
+            return bits
+        elif 'current' in used:
+            row = 0
+            for current in xrange(NUMBER_OF_CARDS):
+                if holds(previous2, None, current):
+                    row |= 1 << current
+            return row * REPEAT_ROWS
+        elif 'previous' in used:
+            bits = 0
+            for previous in xrange(NUMBER_OF_CARDS):
+                if holds(previous2, previous, None):
+                    bits |= CARD_BLOCK << (previous * NUMBER_OF_CARDS)
+            return bits
+        return FULL_TABLE[2] if holds(previous2, None, None) else 0
+
+    if 'previous2' not in used:
+        return RuleTable(slice_bits(None), 2)
+    bits = 0
+    for previous2 in xrange(NUMBER_OF_CARDS):
+        bits |= slice_bits(previous2) << (previous2 * TABLE_SIZE[2])
+    return RuleTable(bits, 3)
+
+def constant_table(flag, arity=2):
+    return RuleTable(FULL_TABLE[arity] if flag else 0, arity)
+
+def rule_fingerprint(tree):
+    '''
+     Returns the truth table of a rule over every (previous2, previous, current) triple as
+     one integer, the same for exactly the rules that accept the same triples
+    '''
+    return rule_table(tree).broadcast(3).bits
+
+def rule_table(tree):
+    '''
+     Returns the RuleTable of a Tree, cached on the Tree. Logical nodes combine the tables
+     of their children, only the comparisons at the leaves are enumerated, over the positions they use
+    '''
+    if not isinstance(tree, Tree):
+        return constant_table(tree)
+    if tree.table is not None:
+        return tree.table
+
+    f = tree.root
+    if f == andf:
+        table = rule_table(tree.left) & rule_table(tree.right)
+    elif f == orf:
+        table = rule_table(tree.left) | rule_table(tree.right)
+    elif f == notf:
+        table = ~rule_table(tree.left)
+    elif f == iff:
+        test = rule_table(tree.test)
+        table = (test & rule_table(tree.left)) | (~test & rule_table(tree.right))
+    else:
+        table = tabulate_function(tree.compile(), tree_positions(tree))
+    tree.table = table
+    return table
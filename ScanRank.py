@@ -9,40 +9,82 @@ import time
 from NewEleusisHelper import *
 from TreeFunctions import *
 from HypothesisRankParams import *
-from itertools import izip_longest
-
-sum_greater_than = []
-curr_greater_than_prev = []
-curr_less_than_prev = []
-sum_less_than = []
-empty_less_flag = False
-empty_great_flag = False
-
-char_dict={}
-begin_index = 0
-hypothesis_dict = {}
-
-current_dict = {}
-previous_dict = {}
-previous2_dict = {}
-
-
-def scan_and_rank_hypothesis(three_length_hypothesis_flag):
+from RuleTable import *
+from BatchEvaluator import *
+from HypothesisIndex import *
+from HypothesisRanking import *
+from NumericConstraints import *
+from NumericMiner import *
+from itertools import islice
+
+#A hypothesis is the tuple (shape, previous2, previous, current) of characteristic ids (see CardCodec),
+#previous2 is None for the two card shapes. hypothesis_string renders it in the string form
+#"and(current='C3',or(previous='C14',previous2='C22'))" used by tree_transform.
+PREVIOUS2, PREVIOUS, CURRENT = 0, 1, 2
+POSITION_NAMES = ('previous2', 'previous', 'current')
+
+#(operator, nested, positions in the order they are written), nested shapes put the
+#last two positions under the other operator
+HYPOTHESIS_SHAPES = [('or', False, (CURRENT, PREVIOUS)),
+                     ('and', False, (CURRENT, PREVIOUS)),
+                     ('or', False, (CURRENT, PREVIOUS, PREVIOUS2)),
+                     ('and', False, (CURRENT, PREVIOUS, PREVIOUS2)),
+                     ('or', True, (CURRENT, PREVIOUS, PREVIOUS2)),
+                     ('and', True, (CURRENT, PREVIOUS, PREVIOUS2)),
+                     ('or', True, (PREVIOUS, CURRENT, PREVIOUS2)),
+                     ('and', True, (PREVIOUS, CURRENT, PREVIOUS2)),
+                     ('or', True, (PREVIOUS2, CURRENT, PREVIOUS)),
+                     ('and', True, (PREVIOUS2, CURRENT, PREVIOUS))]
+TWO_CARD_SHAPES = range(0, 2)
+THREE_CARD_SHAPES = range(2, len(HYPOTHESIS_SHAPES))
+
+#Number of numeric relations of numeric_hypothesis scan_and_rank_rules combines
+NUMERIC_RULES = 3
+
+#The weight of each characteristic id, index 0 is unused
+characteristic_weights = [0] + [set_characteristic_weights()[name] for name in ALL_CHARACTERISTIC_NAMES]
+
+def hypothesis_string(hypothesis):
+    '''
+     Renders a hypothesis key in its string form
+    '''
+    (operator, nested, order) = HYPOTHESIS_SHAPES[hypothesis[0]]
+    terms = [POSITION_NAMES[position] + "='" + ALL_CHARACTERISTIC_NAMES[hypothesis[position + 1] - 1] + "'" for position in order]
+    if nested:
+        inner = 'and' if operator == 'or' else 'or'
+        return operator + '(' + terms[0] + ',' + inner + '(' + terms[1] + ',' + terms[2] + '))'
+    return operator + '(' + ','.join(terms) + ')'
+
+def hypothesis_rank_key((hypothesis, value)):
+    #Ties are broken on the string form, as they were when hypotheses were strings
+    return (value, hypothesis_string(hypothesis))
+
+def session_hypotheses(session):
+    '''
+     Returns the hypothesis_dict of a session, the scores of the hypotheses seen so far
+     ranked (see HypothesisRanking), and its hypothesis_index, the same hypotheses by the
+     characteristic at each position (see HypothesisIndex). Both are created on first use.
+    '''
+    if session.hypothesis_dict is None:
+        session.hypothesis_dict = HypothesisRanking(tiebreak=hypothesis_string)
+        session.hypothesis_index = HypothesisIndex(session.hypothesis_dict)
+    return session.hypothesis_dict, session.hypothesis_index
+
+
+def scan_and_rank_hypothesis(three_length_hypothesis_flag, session=None):
     
-    global hypothesis_dict
-    global begin_index
-    global char_dict
+    session = get_session(session)
+    (hypothesis_dict, hypothesis_index) = session_hypotheses(session)
+    begin_index = session.begin_index
+    char_dict = session.char_dict
 
     orf_flag = True
-    board_state = parse_board_state()
-    legal_cards = board_state['legal_cards']
+    legal_cards = get_master_board_state(session).legal_codes
     legal_length = len(legal_cards)
 
-    characteristic_index_list = []
     for i in xrange(begin_index, legal_length):
-        update_characteristic_list(legal_cards[i], i, char_dict)
+        char_dict[i] = CARD_CHARACTERISTIC_IDS[legal_cards[i]]
 
-    weighted_property_dict = set_characteristic_weights()
     hypothesis_occurrence_count = {}
     
     mean = 0.0
@@ -53,7 +95,7 @@ def scan_and_rank_hypothesis(three_length_hypothesis_flag):
 
             start_time = time.time()
             for characteristic_tuple in itertools.product(*combined_char_indices_list):
-                generate_combination(characteristic_tuple[0], characteristic_tuple[1], characteristic_tuple[2])
+                generate_combination(characteristic_tuple[0], characteristic_tuple[1], characteristic_tuple[2], session=session)
         
     hypothesis_occurrence_count = {}
 
@@ -63,10 +105,8 @@ def scan_and_rank_hypothesis(three_length_hypothesis_flag):
         combined_char_indices_list = [char_dict[i-1], char_dict[i]]
 
         for characteristic_tuple in itertools.product(*combined_char_indices_list):
-                generate_combination(None, characteristic_tuple[0], characteristic_tuple[1])
+                generate_combination(None, characteristic_tuple[0], characteristic_tuple[1], session=session)
         
-    ranked_hypothesis_dict = OrderedDict(sorted(hypothesis_dict.items(), key = lambda (key, value) : (value, key), reverse=True))
-
     cumulative_sum = 0.0
     for key, value in hypothesis_dict.iteritems():
         cumulative_sum += value
@@ -77,20 +117,16 @@ def scan_and_rank_hypothesis(three_length_hypothesis_flag):
         hypothesis_offset = 1 
     mean_cutoff = cumulative_sum/hypothesis_offset
 
-    ranked_hypothesis = {} 
-    for key, value in hypothesis_dict.iteritems():
-        if value > mean_cutoff :
-            ranked_hypothesis[key] = value
-    
-    ranked_hypothesis_dict = OrderedDict(sorted(ranked_hypothesis.items(), key = lambda (key, value) : (value, key), reverse=True))
+    ranked_hypothesis = HypothesisRanking(((key, value) for key, value in hypothesis_dict.iteritems()
+                                           if value > mean_cutoff), tiebreak=hypothesis_string)
 
     # print 'Current iteration status: ' + str(ranked_hypothesis_dict.iteritems()[0])
-    begin_index = legal_length-2
+    session.begin_index = legal_length-2
     # exit()        
 
     #TODO eliminate conflicting hypothesis- ex: consecutive Royal/B/Odd & Non-Royal/R/Even. Check if already handled by pick_negative
     #Using illegal cards to eliminate possible hypothesis
-    illegal_tuple_list = parse_illegal_indices()
+    illegal_tuple_list = get_master_board_state(session).illegal_codes
     
     for elem in illegal_tuple_list:
         if len(elem) > 2 and three_length_hypothesis_flag:
@@ -98,45 +134,43 @@ def scan_and_rank_hypothesis(three_length_hypothesis_flag):
             prev = elem[1]
             curr = elem[2]
 
-            combined_char_indices_list = [get_card_mapping_characterstic(prev2), get_card_mapping_characterstic(prev), get_card_mapping_characterstic(curr)]
+            combined_char_indices_list = [CARD_CHARACTERISTIC_IDS[prev2], CARD_CHARACTERISTIC_IDS[prev], CARD_CHARACTERISTIC_IDS[curr]]
 
             for characteristic_tuple in itertools.product(*combined_char_indices_list):
-                generate_combination(characteristic_tuple[0], characteristic_tuple[1], characteristic_tuple[2], is_illegal=True)
+                generate_combination(characteristic_tuple[0], characteristic_tuple[1], characteristic_tuple[2], is_illegal=True, session=session)
         else:
             prev = elem[0]
             curr = elem[1]
 
-            combined_char_indices_list = [get_card_mapping_characterstic(prev), get_card_mapping_characterstic(curr)]
+            combined_char_indices_list = [CARD_CHARACTERISTIC_IDS[prev], CARD_CHARACTERISTIC_IDS[curr]]
             for characteristic_tuple in itertools.product(*combined_char_indices_list):
-                generate_combination(None, characteristic_tuple[0], characteristic_tuple[1], is_illegal=True)
-
-    ranked_hypothesis = OrderedDict(sorted(ranked_hypothesis.items(), key = lambda (key, value) : (value, key), reverse=True))
+                generate_combination(None, characteristic_tuple[0], characteristic_tuple[1], is_illegal=True, session=session)
 
     # print str(ranked_hypothesis_dict) + '  ' + str(cumulative_sum) + '   ' +  str(len(hypothesis_dict)) + '  ' + str(mean_cutoff)
     # exit()
     return ranked_hypothesis
 
 
-def scan_and_rank_rules(ranked_hypothesis, numeric_hypothesis = []):
-    global hypothesis_dict
-    board_state = parse_board_state()
+def scan_and_rank_rules(ranked_hypothesis, numeric_hypothesis = [], hypothesis_scores = None, session=None):
+    session = get_session(session)
+    if hypothesis_scores is None:
+        hypothesis_scores = session_hypotheses(session)[0]
+    board = get_master_board_state(session)
     weighted_property_dict = set_characteristic_weights()
-    legal_cards = board_state['legal_cards']
-    ranked_rules_list = []
-    for value in ranked_hypothesis.iteritems():
-        ranked_rules_list.append(value[0])
 
     #dict = {'and(previous=C2,current=C3)':12, 'or(previous=C2,current=C3)':3}
-    pruned_ranked_hypothesis = ranked_rules_list[0:5]
+    #Iterating a HypothesisRanking (or an OrderedDict) yields the hypotheses in rank order
+    pruned_ranked_hypothesis = list(islice(ranked_hypothesis, 5))
     pruned_ranked_hypothesis_dict = {}
+    transformed_rules = dict((hypothesis, tree_transform(hypothesis_string(hypothesis))) for hypothesis in pruned_ranked_hypothesis)
     for comb in combinations(pruned_ranked_hypothesis, 3):
         # pruned_ranked_hypothesis_dict.append(comb)
-        rule1 = tree_transform(comb[0])
-        rule2 = tree_transform(comb[1])
-        rule3 = tree_transform(comb[2])
-        rule1_rank = hypothesis_dict[comb[0]]
-        rule2_rank = hypothesis_dict[comb[1]]
-        rule3_rank = hypothesis_dict[comb[2]]
+        rule1 = transformed_rules[comb[0]]
+        rule2 = transformed_rules[comb[1]]
+        rule3 = transformed_rules[comb[2]]
+        rule1_rank = hypothesis_scores[comb[0]]
+        rule2_rank = hypothesis_scores[comb[1]]
+        rule3_rank = hypothesis_scores[comb[2]]
         pruned_ranked_hypothesis_dict[Tree(andf, rule1, rule2, rule3)] = HypothesisRankParams((rule1_rank+rule2_rank+rule3_rank)/3, 1)
         pruned_ranked_hypothesis_dict[Tree(orf, rule1, rule2, rule3)] = HypothesisRankParams(max(rule1_rank, rule2_rank, rule3_rank),1)
         pruned_ranked_hypothesis_dict[Tree(andf, rule1, Tree(orf, rule2, rule3))] = HypothesisRankParams((rule1_rank + max(rule2_rank, rule3_rank))/2,1)
@@ -149,22 +183,36 @@ def scan_and_rank_rules(ranked_hypothesis, numeric_hypothesis = []):
 
     for comb in combinations(pruned_ranked_hypothesis, 2):
         # pruned_ranked_hypothesis_dict[comb]
-        rule1 = tree_transform(comb[0])
-        rule2 = tree_transform(comb[1])
-        rule1_rank = hypothesis_dict[comb[0]]
-        rule2_rank = hypothesis_dict[comb[1]]
+        rule1 = transformed_rules[comb[0]]
+        rule2 = transformed_rules[comb[1]]
+        rule1_rank = hypothesis_scores[comb[0]]
+        rule2_rank = hypothesis_scores[comb[1]]
         pruned_ranked_hypothesis_dict[Tree(andf, rule1, rule2)] = HypothesisRankParams((rule1_rank+rule2_rank)/2,1)
         pruned_ranked_hypothesis_dict[Tree(orf, rule1, rule2)] = HypothesisRankParams(max(rule1_rank, rule2_rank),1)
 
     for hypothesis in pruned_ranked_hypothesis:
-        rule = tree_transform(hypothesis)
-        rule_rank = hypothesis_dict[hypothesis]    
+        rule = transformed_rules[hypothesis]
+        rule_rank = hypothesis_scores[hypothesis]    
         pruned_ranked_hypothesis_dict[rule] = HypothesisRankParams(rule_rank,1)
+
+    #The best numeric relations are candidates alone and combined with each of the hypotheses
+    for numeric_rule in islice(numeric_hypothesis, NUMERIC_RULES):
+        numeric_rank = numeric_hypothesis[numeric_rule]
+        pruned_ranked_hypothesis_dict[numeric_rule] = HypothesisRankParams(numeric_rank, 1)
+        for hypothesis in pruned_ranked_hypothesis:
+            rule = transformed_rules[hypothesis]
+            rule_rank = hypothesis_scores[hypothesis]
+            pruned_ranked_hypothesis_dict[Tree(andf, rule, numeric_rule)] = HypothesisRankParams((rule_rank + numeric_rank)/2, 1)
+            pruned_ranked_hypothesis_dict[Tree(orf, rule, numeric_rule)] = HypothesisRankParams(max(rule_rank, numeric_rank), 1)
+
+    #Equivalent candidates, such as and(A,or(B,C)) when A implies B, are scored once
+    pruned_ranked_hypothesis_dict = collapse_equivalent_rules(pruned_ranked_hypothesis_dict)
     
-    for i in xrange(2, len(legal_cards)):
-        for rule in pruned_ranked_hypothesis_dict:
-            if (rule.evaluate((legal_cards[i-2], legal_cards[i-1], legal_cards[i]))):
-                pruned_ranked_hypothesis_dict[rule].increment_occurrence()
+    #All rules are evaluated over every window at once, the compound rules reuse the vectors of rule1..rule3
+    rules = pruned_ranked_hypothesis_dict.keys()
+    occurrences = evaluate_rules(rules, board.cached('columns', lambda board: BoardColumns(board.legal_codes))).sum(axis=1)
+    for rule, occurrence in zip(rules, occurrences):
+        pruned_ranked_hypothesis_dict[rule].increment_occurrence(int(occurrence))
 
     accumulated_wt = 0.0
     for key, value in pruned_ranked_hypothesis_dict.iteritems():
@@ -175,509 +223,152 @@ def scan_and_rank_rules(ranked_hypothesis, numeric_hypothesis = []):
         hypothesis_offset = 1
     mean_cutoff = accumulated_wt / hypothesis_offset
     # print str(pruned_ranked_hypothesis_dict) + ' acc: ' + str(accumulated_wt) 
-    pr_ranked_hypothesis = {}
+    pr_ranked_hypothesis = HypothesisRanking(tiebreak=str)
     for key,value in pruned_ranked_hypothesis_dict.iteritems():
         # print 'key: ' + str(key) + ' wt ' + str(value.get_weight())
         # exit()
         if pruned_ranked_hypothesis_dict[key].get_weighted_product() > mean_cutoff:
             pr_ranked_hypothesis[key] = value.get_weight()
 
-    pr_ranked_hypothesis = OrderedDict(sorted(pr_ranked_hypothesis.items(), key=lambda (key, value): (value, key), reverse=True))
     # print str(pr_ranked_hypothesis.iteritems()[0][0])
     return pr_ranked_hypothesis
 
-def scan_and_rank_numeric_hypothesis(three_length_hypothesis_flag,):
-    hypothesis_dict = {}
-    board_state = parse_board_state()
-    master_board_state = get_master_board_state()
-    legal_cards_list = board_state['legal_cards']
-    print "Legal card list",legal_cards_list
-    illegal_cards_list = parse_illegal_indices()
-    curr = board_state['curr']
-    prev1 = board_state['prev']
-    prev2 = board_state['prev2']
-    print "Current is ", curr,' Previous is ',prev1,' Previous 2 is ',prev2
-    print "Master board state",master_board_state
-
-    # print "Legal cards",legal_cards_list
-    # print "Illegal cards",illegal_cards_list
-    for i in board_state:
-        print "i",i
-    for i in range(len(board_state)):
-        for i in board_state:
-            curr = board_state['curr']
-            prev1 = board_state['prev']
-            prev2 = board_state['prev2']
-            print "Current is ", curr,' Previous is ',prev1,' Previous 2 is ',prev2
-    get_numerical_range_relation(board_state)
-
-    characteristic_index_list = []
-    weighted_property_dict = set_characteristic_weights()
-    mean = 0.0
-    # if three_length_hypothesis_flag:
-    #     for i in xrange(2, len(board_state)):
-    #         numeric_relation_list = find_numeric_characteristic_relation(board_state[i - 2], board_state[i - 1], board_state[i])
-    #         print 'Numeric Relation List: ' + str(numeric_relation_list)
-    #         for numeric_relation in numeric_relation_list:
-    #             if numeric_relation in hypothesis_dict.keys():
-    #                 hypothesis_dict[numeric_relation] += 1
-    #             else:
-    #                 hypothesis_dict[numeric_relation] = 1
-    #             mean += 1
-
-    # for i in xrange(1, len(board_state)):
-    #     numeric_relation_list = find_numeric_characteristic_relation(prev_card=board_state[i - 1], current_card=board_state[i])
-    #     numeric_relation_list = list((str(x) for x in numeric_relation_list))
-    #     for numeric_relation in numeric_relation_list:
-    #         if numeric_relation in hypothesis_dict.keys():
-    #             hypothesis_dict[numeric_relation] += 1
-    #         else:
-    #             hypothesis_dict[numeric_relation] = 1
-    #         mean += 1
-
-    # legal_cards = board_state['legal_cards']
-    # print "Board state:",board_state
-    # print "legal state:", legal_cards
-    # print str(legal_cards)
-    # characteristic_index_list = []
-    # weighted_property_dict = set_characteristic_weights()
-    # mean = 0.0
-    # if three_length_hypothesis_flag:
-    #     for i in xrange(2, len(legal_cards)):
-    #         numeric_relation_list = find_numeric_characteristic_relation(legal_cards[i - 2], legal_cards[i - 1], legal_cards[i])
-    #         print 'Numeric Relation List: ' + str(numeric_relation_list)
-    #         for numeric_relation in numeric_relation_list:
-    #             if numeric_relation in hypothesis_dict.keys():
-    #                 hypothesis_dict[numeric_relation] += 1
-    #             else:
-    #                 hypothesis_dict[numeric_relation] = 1
-    #             mean += 1
-
-    # for i in xrange(1, len(legal_cards)):
-    #     numeric_relation_list = find_numeric_characteristic_relation(prev_card=legal_cards[i - 1], current_card=legal_cards[i])
-    #     numeric_relation_list = list((str(x) for x in numeric_relation_list))
-    #     for numeric_relation in numeric_relation_list:
-    #         if numeric_relation in hypothesis_dict.keys():
-    #             hypothesis_dict[numeric_relation] += 1
-    #         else:
-    #             hypothesis_dict[numeric_relation] = 1
-    #         mean += 1
-
-    # hypothesis_offset = len(hypothesis_dict)
-    # mean_cutoff = 0
-    # numeric_ranked_hypothesis = {}
-    # for value in hypothesis_dict.iteritems():
-    #     if value[1] > mean_cutoff:
-    #         numeric_ranked_hypothesis[value[0]] = value[1]
-    #     else:
-    #         break
-
-    # illegal_tuple_list = parse_illegal_indices()
-    # for elem in illegal_tuple_list:
-    #     if len(elem) > 2 and three_length_hypothesis_flag:
-    #         prev2 = elem[0]
-    #         prev = elem[1]
-    #         curr = elem[2]
-    #         numeric_relation_list = find_numeric_characteristic_relation(prev2, prev, curr)
-    #         for numeric_relation in numeric_relation_list:
-    #             if numeric_relation in numeric_ranked_hypothesis.keys():
-    #                 numeric_ranked_hypothesis[numeric_relation] -= 1
-
-    #     else:
-    #         prev = elem[0]
-    #         curr = elem[1]
-    #         numeric_relation_list = find_numeric_characteristic_relation(prev_card=prev, current_card=curr)
-    #         for numeric_relation in numeric_relation_list:
-    #             if numeric_relation in numeric_ranked_hypothesis.keys():
-    #                 numeric_ranked_hypothesis[numeric_relation] -= 1
-
-    # numeric_ranked_hypothesis = OrderedDict(sorted(numeric_ranked_hypothesis.items(), key=lambda (key, value): (value, key), reverse=True))
-    # return numeric_ranked_hypothesis
-
-def get_numerical_range_relation(board_state):
-    print "Board state"
-
-def add_elements(previous2_dict, previous_dict, current_dict, rule):
-    values = get_elements(rule)
-
-    if (values['previous2']):
-
-        if values['previous2'] in previous2_dict:
-            previous2_dict[values['previous2']].append(rule)
-        else:
-            previous2_dict[values['previous2']] = [rule]
-
-    if (values['previous']):
-        if values['previous'] in previous_dict:
-            previous_dict[values['previous']].append(rule)
-        else:
-            previous_dict[values['previous']] = [rule]
-
-    if (values['current']):
-        if values['current'] in current_dict:
-            current_dict[values['current']].append(rule)
-        else:
-            current_dict[values['current']] = [rule]
-
-
-    
-def get_elements(rule):
-    previous = re.compile(".*((previous)=\'([C][1-9][0-9]?)\').*")
-    
-    if previous.match(rule):
-        previous = previous.match(rule).group(3)
-
-    else:
-        previous = []
-    previous2 = re.compile(".*((previous2)=\'([C][1-9][0-9]?)\').*")
-    if  previous2.match(rule):
-        previous2 =  previous2.match(rule).group(3)
+def collapse_equivalent_rules(candidates):
+    '''
+     Keeps one rule of every set of candidates {rule: HypothesisRankParams} with the same
+     truth table, see RuleTable.rule_fingerprint: the best weighted, then the smallest
+    '''
+    equivalent_rules = {}
+    for rule in candidates:
+        equivalent_rules.setdefault(rule_fingerprint(rule), []).append(rule)
+    sizes = {}
+    collapsed = {}
+    for rules in equivalent_rules.itervalues():
+        if len(rules) > 1:
+            preference = lambda rule: (-candidates[rule].get_weight(), tree_size(rule, sizes))
+            best = min(preference(rule) for rule in rules)
+            #Rules of the same weight and size are told apart by their text
+            rules = sorted((rule for rule in rules if preference(rule) == best), key=str)
+        collapsed[rules[0]] = candidates[rules[0]]
+    return collapsed
+
+def scan_and_rank_numeric_hypothesis(three_length_hypothesis_flag, session=None):
+    '''
+     Returns the numeric relations between two positions of the board scoring above the
+     mean, ranked (see NumericMiner), for the numeric_hypothesis of scan_and_rank_rules.
+     The ranking is computed again only once cards were played.
+    '''
+    board = get_master_board_state(session)
+    return board.cached(('numeric_relations', three_length_hypothesis_flag),
+                        lambda board: rank_numeric_relations(board, three_length_hypothesis_flag))
+
+def calculate_weight(rule):
+    '''
+     Returns the weight a hypothesis starts with: the mean of its weights for a flat and,
+     the mean of the outer and the first inner weight for a nested and, the maximum for an or
+    '''
+    (operator, nested, order) = HYPOTHESIS_SHAPES[rule[0]]
+    (previous2, previous, current) = rule[1:]
+    weights = characteristic_weights
+    previous2_weight = weights[previous2] if previous2 else 0
+    if operator == 'or':
+        return max(weights[current], weights[previous], previous2_weight)
+    if nested:
+        return (weights[rule[order[0] + 1]] + weights[rule[order[1] + 1]])/2
+    return (weights[current] + weights[previous] + previous2_weight)/(3 if previous2 else 2)
+
+def parse_elements(rule, session=None):
+    '''
+     Adds a hypothesis seen on the board to the hypothesis_dict of the session. A nested and
+     gains its weight again, every other shape doubles its score
+    '''
+    hypothesis_dict = session_hypotheses(get_session(session))[0]
+    (operator, nested, order) = HYPOTHESIS_SHAPES[rule[0]]
+    if rule not in hypothesis_dict:
+        hypothesis_dict[rule] = calculate_weight(rule)
+    elif operator == 'and' and nested:
+        hypothesis_dict[rule] += calculate_weight(rule)
     else:
-        previous2 = []
-    current = re.compile(".*((current)=\'([C][1-9][0-9]?)\').*")
-    if current.match(rule):
-        current = current.match(rule).group(3)
-    else:
-        current = []
-    
-    return {'previous': previous, 'current':current, 'previous2':previous2}
-
-def get_key_value_pair_dict(dictionary):
-    if (dictionary['current']):
-        return current_dict, dictionary['current']
-    if (dictionary['previous']):
-        return previous_dict, dictionary['previous']
-    if (dictionary['previous2']):
-        return previous2_dict, dictionary['previous2']
-
-def get_key_value_pair(dictionary):
-    if (dictionary['current']):
-        return 'current', dictionary['current']
-    if (dictionary['previous']):
-        return 'previous', dictionary['previous']
-    if (dictionary['previous2']):
-        return 'previous2', dictionary['previous2']
-
-def parse_elements(rule):
-    weighted_property_dict = set_characteristic_weights()
-    sub_rule_tokens = ''
-    if (rule.startswith('and')):
-        sub_rule_tokens = rule[4:-1].split(',')
-        if (('or' in sub_rule_tokens[1])):
-            c0_dict,c0_value = get_key_value_pair_dict(get_elements(sub_rule_tokens[0]))
-            # since this is an and value we add it to the weighted property hypothesis_dict
-            value = weighted_property_dict[c0_value]
-            c1_dict,c1_value = get_key_value_pair(get_elements(sub_rule_tokens[1]))
-            
-            c1_weighted_value = weighted_property_dict[c1_value]
-
-            c2_dict,c2_value = get_key_value_pair_dict(get_elements(sub_rule_tokens[1]))
-            
-            c2_weighted_value = weighted_property_dict[c2_value]
-            total_weight = (value + max(c1_weighted_value, c2_weighted_value))/2
-            if rule in hypothesis_dict:
-                hypothesis_dict[rule] += total_weight
-            else:
-                hypothesis_dict[rule] = total_weight
-        
-        else:
-            # the logic only includes an and
-            # check in the dictionary if the same value exist
-            if (rule in hypothesis_dict):
-                hypothesis_dict[rule] += hypothesis_dict[rule]
-            else:
-                hypothesis_dict[rule] = calculate_weight(get_elements(rule), True)
-
-    elif(rule.startswith('or')):
-        sub_rule_tokens = rule[3:-1]
-        if ('and' in sub_rule_tokens[1]):
-            c0_dict,c0_value = get_key_value_pair_dict(get_elements(sub_rule_tokens[0]))
-            # since this is an and value we add it to the weighted property hypothesis_dict
-            value = weighted_property_dict[c0_value]
-            c1_dict,c1_value = get_key_value_pair(get_elements(sub_rule_tokens[1]))
-            
-            c1_weighted_value = weighted_property_dict[c1_value]
-
-            c2_dict,c2_value = get_key_value_pair_dict(get_elements(sub_rule_tokens[1]))
-            
-            c2_weighted_value = weighted_property_dict[c2_value]
-            total_weight = max(value, ((c1_weighted_value + c2_weighted_value)/2))
-            if rule in hypothesis_dict:
-                hypothesis_dict[rule] += total_weight
-            else:
-                hypothesis_dict[rule] = total_weight
-        else:
-            # the logic only includes an and
-            # check in the dictionary if the same value exist
-            if (rule in hypothesis_dict):
-                hypothesis_dict[rule] += hypothesis_dict[rule]
-            else:
-                # calculate the weight
-                hypothesis_dict[rule] = calculate_weight(get_elements(rule), False)
-
-def get_hypothesis_by_characterstic(index_position_dict, characterstic):
-    if characterstic in index_position_dict:
-        return index_position_dict[characterstic]
-    return None
-
-def evaluate(index_position_dict, previous2, previous, current, key, is_illegal= False):
-    weighted_property_dict = set_characteristic_weights()
-    global hypothesis_dict
-
-    if key == 'current':
-        rule_list = get_hypothesis_by_characterstic(index_position_dict, current)
-        weight_index = current
-    elif key == 'previous':
-        rule_list = get_hypothesis_by_characterstic(index_position_dict, previous)
-        weight_index = previous
-    elif key == 'previous2':
-        rule_list = get_hypothesis_by_characterstic(index_position_dict, previous2)
-        weight_index = previous2
+        hypothesis_dict[rule] += hypothesis_dict[rule]
+
+def evaluate(characteristics, position, is_illegal= False, session=None):
+    '''
+     Adds the weight of the characteristic at position to every hypothesis indexed under it
+     that holds for characteristics, subtracts it for an illegal play. The flags carry over
+     from one hypothesis to the next and a flat or only tests its first position
+    '''
+    (hypothesis_dict, hypothesis_index) = session_hypotheses(get_session(session))
+
+    weight = characteristic_weights[characteristics[position]]
+    if is_illegal:
+        weight = -weight
     first_flag = False
     second_flag = False
-    third_flag = False 
-    for rule in rule_list:
-        split_rule = rule.split(',')
-        if split_rule[0].startswith('and'):
-            key,value = get_key_value_pair(get_elements(split_rule[0]))
-            if check_value(current, previous, previous2, key, value):
-                first_flag = True
-            if split_rule[1].startswith('or'):
-                key,value = get_key_value_pair(get_elements(split_rule[1]))
-                if check_value(current, previous, previous2, key, value):
-                    second_flag = True
-                key,value = get_key_value_pair(get_elements(split_rule[2]))
-                if check_value(current, previous, previous2, key, value):
-                    third_flag = True
-                # perform normal 'and'
-                if (first_flag and (second_flag or third_flag)):
-                    if is_illegal:
-                        hypothesis_dict[rule] -= weighted_property_dict[weight_index]    
-                    else:
-                        hypothesis_dict[rule] += weighted_property_dict[weight_index]
-            elif not split_rule[1].startswith('or') and not split_rule[1].startswith('and'):
-                key,value = get_key_value_pair(get_elements(split_rule[1]))
-                if check_value(current, previous, previous2, key, value):
-                    second_flag = True
-                if len(split_rule)>2:
-                    key,value = get_key_value_pair(get_elements(split_rule[2]))
-                    if check_value(current, previous, previous2, key, value):
-                        third_flag = True
-                    if (first_flag and second_flag and third_flag):
-                        if is_illegal:
-                            hypothesis_dict[rule] -= weighted_property_dict[weight_index]    
-                        else:
-                            hypothesis_dict[rule] += weighted_property_dict[weight_index]
-                else:
-                    if (first_flag and second_flag):
-                        if is_illegal:
-                            hypothesis_dict[rule] -= weighted_property_dict[weight_index]    
-                        else:
-                            hypothesis_dict[rule] += weighted_property_dict[weight_index]
-        elif split_rule[0].startswith('or'):
-            key,value = get_key_value_pair(get_elements(split_rule[0]))
-            if check_value(current, previous, previous2, key, value):
-                first_flag = True
-            if split_rule[1].startswith('and'):
-                key,value = get_key_value_pair(get_elements(split_rule[1]))
-                if check_value(current, previous, previous2, key, value):
-                    second_flag = True
-                key,value = get_key_value_pair(get_elements(split_rule[2]))
-                if check_value(current, previous, previous2, key, value):
-                    third_flag = True
-                if (first_flag or (second_flag and third_flag)):
-                    if is_illegal:
-                        hypothesis_dict[rule] -= weighted_property_dict[weight_index]    
-                    else:
-                        hypothesis_dict[rule] += weighted_property_dict[weight_index]
-            elif not split_rule[1].startswith('and') and not split_rule[1].startswith('or'):
-                if split_rule[1].startswith('and'):
-                    key,value = get_key_value_pair(get_elements(split_rule[1]))
-                    if check_value(current, previous, previous2, key, value):
-                        second_flag = True
-                    if len(split_rule)>2:
-                        key,value = get_key_value_pair(get_elements(split_rule[2]))
-                        if check_value(current, previous, previous2, key, value):
-                            third_flag = True
-                        if (first_flag or second_flag or third_flag):
-                            if is_illegal:
-                                hypothesis_dict[rule] -= weighted_property_dict[weight_index]    
-                            else:
-                                hypothesis_dict[rule] += weighted_property_dict[weight_index]               
-                else:
-                    if (first_flag or second_flag):
-                        if is_illegal:
-                            hypothesis_dict[rule] -= weighted_property_dict[weight_index]    
-                        else:
-                            hypothesis_dict[rule] += weighted_property_dict[weight_index]
-
-    
-def check_value(current, previous, previous2, key, value):
-    if key == 'current':
-        return current == value
-    if key == 'previous':
-        return previous == value
-    if key == 'previous2':
-        return previous2 == value
-    return False
-
-def calculate_weight(values, and_flag):
-    weighted_property_dict = set_characteristic_weights()
-    dividend = 2
-    # set to default 0 as we might have a 2 length rule as well
-    previous2_weight = 0
-    
-    previous_weight = weighted_property_dict[values['previous']]
-    current_weight = weighted_property_dict[values['current']]
-    if (values['previous2']):
-        previous2_weight = weighted_property_dict[values['previous2']]
-        dividend = 3
-    if and_flag:
-        return ((current_weight+previous_weight+previous2_weight)/dividend)
-    else:
-        return max(current_weight, previous_weight, previous2_weight) 
+    third_flag = False
+    held = []
+    for rule in hypothesis_index.hypotheses(position, characteristics[position]):
+        (operator, nested, order) = HYPOTHESIS_SHAPES[rule[0]]
+        if characteristics[order[0]] == rule[order[0] + 1]:
+            first_flag = True
+        if operator == 'or' and not nested:
+            holds = first_flag or second_flag
+        else:
+            if characteristics[order[1]] == rule[order[1] + 1]:
+                second_flag = True
+            if len(order) > 2 and characteristics[order[2]] == rule[order[2] + 1]:
+                third_flag = True
+            if operator == 'or':
+                holds = first_flag or (second_flag and third_flag)
+            elif nested:
+                holds = first_flag and (second_flag or third_flag)
+            elif len(order) > 2:
+                holds = first_flag and second_flag and third_flag
+            else:
+                holds = first_flag and second_flag
+        if holds:
+            held.append(rule)
+    hypothesis_dict.increment(held, weight)
 
-def generate_combination(previous2, previous, current, is_illegal=False):
-    global previous2_dict
-    global previous_dict
-    global current_dict
-    characterstic_combination = []
+def generate_combination(previous2, previous, current, is_illegal=False, session=None):
+    session = get_session(session)
+    characteristics = (previous2, previous, current)
 
     if previous2:
-        if previous2 in previous2_dict:
-            evaluate(previous2_dict, previous2, previous, current, "previous2", is_illegal)
+        evaluate(characteristics, PREVIOUS2, is_illegal, session)
     if previous:
-        if previous in previous_dict:
-            evaluate(previous_dict, previous2, previous, current, "previous", is_illegal)
+        evaluate(characteristics, PREVIOUS, is_illegal, session)
     
     if current:
-        if current in current_dict:
-            evaluate(current_dict, previous2, previous, current, "current", is_illegal)
+        evaluate(characteristics, CURRENT, is_illegal, session)
 
     if not is_illegal:
         if (previous2 == None):
             # two length hypothesis
-            characterstic_combination.append("or(current='"+current+"',previous='"+previous+"')")
-            characterstic_combination.append("and(current='"+current+"',previous='"+previous+"')")
-        else:
-            characterstic_combination.append("or(current='"+current+"',previous='"+previous+"',previous2='"+previous2+"')")
-            characterstic_combination.append("and(current='"+current+"',previous='"+previous+"',previous2='"+previous2+"')")
-            characterstic_combination.append("or(current='"+current+"',and(previous='"+previous+"',previous2='"+previous2+"'))")
-            characterstic_combination.append("and(current='"+current+"',or(previous='"+previous+"',previous2='"+previous2+"'))")
-            characterstic_combination.append("or(previous='"+previous+"',and(current='"+current+"',previous2='"+previous2+"'))")
-            characterstic_combination.append("and(previous='"+previous+"',or(current='"+current+"',previous2='"+previous2+"'))")
-            characterstic_combination.append("or(previous2='"+previous2+"',and(current='"+current+"',previous='"+previous+"'))")
-            characterstic_combination.append("and(previous2='"+previous2+"',or(current='"+current+"',previous='"+previous+"'))")
-
-        for rule in characterstic_combination:
-            parse_elements(rule)
-            add_elements(previous2_dict, previous_dict, current_dict, rule) 
-
-
-def get_mapping(prev1,curr,legal_flag):    
-
-    global sum_greater_than,sum_less_than
-    global empty_less_flag, empty_great_flag
-    global curr_greater_than_prev, curr_less_than_prev
-    if empty_great_flag and empty_less_flag:
-        return True
-    if (len(sum_greater_than) == 1 and len(sum_less_than) == 0):
-        return True
-    if (len(sum_greater_than) == 0 and len(sum_less_than) == 1):
-        return True
-    
-    curr = value(curr)
-    prev1 = value(prev1)
-
-    if (curr > prev1 and legal_flag):
-        curr_greater_than_prev.append(True)
-    elif((curr<prev1 and legal_flag==True) or (curr>prev1 and legal_flag==False)):
-        curr_greater_than_prev.append(False)
-
-    if (curr<prev1 and legal_flag):
-        curr_less_than_prev.append(True)
-    elif((curr>prev1 and legal_flag==True) or (curr<prev1 and legal_flag==False)):
-        curr_less_than_prev.append(False)
-
-    add = prev1 + curr
-    if len(sum_less_than) == 0 and len(sum_greater_than) == 0:
-        sum_greater_than = range(1, add)
-        sum_less_than = range(add+1, 27)
-    else:
-        if legal_flag == True:
-            if add-1 < sum_greater_than[-1] and empty_great_flag == False:
-                sum_greater_than = range(1,add)
-            if sum_less_than and add+1 > sum_less_than[0] and empty_less_flag == False:
-                sum_less_than = range(add+1,27)
+            shapes = TWO_CARD_SHAPES
         else:
-            if empty_great_flag == False:
-                if add > sum_greater_than[-1]: 
-                    sum_greater_than = []
-                    empty_great_flag = True
-                else:
-                    print empty_great_flag
-                    if empty_great_flag == False:
-                        sum_greater_than = range(add+1,sum_greater_than[-1]+1)
-            
-            if (sum_less_than and add < sum_less_than[0]) and empty_less_flag == False:
-                sum_less_than = []
-                empty_less_flag = True
-            elif(sum_less_than):
-                if empty_less_flag == False:
-                    sum_less_than = range(sum_less_than[0],add)
-
-    return False
-
-def pairs(state):
-    for (key, lst), nxt in izip_longest(state, state[1:]):
-        for x in lst:
-            yield key, x, False
-        if nxt is not None:
-            yield key, nxt[0], True
-
-
-def map_numeric():
-    
-    master_board_state = get_master_board_state()
-    less_than_rule = []
-    greater_than_rule = []
-
-    card_pair_list = []
-
-    for p in pairs(master_board_state):
-        card_pair_list.append(p)
-
-    for card in card_pair_list:
-        rules = get_mapping(card[0],card[1],card[2])
-        if rules == True:
-            break
-    
-    for val in sum_less_than:
-                less_than_rule.append("less(summation(value(previous),value(current))," + str(val) + ")")
-    for val in sum_greater_than:
-                greater_than_rule.append("greater(summation(value(previous),value(current))," + str(val) + ")")
-
-    if False not in curr_greater_than_prev:
-        greater_than_rule.append("greater(value(current), value(previous)), True")
-    elif False in curr_greater_than_prev and "greater(value(current), value(previous)), True" in greater_than_rule:
-        greater_than_rule.remove("greater(value(current), value(previous)), True")
-
-    if False not in curr_less_than_prev:
-        less_than_rule.append("less(value(current), value(previous)), True")
-    elif False in curr_less_than_prev and "less(value(current), value(previous)), True" in less_than_rule:
-        less_than_rule.remove("less(value(current), value(previous)), True")
-
-    return less_than_rule, greater_than_rule
-
-def parse_numeric_rules(less_value_rules, greater_value_rules):
-    
-    less_than_rules = []
-    if (less_value_rules):
-        for rule in less_value_rules:
-             less_than_rules.append(parse(rule))
-
-    greater_than_rules = []
-    if (greater_value_rules):
-        for rule in greater_value_rules:
-            greater_than_rules.append(parse(rule))     
-    return less_than_rules,greater_than_rules
+            shapes = THREE_CARD_SHAPES
+
+        for shape in shapes:
+            rule = (shape, previous2, previous, current)
+            parse_elements(rule, session)
+            session.hypothesis_index.add(rule)
+
+
+def session_numeric_constraints(session):
+    '''
+     Returns the NumericConstraints of a session, created on first use
+    '''
+    if session.numeric_constraints is None:
+        session.numeric_constraints = NumericConstraints()
+    return session.numeric_constraints
+
+def map_numeric(session=None):
+    '''
+     Returns ([less rules], [greater rules]), the threshold rules on the sum, difference and
+     ratio of the values of two positions consistent with the board, see NumericConstraints.
+     Only the plays made since the last call are observed.
+    '''
+    session = get_session(session)
+    numeric_constraints = session_numeric_constraints(session)
+    numeric_constraints.update(get_master_board_state(session))
+    return numeric_constraints.surviving_rules()
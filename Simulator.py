@@ -0,0 +1,162 @@
+'''
+ Plays many headless games of New Eleusis against a list of secret rules, across a
+ multiprocessing pool, and reports how often and how fast the scientist finds them.
+
+ Every game gets its own GameSession and its own seed for random, which the dealer,
+ pick_random_card, Player and Adversary draw from, so a batch can be replayed exactly.
+
+     python Simulator.py --games 20 --processes 4 "equal(color(current), R)"
+'''
+import os
+import sys
+import time
+import random
+import argparse
+from multiprocessing import Pool
+from GameSession import *
+from New_Eleusis import *
+from Player import *
+
+#Rules played when none are given on the command line
+DEFAULT_RULES = ["equal(color(current), R)",
+                 "equal(suit(previous), suit(current))",
+                 "or(equal(color(previous), R), equal(color(current), R))",
+                 "and(equal(color(previous), R), equal(color(current), B))"]
+
+NUMBER_OF_ADVERSARIES = 3
+#Rounds of a game, a round is one play of the player and of every adversary
+MAX_ROUNDS = 200
+#Attempts at dealing three starting cards that follow the rule
+DEAL_ATTEMPTS = 1000
+
+def deal_initial_cards(secret_rule):
+    '''
+     Returns three random cards that follow the rule, or the last three drawn if none did
+    '''
+    table = rule_table(secret_rule)
+    for attempt in xrange(DEAL_ATTEMPTS):
+        cards = [pick_random_card() for i in xrange(3)]
+        if table.evaluate(*encode_cards(cards)):
+            break
+    return cards
+
+def rules_agree(guessed_rule, secret_rule):
+    '''
+     Returns whether two rules accept exactly the same card triples
+    '''
+    if not isinstance(guessed_rule, Tree):
+        return False
+    return rule_fingerprint(guessed_rule) == rule_fingerprint(secret_rule)
+
+def play_game(secret_rule, seed, max_rounds=MAX_ROUNDS):
+    '''
+     Plays one game the way game.py does and returns its report: the rule guessed,
+     whether it agrees with rule(), the plays on the board when it was guessed and
+     the wall time of every turn of the scientist
+    '''
+    random.seed(seed)
+    session = GameSession()
+    setRule(secret_rule, session)
+    player = Player(session)
+    adversaries = [Adversary(session) for i in xrange(NUMBER_OF_ADVERSARIES)]
+    cards = deal_initial_cards(rule(session))
+
+    guessed_rule = None
+    turn_times = []
+    for round_num in xrange(max_rounds):
+        start_time = time.time()
+        outcome = player.play(cards if round_num == 0 else [])
+        turn_times.append(time.time() - start_time)
+        if isinstance(outcome, Tree):
+            guessed_rule = outcome
+            break
+        for adversary in adversaries:
+            adversary.play()
+
+    return {'rule': str(rule(session)),
+            'seed': seed,
+            'guessed_rule': str(guessed_rule) if guessed_rule is not None else None,
+            'solved': guessed_rule is not None,
+            'correct': rules_agree(guessed_rule, rule(session)),
+            'plays': session.play_counter,
+            'turns': len(turn_times),
+            'turn_time': sum(turn_times) / max(len(turn_times), 1),
+            'max_turn_time': max(turn_times) if turn_times else 0.0}
+
+def play_headless_game((secret_rule, seed, max_rounds)):
+    '''
+     Plays a game with stdout silenced, the solver prints every card
+    '''
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        return play_game(secret_rule, seed, max_rounds)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+def simulate(secret_rules, games_per_rule, processes=None, seed=0, max_rounds=MAX_ROUNDS):
+    '''
+     Plays games_per_rule games of every rule, a Tree or a rule string, and returns the
+     reports of all the games. Game i is seeded with seed + i. With processes=1 the
+     games are played in this process.
+    '''
+    jobs = []
+    for secret_rule in secret_rules:
+        for game in xrange(games_per_rule):
+            jobs.append((secret_rule, seed + len(jobs), max_rounds))
+    if processes == 1:
+        return map(play_headless_game, jobs)
+    pool = Pool(processes)
+    try:
+        return pool.map(play_headless_game, jobs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+def summarize(reports):
+    '''
+     Groups the reports by rule: games played, games solved and solved correctly,
+     mean plays to solve and mean wall time per turn of the scientist
+    '''
+    summary = {}
+    for report in reports:
+        row = summary.setdefault(report['rule'], {'games': 0, 'solved': 0, 'correct': 0,
+                                                  'plays_to_solve': [], 'turn_time': 0.0, 'turns': 0})
+        row['games'] += 1
+        row['turns'] += report['turns']
+        row['turn_time'] += report['turn_time'] * report['turns']
+        if report['solved']:
+            row['solved'] += 1
+            row['plays_to_solve'].append(report['plays'])
+        if report['correct']:
+            row['correct'] += 1
+    for row in summary.itervalues():
+        plays = row.pop('plays_to_solve')
+        row['plays_to_solve'] = float(sum(plays)) / len(plays) if plays else None
+        row['turn_time'] = row['turn_time'] / max(row['turns'], 1)
+    return summary
+
+def print_summary(summary, elapsed):
+    for secret_rule in sorted(summary):
+        row = summary[secret_rule]
+        plays = '%.1f' % row['plays_to_solve'] if row['plays_to_solve'] is not None else '-'
+        print secret_rule
+        print '    games %d  solved %d  correct %d  plays to solve %s  time per turn %.1f ms' % (
+            row['games'], row['solved'], row['correct'], plays, row['turn_time'] * 1000)
+    print 'Wall time %.2f s' % elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description='Plays headless games of New Eleusis against secret rules')
+    parser.add_argument('rules', nargs='*', default=DEFAULT_RULES, help='secret rules, in the syntax of parse')
+    parser.add_argument('--games', type=int, default=10, help='games per rule')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes, one per CPU by default')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first game')
+    parser.add_argument('--max-rounds', type=int, default=MAX_ROUNDS, help='rounds before a game is given up')
+    args = parser.parse_args()
+
+    start_time = time.time()
+    reports = simulate(args.rules, args.games, args.processes, args.seed, args.max_rounds)
+    print_summary(summarize(reports), time.time() - start_time)
+
+if __name__ == "__main__":main()
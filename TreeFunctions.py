@@ -6,7 +6,9 @@ import itertools
 from collections import OrderedDict
 from itertools import combinations
 import time
+import weakref
 from NewEleusisHelper import *
+from CardCodec import *
 
 def is_suit(s):
     """Test if parameter is one of Club, Diamond, Heart, Spade"""
@@ -39,25 +41,24 @@ def number_to_value(number):
 # -------------------- Important functions
 
 def suit(card):
-    """Returns the suit of a card"""
+    """Returns the suit of a card, given as a string or a card code"""
+    if isinstance(card, int):
+        return SUIT_NAMES[CARD_SUIT[card]]
     return card[-1]
 
 def color(card):
-    """Returns the color of a card"""
-    return {'C':'B', 'D':'R', 'H':'R', 'S':'B'}.get(suit(card))
+    """Returns the color of a card, given as a string or a card code"""
+    if isinstance(card, int):
+        return COLOR_NAMES[CARD_COLOR[card]]
+    return SUIT_COLORS.get(suit(card))
 
 def value(card):
     """Returns the numeric value of a card or card value as an integer 1..13"""
-    prefix = card[:len(card) - 1]
-    names = {'A':1, 'J':11, 'Q':12, 'K':13}
-    if prefix in names:
-        return names.get(prefix)
-    else:
-        return int(prefix)
+    return CARD_VALUE[encode_card(card)]
 
 def is_royal(card):
     """Tests if a card is royalty (Jack, Queen, or King)"""
-    return value(card) > 10
+    return CARD_ROYAL[encode_card(card)]
 
 def equal(a, b):
     """Tests if two suits, two colors, two cards, or two values are equal."""
@@ -90,8 +91,11 @@ def greater(a, b):
 
 def plus1(x):
     """Returns the next higher value, suit, or card in a suit;
-       must be one. If a color, returns the other color"""
-    if is_value(x):
+       must be one. If a color, returns the other color. A number,
+       as value returns, is incremented: past a King it equals no value"""
+    if isinstance(x, int):
+        return x + 1
+    elif is_value(x):
         assert value_to_number(x) < 13
         return number_to_value(value_to_number(x) + 1)
     elif is_suit(x):
@@ -104,8 +108,11 @@ def plus1(x):
     
 def minus1(x):
     """Returns the next lower value, suit, or card in a suit;
-       must be one. If a color, returns the other color"""
-    if is_value(x):
+       must be one. If a color, returns the other color. A number,
+       as value returns, is decremented: below an Ace it equals no value"""
+    if isinstance(x, int):
+        return x - 1
+    elif is_value(x):
         assert value_to_number(x) > 1
         return number_to_value(value_to_number(x) - 1)
     elif is_suit(x):
@@ -118,11 +125,11 @@ def minus1(x):
 
 def even(card):
     """Tells if the card's numeric value is even"""
-    return value(card) % 2 == 0
+    return CARD_PARITY[encode_card(card)] == 0
 
 def odd(card):
     """Tells if the card's numeric value is odd"""
-    return value(card) % 2 != 0
+    return CARD_PARITY[encode_card(card)] != 0
 
 # -------------------- Lists of allowable functions
 
@@ -136,6 +143,10 @@ def iff():  pass
 functions = [suit, color, value, is_royal, equal, less,
              greater, plus1, minus1, even, odd, andf,
              orf, notf, iff]
+function_set = frozenset(functions)
+
+# Functions that only look at a single card; they are given card codes
+card_functions = [suit, color, value, is_royal, even, odd]
 
 function_names = ['suit', 'color', 'value', 'is_royal',
                   'equal', 'equals', 'less', 'greater', 'plus1',
@@ -149,30 +160,46 @@ to_function = {'and':andf, 'or':orf, 'not':notf, 'if':iff, 'equals':equal, 'even
 for f in functions:
     to_function[f.__name__] = f
     
+# The names functions print with, and every name parse accepts
+printed_function_names = frozenset(f.__name__ for f in functions)
+parsed_function_names = frozenset(function_names)
+
 def quote_if_needed(s):
     """If s is not a function, quote it"""
-    function_names = map(lambda x: x.__name__, functions)
-    return s if s in function_names else "'" + s + "'"
+    return s if s in printed_function_names else "'" + s + "'"
+
+# A parenthesis or comma, or a run of other nonblank characters
+token_pattern = re.compile(r"[(),]|[^\s(),]+")
+
+# A function name with its open parenthesis, a parenthesis, or a run of
+# other nonblank characters; commas and whitespace act as delimiters
+name_token_pattern = re.compile(r"[^\s(),]+(?:\s*\()?|[()]")
+call_functions = dict((name + '(', to_function[name]) for name in function_names)
+
+def call_token_pattern():
+    """As name_token_pattern, but a call whose arguments are literals or
+       calls of literals, such as equal(color(previous), R), is one token"""
+    literal = r"[^\s(),]+"
+    argument = r"(?:{0}\s*\(\s*{0}\s*\)|{0})".format(literal)
+    call = r"{0}\s*\(\s*{1}(?:\s*,\s*{1}){{0,2}}\s*\)".format(literal, argument)
+    return re.compile(call + "|" + name_token_pattern.pattern)
+
+rule_token_pattern = call_token_pattern()
 
 def scan(s):
-    """This is an iterator for "tokens," where a token is a
-       parenthesis or sequence of nonblank characters; commas
-       and whitespace act as delimiters, and are discarded"""
-    token = ''
-    for ch in s:
-        if ch.isspace():
-            continue
-        if ch in '(),':
-            if token != '':
-                yield token
-                token = ''
-            if ch != ',':
-                yield ch
-        else:
-            token += ch
-    if token != '':
-        yield token
-            
+    """Returns the "tokens" of s, where a token is a parenthesis or
+       sequence of nonblank characters; commas and whitespace act as
+       delimiters, and are discarded"""
+    return [token for token in token_pattern.findall(s) if token != ',']
+
+class ParseError(ValueError):
+    """Raised by parse for a malformed rule, with the character position
+       of the offending token"""
+    def __init__(self, reason, position):
+        ValueError.__init__(self, "{} at position {}".format(reason, position))
+        self.reason = reason
+        self.position = position
+
 def tree(s):
     """Given a function in the usual "f(a, b)" notation, returns
        a Tree representation of that function, for example,
@@ -207,38 +234,226 @@ def combine(f, args):
     else:
         raise Exception("Incorrect arguments: {} {}".format(f, str(args)))
     
-def parse(s):
-    """Converts a string representation of a rule into a Tree"""
-    def parse2(s, i):
-        if s[i] in function_names:
-            f = to_function.get(s[i])
-            assert s[i + 1] == "(", "No open parenthesis after " + s[i]
-            (arg, i) = parse2(s, i + 2)
-            args = [arg]
-            while s[i] != ")":
-                (arg, i) = parse2(s, i)
-                args.append(arg)
-            subtree = combine(f, args)
-            return (subtree, i + 1)
+class LRUCache:
+    """A bounded least recently used cache of the values of a function of
+       one argument, which records its hits and misses"""
+
+    def __init__(self, function, maxsize):
+        self.function = function
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Returns function(key), computed on a miss"""
+        if key in self.entries:
+            self.hits += 1
+            # Move the entry to the most recently used end
+            value = self.entries.pop(key)
         else:
-            return (s[i], i + 1)
-    return parse2(list(scan(s)), 0)[0]
+            self.misses += 1
+            value = self.function(key)
+            if len(self.entries) >= self.maxsize:
+                self.entries.popitem(last=False)
+        self.entries[key] = value
+        return value
 
+    def stats(self):
+        """Returns the hits, misses and size of the cache"""
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries), 'maxsize': self.maxsize}
 
-class Tree:
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
 
-    def __init__(self, root, first=None, second=None, third=None):
-        """Create a new Tree; default is no children"""
-        self.root = root
-        assert root in functions
-        if third == None:
-            self.test = None
-            self.left = first
-            self.right = second
+# Rule strings whose Trees parse keeps
+PARSE_CACHE_SIZE = 4096
+
+def parse(s):
+    """Converts a string representation of a rule into a Tree, see parse_rule;
+       the Trees are cached in parse_cache"""
+    return parse_cache.get(s)
+
+def parse_rule(s):
+    """Converts a string representation of a rule into a Tree in one pass
+       over its tokens, raises ParseError if it is malformed"""
+    return parse_tokens(s, rule_token_pattern)
+
+# The Trees of the call tokens of rule_token_pattern; rules share many of
+# them, and a call drops out once no Tree uses it
+call_trees = weakref.WeakValueDictionary()
+# Its weak references by token, read without the Python level get
+call_refs = call_trees.data
+
+def parse_tokens(s, pattern):
+    """Converts s into a Tree in one pass over its tokens of a pattern,
+       rule_token_pattern or name_token_pattern"""
+    tokens = pattern.findall(s)
+    # (function, [arguments], token index) of the innermost open function
+    # call, and of the calls it is an argument of
+    call = None
+    calls = []
+    for (index, token) in enumerate(tokens):
+        if token == ')':
+            if call is None:
+                raise token_error(s, pattern, index, "Unmatched )")
+            (f, args, start) = call
+            if not 1 <= len(args) <= 3:
+                raise token_error(s, pattern, start, "Incorrect arguments to " + f.__name__)
+            expr = Tree(f, *args)
+            call = calls.pop() if calls else None
+        elif token[-1] == ')':
+            ref = call_refs.get(token)
+            expr = None if ref is None else ref()
+            if expr is None:
+                expr = parse_call(s, token, index)
+        elif token[-1] == '(':
+            f = call_functions.get(token) or call_function(s, pattern, tokens, index)
+            if call is not None:
+                calls.append(call)
+            # A call opened by a lone parenthesis starts at the function before it
+            call = (f, [], index - (token == '('))
+            continue
+        elif token in parsed_function_names:
+            if tokens[index + 1:index + 2] == ['(']:
+                # The call opens at the parenthesis, see call_function
+                continue
+            if index + 1 == len(tokens):
+                raise token_error(s, pattern, index, "Unmatched (")
+            raise token_error(s, pattern, index + 1, "No open parenthesis after " + to_function[token].__name__)
+        else:
+            expr = token
+        if call is not None:
+            call[1].append(expr)
+        elif index + 1 < len(tokens):
+            raise trailing_error(s, pattern, tokens, index + 1)
+        else:
+            return expr
+    if call is not None:
+        raise token_error(s, pattern, call[2], "Unmatched (")
+    raise ParseError("Empty rule", len(s))
+
+def parse_call(s, token, index):
+    """Returns the Tree of a call token at an index of the tokens of s
+       and keeps it in call_trees"""
+    try:
+        expr = parse_tokens(token, name_token_pattern)
+    except ParseError as error:
+        raise ParseError(error.reason, token_position(s, rule_token_pattern, index) + error.position)
+    call_trees[token] = expr
+    return expr
+
+def token_name(token):
+    """Returns the function name of a call token, other tokens as they are"""
+    return token if token in '()' else token.split('(', 1)[0].rstrip()
+
+def trailing_error(s, pattern, tokens, index):
+    """Returns the ParseError of a token at an index after the end of the rule"""
+    if tokens[index] == '(':
+        call_function(s, pattern, tokens, index)
+    return token_error(s, pattern, index, "Unexpected " + token_name(tokens[index]) + " after the rule")
+
+def token_position(s, pattern, index):
+    """Returns the position of the token at an index of the tokens of s"""
+    return [match.start() for match in pattern.finditer(s)][index]
+
+def token_error(s, pattern, index, reason):
+    """Returns the ParseError of the token at an index of the tokens of s"""
+    return ParseError(reason, token_position(s, pattern, index))
+
+def call_function(s, pattern, tokens, index):
+    """Returns the function of a call token spaced from its parenthesis,
+       raises ParseError for an unknown one"""
+    name = token_name(tokens[index])
+    if name in parsed_function_names:
+        return to_function[name]
+    if name != '(':
+        raise token_error(s, pattern, index, "Unknown function " + name)
+    # A parenthesis after a comma opens the call of the function before it,
+    # and was meant to open one after a literal
+    if index > 0 and tokens[index - 1] in parsed_function_names:
+        return to_function[tokens[index - 1]]
+    if index > 0 and tokens[index - 1][-1] not in '()':
+        raise token_error(s, pattern, index - 1, "Unknown function " + tokens[index - 1])
+    raise token_error(s, pattern, index, "Unexpected (")
+
+parse_cache = LRUCache(parse_rule, PARSE_CACHE_SIZE)
+
+def tree_key(expr):
+    """Returns the key of a Tree child in the intern table: the id of a
+       Tree, which the Trees interned on it keep alive, a string or None
+       as it is, and other literals with their type so that True and 1,
+       or u'R' and 'R', differ"""
+    kind = type(expr)
+    if kind is Tree:
+        return id(expr)
+    if kind is str or expr is None:
+        return expr
+    return (kind, expr)
+
+# Every distinct Tree is built once; Trees no longer referenced drop out
+interned_trees = weakref.WeakValueDictionary()
+# Its weak references by key, read without the Python level get
+interned_refs = interned_trees.data
+
+class Tree(object):
+    """An immutable, hash-consed expression tree. Building a Tree that
+       already exists returns the existing object, so structurally equal
+       rules are the same dict key and share their compiled function
+       and RuleTable"""
+
+    __slots__ = ('root', 'test', 'left', 'right', 'hash', 'compiled', 'table', '__weakref__')
+    mutable = ('compiled', 'table')
+
+    def __new__(cls, root, first=None, second=None, third=None):
+        """Create a new Tree, or return the interned one; default is no children"""
+        assert root in function_set
+        if third is None:
+            (test, left, right) = (None, first, second)
         else: # rearrange parameters so test can be put first
-            self.test = first
-            self.left = second
-            self.right = third
+            (test, left, right) = (first, second, third)
+        # tree_key, inlined for the usual children
+        key = (root, test if test is None else tree_key(test),
+               id(left) if type(left) is Tree else tree_key(left),
+               right if right is None else id(right) if type(right) is Tree else tree_key(right))
+        ref = interned_refs.get(key)
+        self = None if ref is None else ref()
+        if self is None:
+            self = object.__new__(cls)
+            for (name, value) in [('root', root), ('test', test), ('left', left), ('right', right),
+                                  ('hash', hash((root.__name__, test, left, right))),
+                                  ('compiled', None), ('table', None)]:
+                object.__setattr__(self, name, value)
+            interned_trees[key] = self
+        return self
+
+    def __setattr__(self, name, value):
+        if name not in Tree.mutable:
+            raise AttributeError("Tree is immutable, cannot set " + name)
+        object.__setattr__(self, name, value)
+
+    def __reduce__(self):
+        """Unpickled Trees are interned again"""
+        if self.test is None:
+            return (Tree, (self.root, self.left, self.right))
+        return (Tree, (self.root, self.test, self.left, self.right))
+
+    def __hash__(self):
+        return self.hash
+
+    def __eq__(self, other):
+        """Interned Trees are equal exactly when they are the same object"""
+        if self is other:
+            return True
+        if not isinstance(other, Tree) or self.hash != other.hash:
+            return False
+        return (self.root == other.root and tree_key(self.test) == tree_key(other.test) and
+                tree_key(self.left) == tree_key(other.left) and tree_key(self.right) == tree_key(other.right))
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
 
     def __str__(self):
         """Provide a printable representation of this Tree"""
@@ -271,18 +486,32 @@ class Tree:
 ##        if self.debugging: print "Tree: ", before, "-->", after
 ##        return after
     
+    def constraints(self):
+        """Returns the characteristic constraints of this rule, see
+           tree_constraints"""
+        return tree_constraints(self)
+
+    def compile(self):
+        """Returns a function f(previous2, previous, current) of card
+           codes that computes what evaluate computes, with the dispatch
+           on this tree resolved once; the function is cached"""
+        if self.compiled is None:
+            self.compiled = compile_tree(self)
+        return self.compiled
+
     def evaluate(self, cards):
-        """Evaluate this tree with the given card values"""
+        """Evaluate this tree with the given card values; the cards
+           may be strings or card codes (see CardCodec)"""
         def subeval(expr):
             if expr.__class__.__name__ == "Tree":
                 return expr.evaluate(cards)
             else:
                 if expr == "current":
-                    return current
+                    return position(current)
                 elif expr == "previous":
-                    return previous
+                    return position(previous)
                 elif expr == "previous2":
-                    return previous2
+                    return position(previous2)
                 else:
                     return expr
         try:
@@ -290,6 +519,13 @@ class Tree:
             f = self.root
             if f not in functions:
                 return f
+
+            # Card functions read the code tables, everything else
+            # compares cards by name
+            if f in card_functions:
+                position = encode_card
+            else:
+                position = decode_card
             
             if f in [suit, color, value, is_royal, minus1, plus1, even, odd]:
                 return f(subeval(self.left))
@@ -321,8 +557,180 @@ class Tree:
             print " with cards =", cards
             raise
 
+# ----- Compiling Trees into functions of card codes
+
+positions = ('previous2', 'previous', 'current')
+
+# The value of each card function for each of the 52 card codes
+card_function_tables = {}
+for f in card_functions:
+    card_function_tables[f] = [f(code) for code in xrange(NUMBER_OF_CARDS)]
+
+def tree_positions(expr):
+    """Returns the set of card positions an expression refers to"""
+    if isinstance(expr, Tree):
+        used = set()
+        for child in (expr.test, expr.left, expr.right):
+            used |= tree_positions(child)
+        return used
+    if expr in positions:
+        return set([expr])
+    return set()
+
+def literal_characteristic(f, literal):
+    """Returns the characteristic id of a card function equal to a literal,
+       such as 14 for color and R, None if there is none"""
+    name = str(literal).strip("'")
+    if f == color:
+        return COLOR_CHARACTERISTIC.get(name)
+    elif f == suit:
+        return SUIT_CHARACTERISTIC.get(name)
+    elif f == value and is_value(name):
+        number = int(name) if name.isdigit() else value_to_number(name)
+        return number if 1 <= number <= 13 else None
+    return None
+
+def tree_constraints(expr, positive=True):
+    """Returns the characteristic constraints of an expression as a list
+       of (position, characteristic id, polarity), in the order they occur:
+       equal(color(current), R) gives ('current', 14, True) and
+       not(is_royal(previous)) gives ('previous', 22, False). Polarity
+       flips under not; the test of an iff holds either way, so its
+       constraints are given with both polarities. Comparisons between
+       cards, and orderings such as less, have no single characteristic
+       and give nothing"""
+    if not isinstance(expr, Tree):
+        return []
+    f = expr.root
+    if f in (andf, orf, iff):
+        constraints = []
+        if expr.test is not None:
+            constraints += tree_constraints(expr.test, True) + tree_constraints(expr.test, False)
+        return constraints + tree_constraints(expr.left, positive) + tree_constraints(expr.right, positive)
+    elif f == notf:
+        return tree_constraints(expr.left, not positive)
+    elif f in (even, odd, is_royal) and expr.left in positions:
+        return [(expr.left, {even: 20, odd: 21, is_royal: 22}[f], positive)]
+    elif f == equal:
+        for (function_side, literal) in [(expr.left, expr.right), (expr.right, expr.left)]:
+            if (isinstance(function_side, Tree) and function_side.root in card_functions and
+                    function_side.left in positions and not isinstance(literal, Tree)):
+                characteristic = literal_characteristic(function_side.root, literal)
+                if characteristic is not None:
+                    return [(function_side.left, characteristic, positive)]
+    return []
+
+def tree_size(expr, sizes=None):
+    """Returns the number of nodes of an expression. Interned subtrees are
+       shared, sizes can keep the size of every Tree already counted"""
+    if not isinstance(expr, Tree):
+        return 0 if expr is None else 1
+    if sizes is None:
+        sizes = {}
+    if expr not in sizes:
+        sizes[expr] = 1 + tree_size(expr.test, sizes) + tree_size(expr.left, sizes) + tree_size(expr.right, sizes)
+    return sizes[expr]
+
+def select_position(position, table):
+    """Returns a function of (previous2, previous, current) that looks
+       up the card at the given position in a table of 52 entries"""
+    if position == 'current':
+        return lambda previous2, previous, current: table[current]
+    elif position == 'previous':
+        return lambda previous2, previous, current: table[previous]
+    else:
+        return lambda previous2, previous, current: table[previous2]
+
+def tabulate_tree(expr):
+    """If an expression depends on at most one card position, returns
+       a function that reads its precomputed result from a table,
+       otherwise returns None"""
+    used = tree_positions(expr)
+    if len(used) > 1:
+        return None
+    function = compile_expression(expr, False)
+    try:
+        if not used:
+            result = function(None, None, None)
+            return lambda previous2, previous, current: result
+        position = used.pop()
+        index = positions.index(position)
+        table = []
+        for code in xrange(NUMBER_OF_CARDS):
+            cards = [None, None, None]
+            cards[index] = code
+            table.append(function(*cards))
+    except Exception:
+        # e.g. plus1 of a King, leave it to fail at evaluation time
+        return None
+    return select_position(position, table)
+
+def compile_expression(expr, tabulate=True):
+    """Compiles a Tree or a leaf into a function of card codes"""
+    if not isinstance(expr, Tree):
+        if expr in positions:
+            return select_position(expr, CARD_NAMES)
+        return lambda previous2, previous, current: expr
+
+    if tabulate:
+        function = tabulate_tree(expr)
+        if function is not None:
+            return function
+
+    f = expr.root
+    if f in card_functions and expr.left in positions:
+        return select_position(expr.left, card_function_tables[f])
+
+    if f in [suit, color, value, is_royal, minus1, plus1, even, odd]:
+        left = compile_expression(expr.left, tabulate)
+        return lambda previous2, previous, current: f(left(previous2, previous, current))
+
+    elif f in [equal, less, greater]:
+        left = compile_expression(expr.left, tabulate)
+        right = compile_expression(expr.right, tabulate)
+        return lambda previous2, previous, current: f(left(previous2, previous, current),
+                                                      right(previous2, previous, current))
+
+    elif f == andf:
+        left = compile_expression(expr.left, tabulate)
+        right = compile_expression(expr.right, tabulate)
+        return lambda previous2, previous, current: (right(previous2, previous, current)
+                                                     if left(previous2, previous, current) else False)
+
+    elif f == orf:
+        left = compile_expression(expr.left, tabulate)
+        right = compile_expression(expr.right, tabulate)
+        return lambda previous2, previous, current: (True if left(previous2, previous, current)
+                                                     else right(previous2, previous, current))
+
+    elif f == notf:
+        left = compile_expression(expr.left, tabulate)
+        return lambda previous2, previous, current: not left(previous2, previous, current)
+
+    elif f == iff:
+        test = compile_expression(expr.test, tabulate)
+        left = compile_expression(expr.left, tabulate)
+        right = compile_expression(expr.right, tabulate)
+        return lambda previous2, previous, current: (left(previous2, previous, current)
+                                                     if test(previous2, previous, current)
+                                                     else right(previous2, previous, current))
+
+def compile_tree(tree):
+    """Compiles a Tree into a function f(previous2, previous, current)
+       of card codes, see Tree.compile"""
+    return compile_expression(tree)
+
+# Hypothesis strings whose Trees tree_transform keeps
+TRANSFORM_CACHE_SIZE = 1024
+
+# The top hypotheses stay the same for many turns; keeping their Trees
+# alive also keeps their compiled functions and RuleTables
+transform_cache = LRUCache(lambda hypothesis: parse(tree_transform_string(hypothesis)), TRANSFORM_CACHE_SIZE)
+
 def tree_transform(hypothesis):
-    return parse(tree_transform_string(hypothesis))
+    """Converts a hypothesis string into a Tree, see tree_transform_string;
+       the Trees are cached in transform_cache"""
+    return transform_cache.get(str(hypothesis))
 
 
 def map_characteristic_value_to_characteristic_property(characteristic_value):
@@ -333,6 +741,15 @@ def map_characteristic_value_to_characteristic_property(characteristic_value):
     return characteristic_value_to_characteristic_property_dict[characteristic_value]    
 
 
+#The rules of the relational characteristics, between the (later, earlier) positions of
+#CardCodec.RELATED_POSITIONS
+RELATION_TEMPLATES = {'C24': 'equal(suit({0}),suit({1}))', 'C25': 'notf(equal(suit({0}),suit({1})))',
+                      'C26': 'equal(color({0}),color({1}))', 'C27': 'notf(equal(color({0}),color({1})))',
+                      'C28': 'equal(even({0}),even({1}))', 'C29': 'notf(equal(even({0}),even({1})))',
+                      'C30': 'greater(value({0}),value({1}))', 'C31': 'less(value({0}),value({1}))',
+                      'C32': 'equal(value({0}),value({1}))', 'C33': 'equal(is_royal({0}),is_royal({1}))',
+                      'C34': 'notf(equal(is_royal({0}),is_royal({1})))'}
+
 def tree_transform_string(hypothesis):
 
     triple_tree_characteristic_list = ['R', 'B', 'S', 'C', 'H', 'D', '1', '2', '3', '4', '5', '6', '7', '8', '9', '10', '11', '12', '13']
@@ -352,7 +769,9 @@ def tree_transform_string(hypothesis):
             characteristic_index = pattern.match(transformed_hypothesis_string).group(3)
 
             characteristic_value = map_card_characteristic_to_value(characteristic_index)
-            if characteristic_value in triple_tree_characteristic_list:
+            if characteristic_index in RELATION_TEMPLATES:
+                transformed_hypothesis = RELATION_TEMPLATES[characteristic_index].format(*RELATED_POSITIONS[position_index])
+            elif characteristic_value in triple_tree_characteristic_list:
                 characteristic_property = map_characteristic_value_to_characteristic_property(characteristic_value)
                 transformed_hypothesis = str(characteristic_property) + '(' + str(position_index) + ')'
             else:
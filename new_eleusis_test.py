@@ -1,6 +1,21 @@
 
 import unittest
 from New_Eleusis import *
+from BatchEvaluator import *
+from ScanRank import hypothesis_string, collapse_equivalent_rules, map_numeric, scan_and_rank_numeric_hypothesis
+from HypothesisIndex import HypothesisIndex
+from HypothesisRanking import HypothesisRanking
+from HypothesisTensor import CountTensor, hypothesis_scores, rank_hypothesis_scores, HypothesisScanner, SHAPE_WEIGHTS
+from Simulator import simulate, rules_agree
+from Benchmark import make_board, board_session, scan_board, BOARD_RULE
+from Board import Board, window_array
+from HypothesisRankParams import HypothesisRankParams
+from CardSelection import pick_informative_card, card_information, split_entropy
+from CharacteristicIndex import flags_to_bits
+from NumericConstraints import NumericConstraints
+from NumericMiner import numeric_relation_scores, window_relations
+from ExceptionMiner import triple_counts, new_windows, RuleExceptions, ID_BASE
+from Exception_Hypothesis import Exception_Hypothesis
 
 class TestNewEleusis(unittest.TestCase):
 
@@ -259,5 +274,465 @@ class TestNewEleusis(unittest.TestCase):
                          str(parse("equal(color(previous), R)")))
         self.assertEqual(repr(Tree(equal, Tree(color, 'previous'), 'R')),
                          repr(parse("equal(color(previous), R)")))
+        rule = "or(and(equal(color(previous), R), not(is_royal(current))), less(value(current), value(previous)))"
+        self.assertTrue(parse_rule(rule) is parse_rule(rule.replace(', ', ' ,')))
+        self.assertTrue(parse_rule(str(parse_rule(rule))) is parse_rule(rule))
+        self.assertTrue(parse_rule("not(equal(color(previous), R))").left is parse_rule(rule).left.left)
+        self.assertEqual("R", parse_rule("R"))
+
+    def test_tree_constraints(self):
+        self.assertEqual([('current', 14, True)], parse("equal(color(current), R)").constraints())
+        self.assertEqual([('previous', 17, True), ('previous', 17, False), ('current', 20, False), ('current', 12, True)],
+                         parse("iff(equal(suit(previous), H), not(even(current)), equal(value(current), Q))").constraints())
+        self.assertEqual([('previous2', 22, True), ('current', 15, False)],
+                         parse("or(is_royal(previous2), not(equal(B, color(current))))").constraints())
+        self.assertEqual([], parse("and(equal(suit(previous), suit(current)), less(value(current), 5))").constraints())
+
+    def test_parse_errors(self):
+        for (rule, reason, position) in [("equal(color(previous) R", "Unmatched (", 0),
+                                         ("and(is_royal(current), equal(colour(previous), R))", "Unknown function colour", 29),
+                                         ("equal(color previous), R)", "No open parenthesis after color", 12),
+                                         ("or(odd(current), even(previous)) R", "Unexpected R after the rule", 33),
+                                         ("not(odd(current), even(previous), R, B)", "Incorrect arguments to notf", 0),
+                                         ("and(equal(color, R), odd(current))", "No open parenthesis after color", 17),
+                                         ("odd(current))", "Unexpected ) after the rule", 12), ("", "Empty rule", 0)]:
+            with self.assertRaises(ParseError) as context:
+                parse(rule)
+            self.assertEqual((reason, position), (context.exception.reason, context.exception.position))
+
+    def test_card_codes(self):
+        for card in ["AS", "2C", "10D", "JH", "QD", "KC"]:
+            code = encode_card(card)
+            self.assertEqual(card, decode_card(code))
+            self.assertEqual(value(card), value(code))
+            self.assertEqual(suit(card), suit(code))
+            self.assertEqual(color(card), color(code))
+            self.assertEqual(is_royal(card), is_royal(code))
+            self.assertEqual(even(card), even(code))
+        self.assertEqual(encode_card("AH"), encode_card("1H"))
+        self.assertEqual(52, len(set(CARD_CODES.values())))
+
+    def test_card_characteristics(self):
+        self.assertEqual(('C10', 'C14', 'C16', 'C20', 'C23'),
+                         get_card_mapping_characterstic("10D"))
+        self.assertEqual(('C1', 'C15', 'C18', 'C21', 'C22'),
+                         get_card_mapping_characterstic(encode_card("AS")))
+        code = encode_card("QH")
+        self.assertTrue(has_characteristic(code, 'C12'))
+        self.assertTrue(has_characteristic(code, 17))
+        self.assertFalse(has_characteristic(code, 'C15'))
+
+    def test_get_card_from_characterstic(self):
+        #A hypothesis on diamonds and hearts is tested with a card of neither suit
+        self.assertEqual('3S', get_card_from_characterstic('', '', ['2H', '3S', '4D'], {'suite': 'D,H'}))
+        self.assertEqual('5C', get_card_from_characterstic('', '', ['2H', '3S', '4D', '5C'], {'suite': 'D,H,S'}))
+
+    def test_evaluate_card_codes(self):
+        p = parse("""iff(equal(suit(previous), suit(previous2)),
+                     is_royal(current),
+                     not(is_royal(current)))""")
+        for cards in [("3D", "7S", "AC"), ("4H", "5H", "KH"), ("5H", "5D", "QC")]:
+            self.assertEqual(p.evaluate(cards), p.evaluate(tuple(encode_cards(cards))))
+        p = parse("less(previous, current)")
+        self.assertTrue(p.evaluate(tuple(encode_cards(("2C", "3C", "10C")))))
+
+    def test_compile(self):
+        rules = [parse("or(equal(color(previous), R), equal(color(current), R))"),
+                 parse("iff(equal(color(previous), B), equal(color(current), R), True)"),
+                 parse("""iff(equal(suit(previous), suit(previous2)),
+                          is_royal(current), not(is_royal(current)))"""),
+                 parse("greater(value(current), value(previous))"),
+                 parse("less(previous, current)"),
+                 Tree(andf, Tree(odd, "current"), Tree(even, "previous"), Tree(is_royal, "previous2"))]
+        for rule in rules:
+            compiled = rule.compile()
+            self.assertTrue(compiled is rule.compile())
+            for previous2 in xrange(0, 52, 5):
+                for previous in xrange(0, 52, 3):
+                    for current in xrange(52):
+                        cards = (previous2, previous, current)
+                        self.assertEqual(rule.evaluate(cards), compiled(*cards))
+
+    def test_rule_table(self):
+        red_previous = parse("equal(color(previous), R)")
+        royal_previous2 = parse("is_royal(previous2)")
+        odd_current = parse("odd(current)")
+        self.assertEqual(2, rule_table(red_previous).arity)
+        self.assertEqual(3, rule_table(royal_previous2).arity)
+        combined = rule_table(red_previous) & ~rule_table(odd_current) | rule_table(royal_previous2)
+        rule = Tree(orf, Tree(andf, red_previous, Tree(notf, odd_current)), royal_previous2)
+        cards = encode_cards(["KD", "3H", "4S", "QC", "5H", "6C", "JH", "2D", "7S", "10H"])
+        for i in xrange(2, len(cards)):
+            window = (cards[i-2], cards[i-1], cards[i])
+            self.assertEqual(bool(rule.evaluate(window)), combined.evaluate(*window))
+            self.assertEqual(bool(rule.evaluate(window)), rule_table(rule).evaluate(*window))
+        holds = sum(1 for i in xrange(2, len(cards))
+                    if rule.evaluate((cards[i-2], cards[i-1], cards[i])))
+        self.assertEqual(holds, combined.count(WindowTable(cards)))
+        #plus1 of a King and minus1 of an Ace have no card, the rule rejects those windows
+        following = rule_table(parse("equal(current, plus1(previous))"))
+        self.assertTrue(following.evaluate(None, encode_card("5S"), encode_card("6S")))
+        self.assertFalse(following.evaluate(None, encode_card("KS"), encode_card("AS")))
+        preceding = rule_table(parse("equal(current, minus1(previous))"))
+        self.assertFalse(preceding.evaluate(None, encode_card("AS"), encode_card("KS")))
+        self.assertTrue(preceding.evaluate(None, encode_card("2S"), encode_card("AS")))
+
+    def test_evaluate_batch(self):
+        rules = [parse("less(previous, current)"),
+                 parse("iff(equal(suit(previous), suit(previous2)), is_royal(current), not(is_royal(current)))"),
+                 parse("or(equal(value(current), 10), equal(color(previous), B))")]
+        cards = encode_cards(["KD", "3H", "4S", "QC", "5H", "6C", "JH", "2D", "7S", "10H", "10D"])
+        matrix = evaluate_rules(rules, BoardColumns(cards))
+        self.assertEqual((3, len(cards) - 2), matrix.shape)
+        for rule, row in zip(rules, matrix):
+            expected = [bool(rule.evaluate((cards[i-2], cards[i-1], cards[i]))) for i in xrange(2, len(cards))]
+            self.assertEqual(expected, list(row))
+
+    def test_tree_interning(self):
+        rule = "iff(equal(suit(previous), suit(previous2)), is_royal(current), not(is_royal(current)))"
+        first = parse(rule)
+        self.assertTrue(first is parse(rule))
+        self.assertEqual(first, Tree(iff, first.test, first.left, first.right))
+        self.assertTrue(first.left is first.right.left)
+        self.assertEqual({first: 2}[parse(rule)], 2)
+        self.assertNotEqual(Tree(equal, 'x', True), Tree(equal, 'x', 'True'))
+        self.assertRaises(AttributeError, setattr, first, 'left', 'current')
+
+    def test_hypothesis_string(self):
+        self.assertEqual("and(current='C3',previous='C14')", hypothesis_string((1, None, 14, 3)))
+        self.assertEqual("or(current='C3',previous='C14',previous2='C22')", hypothesis_string((2, 22, 14, 3)))
+        self.assertEqual("and(current='C3',or(previous='C14',previous2='C22'))", hypothesis_string((5, 22, 14, 3)))
+        self.assertEqual("or(previous2='C22',and(current='C3',previous='C14'))", hypothesis_string((8, 22, 14, 3)))
+
+    def test_hypothesis_scores(self):
+        cards = encode_cards(["KD", "3H", "4S", "QC", "5H", "6C", "JH", "2D"])
+        windows = [cards[i-2:i+1] for i in xrange(2, len(cards))]
+        illegal = encode_cards(["4S", "QC", "KH"])
+        scores = hypothesis_scores(CountTensor(3, windows), CountTensor(3, [illegal]), range(2, 10))
+        # KD 3H 4S: red previous2 (C14) and odd previous (C21) and black current (C15)
+        self.assertAlmostEqual((0.5 + 0.05 + 0.5)/3, scores[(3, 14, 21, 15)])
+        # or(current='C22',and(previous='C15',previous2='C14')) also allows the illegal KH
+        held = sum(1 for (previous2, previous, current) in windows
+                   if has_characteristic(current, 22) or (has_characteristic(previous, 15) and has_characteristic(previous2, 14)))
+        self.assertAlmostEqual(0.77 * (held - 1), scores[(4, 14, 15, 22)])
+
+    def test_relation_characteristics(self):
+        self.assertEqual((24, 26, 28, 30, 33), CARD_RELATION_IDS[encode_card("5H")][encode_card("3H")])
+        self.assertEqual((25, 27, 28, 32, 33), CARD_RELATION_IDS[encode_card("5S")][encode_card("5D")])
+        self.assertEqual(parse("or(not(equal(color(current), color(previous))), equal(color(previous), R))"),
+                         tree_transform(hypothesis_string((0, None, 14, 27))))
+        self.assertEqual(parse("and(less(value(current), value(previous)), or(equal(suit(previous), suit(previous2)), equal(suit(current), suit(previous2))))"),
+                         tree_transform(hypothesis_string((5, 24, 24, 31))))
+
+        cards = encode_cards(["KD", "3H", "4S", "QC", "5H", "6C", "JH", "2D", "2S", "9S"])
+        windows = [cards[i-2:i+1] for i in xrange(2, len(cards))]
+        illegal = [encode_cards(["2S", "9S", "KH"]), encode_cards(["9S", "KD", "QH"])]
+        legal_tensor = CountTensor(3)
+        for window in windows:
+            legal_tensor.add_window(window)
+        self.assertTrue((CountTensor(3, windows).counts == legal_tensor.counts).all())
+        scores = hypothesis_scores(legal_tensor, CountTensor(3, illegal), range(2, 10))
+        #The nested shapes, whose rules have two argument connectives, without the royal characteristics that count aces
+        relational = sorted(hypothesis for hypothesis in scores if max(hypothesis[1:]) > NUMBER_OF_CHARACTERISTICS
+                            and hypothesis[0] >= 4 and not set(hypothesis[1:]) & set([22, 23]))
+        self.assertTrue((5, 25, 25, 31) in relational)
+        for hypothesis in relational[::20]:
+            function = tree_transform(hypothesis_string(hypothesis)).compile()
+            held = len([window for window in windows if function(*window)]) - len([window for window in illegal if function(*window)])
+            weight = np.broadcast_to(SHAPE_WEIGHTS[hypothesis[0]], legal_tensor.counts.shape)[tuple(i - 1 for i in hypothesis[1:])]
+            self.assertAlmostEqual(weight * held, scores[hypothesis])
+
+    def test_hypothesis_scanner(self):
+        scanner = HypothesisScanner()
+        for card in ["KD", "3H", "4S", "QC", "5H", "6C", "JH", "2D"]:
+            scanner.observe_legal(card)
+        scanner.observe_illegal("KH")
+        cards = encode_cards(["KD", "3H", "4S", "QC", "5H", "6C", "JH", "2D"])
+        windows = [cards[i-2:i+1] for i in xrange(2, len(cards))]
+        scores = hypothesis_scores(CountTensor(3, windows), CountTensor(3, [encode_cards(["JH", "2D", "KH"])]), range(2, 10))
+        scores.update(hypothesis_scores(CountTensor(2, [window[1:] for window in windows]),
+                                        CountTensor(2, [encode_cards(["2D", "KH"])]), range(0, 2)))
+        expected = rank_hypothesis_scores(scores)
+        self.assertEqual(list(expected), scanner.ranked().keys())
+        self.assertEqual([key for key, value in expected.top(5)], scanner.ranked(5).keys())
+
+    def test_hypothesis_index(self):
+        scores = {}
+        index = HypothesisIndex(scores, capacity=10)
+        for i in xrange(1, 12):
+            hypothesis = (1, None, 14, i)
+            scores[hypothesis] = i
+            index.add(hypothesis)
+            index.add(hypothesis)
+        # Past 10 hypotheses the lowest scoring one and 10% of the capacity are dropped
+        self.assertEqual(9, len(index))
+        self.assertFalse((1, None, 14, 2) in index)
+        self.assertFalse((1, None, 14, 2) in scores)
+        self.assertEqual(set([(1, None, 14, 3)]), index.hypotheses(2, 3))
+        self.assertEqual(9, len(index.hypotheses(1, 14)))
+
+    def test_hypothesis_ranking(self):
+        ranking = HypothesisRanking([('a', 1), ('b', 3), ('c', 2)])
+        self.assertEqual([('b', 3), ('c', 2)], ranking.top(2))
+        ranking['a'] = 3
+        ranking.increment(['c'], 2)
+        del ranking['b']
+        ranking['d'] = 4
+        # Ties go to the larger key, as in sorted(..., reverse=True)
+        self.assertEqual([('d', 4), ('c', 4), ('a', 3)], ranking.top(5))
+        self.assertEqual(['d', 'c', 'a'], list(ranking))
+        self.assertEqual(3, len(ranking))
+
+    def test_game_session(self):
+        red = GameSession(parse("equal(color(current), R)"))
+        black = GameSession()
+        setRule("equal(color(current), B)", black)
+        for card in ["2H", "3D", "4H", "5D", "KH", "QS"]:
+            play_card(card, red)
+            play_card(card, black)
+        self.assertEqual(['2H', '3D', '4H', '5D', 'KH'], parse_board_state(red)['legal_cards'])
+        self.assertEqual(['2H', '3D', '4H', '5D', 'QS'], parse_board_state(black)['legal_cards'])
+        self.assertEqual(6, get_play_counter(red))
+        self.assertTrue(scan_and_rank_hypothesis(True, red))
+        self.assertEqual(None, black.hypothesis_dict)
+        self.assertFalse(default_session is red or default_session is black)
+
+    def test_simulator(self):
+        self.assertTrue(rules_agree(parse("or(equal(color(current), R), equal(color(current), B))"), parse("equal(True, True)")))
+        self.assertFalse(rules_agree(parse("equal(color(current), R)"), parse("equal(color(current), B)")))
+        first = simulate(["equal(color(current), R)"], 2, processes=1, seed=7, max_rounds=20)
+        second = simulate(["equal(color(current), R)"], 2, processes=1, seed=7, max_rounds=20)
+        for report in first + second:
+            self.assertTrue(report['plays'] > 20)
+            del report['turn_time'], report['max_turn_time']
+        self.assertEqual(first, second)
+        self.assertNotEqual(first[0], first[1])
+
+    def test_benchmark_board(self):
+        board = make_board(100, 0.5, seed=3)
+        self.assertEqual(board, make_board(100, 0.5, seed=3))
+        self.assertEqual(100, len(board))
+        self.assertTrue(sum(len(illegal_cards) for card, illegal_cards in board) > 30)
+        table = rule_table(parse(BOARD_RULE))
+        legal_cards = encode_cards([card for card, illegal_cards in board])
+        for i in xrange(2, len(legal_cards)):
+            self.assertTrue(table.evaluate(*legal_cards[i-2:i+1]))
+        self.assertEqual([], make_board(20, 0.0)[5][1])
+
+    def test_board(self):
+        board = Board([('10S', []), ('3H', []), ('6C', ['KS', '9C'])])
+        legal_cards = board.legal_cards
+        update_board_state(board, True, '6H')
+        update_board_state(board, False, 'AS')
+        self.assertEqual([('10S', []), ('3H', []), ('6C', ['KS', '9C']), ('6H', ['AS'])], board)
+        self.assertTrue(legal_cards is board.legal_cards)
+        self.assertEqual(['10S', '3H', '6C', '6H'], legal_cards)
+        self.assertEqual(encode_cards(legal_cards), board.legal_codes)
+        self.assertEqual([('3H', '6C', 'KS'), ('6C', 'KS'), ('3H', '6C', '9C'), ('6C', '9C'),
+                          ('6C', '6H', 'AS'), ('6H', 'AS')], board.illegal_tuples)
+        self.assertEqual([tuple(encode_cards(elem)) for elem in board.illegal_tuples], board.illegal_codes)
+        self.assertEqual('AS', board.last_card())
+        self.assertEqual(3, board.illegal_plays())
+        self.assertEqual(7, board.version)
+        self.assertEqual(4, board.cached('legal', lambda board: len(board.legal_cards)))
+        board.play('7D', True)
+        self.assertEqual(5, board.cached('legal', lambda board: len(board.legal_cards)))
+
+    def test_characteristic_index(self):
+        board = Board(make_board(60, 0.3, seed=5))
+        index = board.characteristics
+        codes = board.legal_codes
+        windows = [codes[i-2:i+1] for i in xrange(2, len(codes))]
+        def count(tuples, characteristics):
+            return len([elem for elem in tuples if all(characteristic is None or
+                        characteristic in CARD_CHARACTERISTIC_IDS[code] for code, characteristic
+                        in zip(elem, characteristics[-len(elem):]))])
+        for characteristics in [(14, None, 22), (None, 19, 19), (15, 20, 1), (None, None, 17)]:
+            self.assertEqual(count(windows, characteristics), index.legal_support(characteristics))
+        illegal_plays = [elem for elem in board.illegal_codes if len(elem) == 3]
+        self.assertEqual(len(illegal_plays), index.illegal_length)
+        self.assertEqual(count(illegal_plays, (None, 14, 15)), index.illegal_support((None, 14, 15)))
+        supports = index.legal_supports(flags_to_bits([True, False] * (len(windows) / 2), 2))
+        self.assertEqual(count(windows[::2], (14, 19, 21)), supports.get((14, 19, 21), 0))
+        self.assertEqual(125 * len(windows[::2]), sum(supports.values()))
+
+    def test_collapse_equivalent_rules(self):
+        red = parse("equal(color(previous), R)")
+        club = parse("equal(suit(current), C)")
+        either = "or(equal(color(previous), R), equal(suit(current), C))"
+        swapped = parse("or(equal(suit(current), C), equal(color(previous), R))")
+        candidates = {red: HypothesisRankParams(2, 1), parse("and(equal(color(previous), R), " + either + ")"): HypothesisRankParams(2, 1),
+                      parse(either): HypothesisRankParams(1, 1), swapped: HypothesisRankParams(3, 1), club: HypothesisRankParams(1, 1)}
+        collapsed = collapse_equivalent_rules(candidates)
+        self.assertEqual(set([red, club, swapped]), set(collapsed))
+        self.assertEqual(rule_fingerprint(red), rule_fingerprint(parse("not(equal(color(previous), B))")))
+
+        session = board_session(make_board(50, 0.3, seed=2))
+        ranked_hypothesis = scan_board(session.board).ranked(5)
+        ranked_rules = list(scan_and_rank_rules(ranked_hypothesis, hypothesis_scores=ranked_hypothesis, session=session))
+        self.assertEqual(len(ranked_rules), len(set(rule_fingerprint(rule) for rule in ranked_rules)))
+
+    def test_pick_informative_card(self):
+        session = board_session(make_board(20, 0.3, seed=1))
+        red = parse("equal(color(current), R)")
+        hearts = parse("equal(suit(current), H)")
+        ranked_rules = HypothesisRanking([(red, 2), (hearts, 1)], tiebreak=str)
+        #Only 2D separates the two rules
+        self.assertEqual("2D", pick_informative_card(ranked_rules, 0, ["2H", "2S", "2D"], session))
+        (information, top_rule_legal) = card_information(ranked_rules.top(2), ["2H", "2D"], 0, 0)
+        self.assertEqual({"2H": 0.0, "2D": split_entropy(2, 3)}, information)
+        self.assertEqual({"2H": True, "2D": True}, top_rule_legal)
+
+    def test_numeric_constraints(self):
+        board = Board([('5S', []), ('10H', ['2C', '3D']), ('9C', ['AS'])])
+        (less_rules, greater_rules) = map_numeric(board_session(board))
+        self.assertEqual([], [str(rule) for rule in less_rules if rule.name == 'summation'])
+        self.assertTrue("greater(summation(value(previous), value(current)), 14)" in map(str, greater_rules))
+        self.assertTrue("greater(difference(value(previous), value(current)), -2)" in map(str, greater_rules))
+
+        #Under the secret rule summation(previous, current) > 14
+        generator = random.Random(4)
+        board = Board([('7H', [])])
+        for i in xrange(150):
+            card = generator.choice(CARD_NAMES)
+            board.play(card, value(board.legal_cards[-1]) + value(card) > 14)
+        numeric_constraints = NumericConstraints()
+        for (card, illegal_cards) in board:
+            numeric_constraints.observe_legal(card)
+            for illegal_card in illegal_cards:
+                numeric_constraints.observe_illegal(illegal_card)
+        #map_numeric observes the plays made since its last call only
+        session = board_session(board[:30])
+        map_numeric(session)
+        for (card, illegal_cards) in board[30:]:
+            session.board.play(card, True)
+            for illegal_card in illegal_cards:
+                session.board.play(illegal_card, False)
+        (less_rules, greater_rules) = map_numeric(session)
+        self.assertEqual(map(str, less_rules + greater_rules), map(str, sum(numeric_constraints.surviving_rules(), [])))
+        self.assertTrue(less_rules + greater_rules)
+        codes = board.legal_codes
+        for rule in less_rules + greater_rules:
+            for i in xrange(2, len(codes)):
+                self.assertTrue(rule.holds(codes[i-2:i+1]))
+            for elem in board.illegal_codes:
+                if len(elem) == 3:
+                    self.assertFalse(rule.holds(elem))
+
+    def test_numeric_relations(self):
+        board = Board([('3H', []), ('4H', ['2C']), ('5D', ['KS', '4S']), ('6D', [])])
+        scores = numeric_relation_scores(board.legal_codes, board.illegal_codes)
+        #Three legal pairs and none of the illegal plays are one more than the previous card
+        self.assertEqual(1.5, scores[parse("equal(value(current), plus1(value(previous)))")])
+        self.assertEqual(0.5, scores[parse("greater(value(current), value(previous2))")])
+        self.assertEqual(1.0, scores[parse("not(equal(even(current), even(previous)))")])
+        self.assertFalse(parse("equal(value(current), value(previous))") in scores)
+        two_card_scores = numeric_relation_scores(board.legal_codes, board.illegal_codes, False)
+        self.assertEqual(dict((rule, score) for rule, score in scores.iteritems() if 'previous2' not in str(rule)), two_card_scores)
+        window = ['3H', '4H', '2C']
+        relations = window_relations(window)
+        self.assertTrue(parse("equal(value(previous), plus1(value(previous2)))") in relations)
+        self.assertTrue(parse("equal(suit(previous), suit(previous2))") in relations)
+        for rule in relations:
+            self.assertTrue(rule.evaluate(window))
+        self.assertEqual(3, len(window_relations(['KS', 'AS'])))
+
+        session = board_session(make_board(50, 0.3, seed=2))
+        ranked_hypothesis = scan_board(session.board).ranked(5)
+        numeric_hypothesis = scan_and_rank_numeric_hypothesis(True, session)
+        self.assertTrue(numeric_hypothesis is scan_and_rank_numeric_hypothesis(True, session))
+        numeric_rule = numeric_hypothesis.top(1)[0][0]
+        ranked_rules = scan_and_rank_rules(ranked_hypothesis, numeric_hypothesis, ranked_hypothesis, session)
+        self.assertTrue(any(numeric_rule in (rule, rule.right) for rule in ranked_rules))
+
+    def test_rule_exceptions(self):
+        generator = random.Random(3)
+        windows = window_array([[generator.randrange(52) for i in xrange(3)] for j in xrange(20)], 3)
+        occurrences = {}
+        for window in windows:
+            for triple in itertools.product(*[(0,) + CARD_CHARACTERISTIC_IDS[code] for code in window]):
+                occurrences[triple] = occurrences.get(triple, 0) + 1
+        counts = triple_counts(windows)
+        self.assertEqual(occurrences, dict((tuple(np.unravel_index(triple, (ID_BASE,) * 3)), counts[triple])
+                                           for triple in np.flatnonzero(counts)))
+        #Two card windows leave previous2 free
+        two_card_counts = triple_counts(window_array([(0, 1)] * 4, 2))
+        self.assertEqual(36 * 4, two_card_counts[:ID_BASE ** 2].sum())
+        self.assertEqual(36 * 4, two_card_counts.sum())
+
+        red = parse("equal(color(current), R)")
+        #Clubs are legal too, so red rejects legal windows that end with a club
+        session = board_session(make_board(60, 0.3, seed=1, board_rule="or(equal(color(current), R), equal(suit(current), C))"))
+        exceptions = validate_and_refine_formulated_rule([red], session)
+        [(rule, unless, legal)] = exceptions.keys()
+        self.assertEqual((red, True), (rule, legal))
+        self.assertTrue(unless.current in ('C15', 'C19'))
+        #Hearts are illegal, so red accepts illegal plays of hearts
+        session = board_session(make_board(60, 0.3, seed=1, board_rule="and(equal(color(current), R), not(equal(suit(current), H)))"))
+        exceptions = validate_and_refine_formulated_rule([red], session)
+        [(rule, excepted, legal)] = exceptions.keys()
+        self.assertEqual((red, False), (rule, legal))
+        self.assertEqual('C17', excepted.current)
+        self.assertEqual({parse("equal(color(previous), R)"): False},
+                         validate_and_refine_formulated_rule([parse("equal(color(previous), R)")], board_session(Board([('2H', []), ('3H', []), ('4H', [])]))))
+
+    def test_refined_rules(self):
+        self.assertEqual(parse("equal(suit(current), H)"), Exception_Hypothesis(None, None, 'C17').tree())
+        self.assertEqual("andf(equal(color(previous), R), equal(suit(current), H))", str(Exception_Hypothesis(None, 'C14', 'C17')))
+
+        red = parse("equal(color(current), R)")
+        secret = "or(equal(color(current), R), equal(suit(current), C))"
+        board = Board(make_board(60, 0.3, seed=1, board_rule=secret))
+        ranked_rules = HypothesisRanking([(red, 1.0)], tiebreak=str)
+        session = board_session(board)
+        refine_ranked_rules(ranked_rules, session)
+        top_rule = ranked_rules.top(1)[0][0]
+        self.assertEqual(rule_fingerprint(parse(secret)), rule_fingerprint(top_rule))
+        self.assertTrue(evaluate_batch(top_rule, BoardColumns(board.legal_codes)).all())
+        self.assertTrue(ranked_rules[top_rule] > ranked_rules[red])
+        #A refinement that fixes windows ranks above its rule for a negative score too
+        ranked_rules = HypothesisRanking([(red, -1.0)], tiebreak=str)
+        refine_ranked_rules(ranked_rules, session)
+        self.assertEqual(top_rule, ranked_rules.top(1)[0][0])
+
+        #Refining as the plays arrive counts the same windows as refining once at the end
+        session = board_session(board[:20])
+        validate_and_refine_formulated_rule([red], session)
+        for (card, illegal_cards) in board[20:]:
+            session.board.play(card, True)
+            for illegal_card in illegal_cards:
+                session.board.play(illegal_card, False)
+            validate_and_refine_formulated_rule([red], session)
+        exceptions = session.rule_exceptions.get(red)
+        once = RuleExceptions(red)
+        once.update(board)
+        self.assertEqual(once.wrong, exceptions.wrong)
+        self.assertTrue((once.unless_counts == exceptions.unless_counts).all())
+        self.assertTrue((once.except_counts == exceptions.except_counts).all())
+        #The counts and the characteristic index give the windows a refinement fixes
+        for exception in [Exception_Hypothesis(None, None, 'C19'), Exception_Hypothesis('C17', 'C14', None),
+                          Exception_Hypothesis(None, 'C8', 'C21')]:
+            for legal_exception in (True, False):
+                refined = RuleExceptions(refined_rule(red, exception, legal_exception))
+                refined.update(board)
+                self.assertEqual(once.wrong - refined.wrong,
+                                 once.refinement_fixes(exception, legal_exception, board.characteristics))
+        #Every illegal card is one play, of three cards when two legal cards precede it
+        (legal, illegal) = new_windows(Board([('2H', ['3S', '4S']), ('5H', ['6C']), ('7H', [])]), (0, 0))
+        self.assertEqual([encode_cards(['2H', '5H', '7H'])], legal.tolist())
+        self.assertEqual([encode_cards(['2H', '3S']), encode_cards(['2H', '4S'])], illegal[2].tolist())
+        self.assertEqual([encode_cards(['2H', '5H', '6C'])], illegal[3].tolist())
+
+    def test_transform_cache(self):
+        cache = LRUCache(lambda hypothesis: parse(tree_transform_string(hypothesis)), 2)
+        (red, club, royal) = ("previous='C14'", "current='C3'", "previous2='C22'")
+        self.assertEqual(tree_transform(red), cache.get(red))
+        self.assertTrue(cache.get(red) is cache.get(red))
+        cache.get(club)
+        cache.get(red)
+        #club is now the least recently used
+        cache.get(royal)
+        self.assertEqual([red, royal], list(cache.entries))
+        self.assertEqual({'hits': 3, 'misses': 3, 'size': 2, 'maxsize': 2}, cache.stats())
         
 unittest.main()